@@ -0,0 +1,460 @@
+# =========================================
+# agent_adapter.py
+# 调网关 /chat/completions 的适配器（app.py 的 Web 界面在用）
+#  - AgentAdapter：同步，一次一个请求（支持 SSE 流式）
+#  - AsyncAgentAdapter：异步，chat_many 一次并发跑很多段对话（评测 / 批处理用）
+# 不依赖 Streamlit，脚本里也能直接 import
+# =========================================
+
+import asyncio
+import contextlib
+import os
+import time
+import json
+import datetime
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Generator, Iterator
+
+from endpoint_pool import Endpoint, EndpointPool
+from http_client import default_timeout, post_json, stream_post, warm_up
+from llm_resilience import ResilientCaller, for_endpoint
+from prompt_layout import PROMPT_CACHE, layout_messages, prefix_fingerprint, split_turn, time_hint
+from rate_limiter import BATCH, INTERACTIVE, RateLimiter, estimate_tokens, get_limiter
+from search_rank import compress_results
+from search_tools import SEARCH_POOL, format_results, gather_results
+from ttl_cache import TieredCache, canonical_key
+
+
+# ===================== 1) 适配器：调用 itedus.cn =====================
+@dataclass
+class AgentOutput:
+    text: str
+    tool_calls: List[Dict[str, Any]]
+    latency_ms: int
+    cached: bool = False  # True = 直接用了缓存里的回答，没有发请求
+    ttft_ms: Optional[int] = None  # 首字耗时（流式时才有）：用户多久看到第一个字
+
+
+class AgentAdapter:
+    """
+    把对话历史 messages 发到 itedus.cn，并返回回复。
+    支持可选的“先联网搜索，再让模型综合回答”。
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str],
+        api_key: Optional[str],
+        model: str,
+        system_prompt: str,
+        cache: Optional[TieredCache] = None,
+        search_deadline_s: Optional[float] = None,
+        search_sources: Tuple[str, ...] = ("text",),
+        deep_search: bool = False,
+        deep_k: int = 3,
+        search_token_budget: int = 1200,
+        resilience: Optional[ResilientCaller] = None,
+        pool: Optional[EndpointPool] = None,
+        limiter: Optional[RateLimiter] = None,
+        priority: int = INTERACTIVE,
+    ):
+        # 默认 itedus；可被侧边栏/环境变量覆盖
+        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL") or "https://apis.itedus.cn/v1").rstrip("/")
+        self.api_key = (api_key or os.getenv("OPENAI_API_KEY") or "").strip()
+        self.model = (model or os.getenv("OPENAI_MODEL") or "gpt-4o").strip()
+        self.system_prompt = system_prompt
+        # 可选的回答缓存：同样的 模型 + 地址 + 对话 + 搜索结果，在 TTL 内直接复用上次的回答
+        self.cache = cache
+        # 联网搜索：几个查询变体 / 来源并行搜，最多等这么久（None = 环境变量 SEARCH_DEADLINE_S，默认 3 秒）
+        self.search_deadline_s = search_deadline_s
+        self.search_sources = search_sources
+        # 深度搜索：再把前 deep_k 个网页抓下来抽正文（总截止时间 DEEP_SEARCH_DEADLINE_S，默认 4 秒）
+        self.deep_search = deep_search
+        self.deep_k = deep_k
+        # 搜索资料最多占多少 token：按和问题的相关度挑段落、去重后装进去（0 = 不筛，原样全塞）
+        self.search_token_budget = search_token_budget
+        # 重试 / 熔断 / 对冲：默认同一个网关地址共用一个（熔断状态按网关算）
+        self.resilience = resilience or for_endpoint(self.base_url)
+        # 多个网关（endpoint_pool.load_pool / LLM_ENDPOINTS）：每次请求挑当前最快、最健康的；没配就只有上面这一个
+        self.pool = pool or EndpointPool.single(self.base_url, self.api_key, self.model)
+        # 进程内共用的限速排队（LLM_RPM / LLM_TPM）：每次真正发请求前排队，聊天优先于批处理和后台摘要
+        self.limiter = limiter or get_limiter()
+        self.priority = priority
+
+    def _prepare(
+        self,
+        messages: List[Dict[str, str]],
+        auto_search: bool = False,
+        search_k: int = 5
+    ) -> Tuple[List[Dict[str, str]], str, Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """拼好要发给模型的 messages；返回 (messages, 缓存键, 缓存命中的内容, 各阶段耗时记录)。"""
+        # 只读不改，不用先复制一份；没有 system 开头时才补一条（各轮 dict 都是引用，不复制内容）
+        msg_list = messages
+        if not msg_list or msg_list[0].get("role") != "system":
+            msg_list = [{"role": "system", "content": self.system_prompt or ""}, *msg_list]
+
+        # 2) 如勾选“自动联网搜索”，先查资料再给模型
+        search_text = ""
+        search_system = ""
+        trace: List[Dict[str, Any]] = []
+        if auto_search:
+            # 取用户最新一句作为搜索词
+            last_user = ""
+            for m in reversed(msg_list):
+                if m.get("role") == "user":
+                    last_user = m.get("content", "")
+                    break
+            # 搜索的同时把到网关的连接先建好，搜完直接发请求，两段等待不再相加
+            t0 = time.time()
+            warm = SEARCH_POOL.submit(warm_up, self.base_url)
+            items, search_trace = gather_results(
+                last_user, max_results=search_k, deadline_s=self.search_deadline_s, sources=self.search_sources
+            )
+            errors = [t["error"] for t in search_trace if t["status"] == "error"]
+            trace.extend(search_trace)
+            trace.append({"stage": "search_total", "ms": int((time.time() - t0) * 1000), "n": len(items)})
+            excerpts = {}
+            if self.deep_search and items:
+                from deep_search import fetch_pages  # 开了深度搜索才导入（抓网页、抽正文）
+
+                t1 = time.time()
+                pages = fetch_pages([r["href"] for r in items[:self.deep_k]])
+                # 要筛的话把正文块都交给排序阶段挑；不筛就只带每页前两块
+                keep = None if self.search_token_budget else 2
+                excerpts = {p.url: p.chunks[:keep] for p in pages if p.chunks}
+                trace.extend(p.trace() for p in pages)
+                trace.append({"stage": "fetch_total", "ms": int((time.time() - t1) * 1000), "ok": len(excerpts)})
+            if self.search_token_budget and items:
+                items, excerpts, rank_stats = compress_results(last_user, items, excerpts, self.search_token_budget)
+                trace.append({"stage": "rank", **rank_stats})
+            search_text = format_results(last_user, items, errors, excerpts) if last_user.strip() else ""
+            trace.append({"stage": "warm_up", "ok": warm.result() if warm.done() else "还在连"})
+            # 把搜索结果作为 system 信息注入，要求“基于这些结果回答，并标注可能的不确定性”
+            search_system = (
+                "以下是联网搜索到的资料（可能包含噪声）。"
+                "请先阅读，再结合用户问题给出**可信且简明**的答案；"
+                "如资料不足或相互矛盾，请如实说明不确定性：\n\n" + search_text
+            )
+
+        # 缓存键不含时间提示（每一刻钟都在变），其余都算进去；搜索结果里的时间戳也去掉
+        cache_key, hit = "", None
+        if self.cache is not None:
+            cache_key = canonical_key(self.model, self.base_url, msg_list, search_text.split("\n", 1)[-1])
+            hit = self.cache.get(cache_key)
+
+        # 1) 系统提示 + 之前的对话放最前面，逐字节不变，网关的前缀缓存才能命中；
+        #    每次都变的（当前时间、搜索资料）合成一条 system，放在最后一个用户消息前面
+        prefix, turn = split_turn(msg_list)
+        msg_list = layout_messages(prefix, [time_hint(), search_system], turn)
+        trace.append({"stage": "layout", "prefix": prefix_fingerprint(prefix), "prefix_messages": len(prefix)})
+        return msg_list, cache_key, hit, trace
+
+    def _request(
+        self, msg_list: List[Dict[str, str]], stream: bool = False, endpoint: Optional[Endpoint] = None
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        endpoint = endpoint or Endpoint("default", self.base_url, self.api_key, self.model)
+        url = f"{endpoint.base_url}/chat/completions"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {endpoint.api_key}",
+        }
+        payload = {
+            "model": endpoint.model,
+            "messages": msg_list,
+        }
+        if stream:
+            payload["stream"] = True
+            # 流式默认不带 usage；要它在最后一段报用量（看缓存命中）。网关不认这个字段时设 LLM_STREAM_USAGE=0
+            if os.getenv("LLM_STREAM_USAGE", "1") != "0":
+                payload["stream_options"] = {"include_usage": True}
+        return url, headers, payload
+
+    def _save_to_cache(self, cache_key: str, reply_text: str):
+        if self.cache is not None:
+            saved_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.cache.set(cache_key, {"text": reply_text, "saved_at": saved_at})
+
+    def _reply_text(self, status_code: int, result: Dict[str, Any], cache_key: str) -> str:
+        if status_code != 200:
+            err_msg = result.get("error", {}).get("message", f"HTTP {status_code}")
+            return f"❌ 接口返回错误：{err_msg}"
+        reply_text = result["choices"][0]["message"]["content"]
+        self._save_to_cache(cache_key, reply_text)
+        return reply_text
+
+    @staticmethod
+    def _cache_hit_output(cache_key: str, hit: Dict[str, Any], start: float) -> AgentOutput:
+        latency = int((time.time() - start) * 1000)
+        return AgentOutput(
+            text=hit["text"],
+            tool_calls=[{"cache": "hit", "key": cache_key[:12], "saved_at": hit["saved_at"]}],
+            latency_ms=latency,
+            cached=True,
+            ttft_ms=latency,
+        )
+
+    def _send(self, msg_list: List[Dict[str, str]], info: Dict[str, Any], priority: Optional[int] = None):
+        """
+        发一次非流式请求：先过限速排队，配了多个网关时由 self.pool 挑一个，出错按 self.resilience 重试。
+        共享连接池：和网关的 TCP/TLS 连接在多轮对话、页面重跑之间复用。
+        """
+        tokens = estimate_tokens(msg_list)
+        priority = self.priority if priority is None else priority
+
+        def send(endpoint: Endpoint):
+            url, headers, payload = self._request(msg_list, endpoint=endpoint)
+            return self.limiter.run(lambda: post_json(url, payload, headers=headers), tokens, priority, info)
+
+        return self.resilience.call(lambda: self.pool.call(send, info), info)
+
+    def complete(self, messages: List[Dict[str, str]], priority: Optional[int] = None) -> str:
+        """
+        原样发 messages，返回回复文字；不加时间提示、不搜索、不查回答缓存。
+        给后台摘要这类调用方用（priority=BACKGROUND），出错直接抛异常。
+        """
+        resp = self._send(messages, {}, priority)
+        result = resp.json() if resp.content else {}
+        if resp.status_code != 200:
+            raise RuntimeError(result.get("error", {}).get("message", f"HTTP {resp.status_code}"))
+        return result["choices"][0]["message"]["content"]
+
+    def _call_agent(
+        self,
+        messages: List[Dict[str, str]],
+        auto_search: bool = False,
+        search_k: int = 5
+    ) -> AgentOutput:
+        """真正去请求 itedus.cn 的 /chat/completions"""
+        start = time.time()
+        msg_list, cache_key, hit, trace = self._prepare(messages, auto_search, search_k)
+        if hit is not None:
+            return self._cache_hit_output(cache_key, hit, start)
+
+        # 3) 调 itedus.cn
+        info: Dict[str, Any] = {}
+        reply_text = ""
+        tool_calls: List[Dict[str, Any]] = trace
+        try:
+            t0 = time.time()
+            resp = self._send(msg_list, info)
+            result = resp.json() if resp.content else {}
+            ms = int((time.time() - t0) * 1000)
+            tool_calls.append({"stage": "llm", "ms": ms, **info, **PROMPT_CACHE.record(result.get("usage"), ms)})
+            tool_calls.append(result)
+            reply_text = self._reply_text(resp.status_code, result, cache_key)
+        except Exception as e:
+            reply_text = f"❌ 请求失败：{e}"
+
+        latency = int((time.time() - start) * 1000)
+        return AgentOutput(text=reply_text, tool_calls=tool_calls, latency_ms=latency)
+
+    def _stream_agent(
+        self,
+        messages: List[Dict[str, str]],
+        auto_search: bool = False,
+        search_k: int = 5
+    ) -> Generator[str, None, AgentOutput]:
+        """流式版：SSE 一段段产出文字，最后 return 完整的 AgentOutput（带首字耗时）。"""
+        start = time.time()
+        msg_list, cache_key, hit, trace = self._prepare(messages, auto_search, search_k)
+        if hit is not None:
+            yield hit["text"]
+            return self._cache_hit_output(cache_key, hit, start)
+
+        parts: List[str] = []
+        tool_calls: List[Dict[str, Any]] = trace
+        ttft_ms: Optional[int] = None
+        try:
+            # 只在拿到响应头之前重试（已经吐出去的字收不回来）；流式不对冲
+            with contextlib.ExitStack() as stack:
+                info: Dict[str, Any] = {}
+                tokens = estimate_tokens(msg_list)
+
+                def open_stream(url: str, headers: Dict[str, str], payload: Dict[str, Any]):
+                    with contextlib.ExitStack() as attempt:
+                        resp = attempt.enter_context(stream_post(url, payload, headers=headers))
+                        if resp.status_code != 200:
+                            # 出错的响应体先读进来，连接马上还回连接池，不占着等到整个流结束
+                            with contextlib.suppress(ValueError):
+                                resp.json()
+                            return resp
+                        stack.enter_context(attempt.pop_all())  # 只有成功的那个留到读完
+                        return resp
+
+                def send(endpoint: Endpoint):
+                    url, headers, payload = self._request(msg_list, stream=True, endpoint=endpoint)
+                    return self.limiter.run(
+                        lambda: open_stream(url, headers, payload), tokens, self.priority, info, track_usage=False,
+                    )
+
+                resp = self.resilience.call(lambda: self.pool.call(send, info, track=False), info, hedge=False)
+                if resp.status_code != 200:
+                    result = resp.json()
+                    tool_calls.append(result)
+                    err_msg = result.get("error", {}).get("message", f"HTTP {resp.status_code}")
+                    parts.append(f"❌ 接口返回错误：{err_msg}")
+                    yield parts[-1]
+                else:
+                    chunks, finish_reason, usage, done = 0, None, None, False
+                    for line in resp.iter_lines():
+                        # SSE：每条事件是一行 “data: {...}”，最后一条是 “data: [DONE]”
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            done = True
+                            break
+                        event = json.loads(data)
+                        usage = event.get("usage") or usage  # include_usage 时最后一段只有 usage、choices 为空
+                        chunks += 1
+                        choice = (event.get("choices") or [{}])[0]
+                        finish_reason = choice.get("finish_reason") or finish_reason
+                        delta = (choice.get("delta") or {}).get("content") or ""
+                        if delta:
+                            if ttft_ms is None:
+                                ttft_ms = int((time.time() - start) * 1000)
+                            parts.append(delta)
+                            yield delta
+                    complete = done or finish_reason == "stop"
+                    tool_calls.append({
+                        "stage": "llm", "stream": True, "chunks": chunks, "finish_reason": finish_reason,
+                        "complete": complete, **info, **PROMPT_CACHE.record(usage, ttft_ms),
+                    })
+                    # 网关中途断开（没有 [DONE]、也没说 stop）：半截回答不进缓存，不然 TTL 内一直拿它当答案
+                    if complete:
+                        self._save_to_cache(cache_key, "".join(parts))
+        except Exception as e:
+            parts.append(f"❌ 请求失败：{e}")
+            yield parts[-1]
+
+        latency = int((time.time() - start) * 1000)
+        return AgentOutput(text="".join(parts), tool_calls=tool_calls, latency_ms=latency, ttft_ms=ttft_ms)
+
+    def chat(self, history: List[Dict[str, str]], user_text: str, auto_search: bool, search_k: int) -> AgentOutput:
+        messages = history + [{"role": "user", "content": user_text}]
+        return self._call_agent(messages, auto_search=auto_search, search_k=search_k)
+
+    def chat_stream(self, history: List[Dict[str, str]], user_text: str, auto_search: bool, search_k: int) -> "StreamingReply":
+        messages = history + [{"role": "user", "content": user_text}]
+        return StreamingReply(self._stream_agent(messages, auto_search=auto_search, search_k=search_k))
+
+
+class StreamingReply:
+    """可以直接交给 st.write_stream；迭代完以后 .output 是完整的 AgentOutput。"""
+
+    def __init__(self, gen: Generator[str, None, AgentOutput]):
+        self._gen = gen
+        self.output: Optional[AgentOutput] = None
+
+    def __iter__(self) -> Iterator[str]:
+        self.output = yield from self._gen
+
+
+class AsyncAgentAdapter(AgentAdapter):
+    """
+    异步版：基于 httpx.AsyncClient，一个进程里同时挂几百个请求也只占一个线程。
+    拼消息、缓存、解析都和 AgentAdapter 一样；用完 await adapter.aclose()（或 async with）。
+    """
+
+    def __init__(self, *args, max_connections: int = 100, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_connections = max_connections
+        self._client = None  # 第一次用时在当前事件循环里创建
+
+    def _get_client(self):
+        if self._client is None:
+            try:
+                import httpx
+            except ImportError as e:
+                raise RuntimeError("AsyncAgentAdapter 需要 httpx：pip install httpx（已写在 requirements.txt 里）") from e
+
+            connect, read = default_timeout()
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "AsyncAgentAdapter":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _call_agent_async(
+        self,
+        messages: List[Dict[str, str]],
+        auto_search: bool = False,
+        search_k: int = 5,
+        priority: Optional[int] = None,
+    ) -> AgentOutput:
+        start = time.time()
+        if auto_search:
+            # 搜索是同步的 DDGS，丢到线程里，不堵住事件循环
+            msg_list, cache_key, hit, trace = await asyncio.to_thread(self._prepare, messages, auto_search, search_k)
+        else:
+            msg_list, cache_key, hit, trace = self._prepare(messages)
+        if hit is not None:
+            return self._cache_hit_output(cache_key, hit, start)
+
+        info: Dict[str, Any] = {}
+        tokens = estimate_tokens(msg_list)
+        priority = self.priority if priority is None else priority
+
+        def send(endpoint: Endpoint):
+            url, headers, payload = self._request(msg_list, endpoint=endpoint)
+            return self.limiter.arun(lambda: self._get_client().post(url, json=payload, headers=headers), tokens, priority, info)
+
+        reply_text = ""
+        tool_calls: List[Dict[str, Any]] = trace
+        try:
+            t0 = time.time()
+            resp = await self.resilience.acall(lambda: self.pool.acall(send, info), info)
+            result = resp.json() if resp.content else {}
+            ms = int((time.time() - t0) * 1000)
+            tool_calls.append({"stage": "llm", "ms": ms, **info, **PROMPT_CACHE.record(result.get("usage"), ms)})
+            tool_calls.append(result)
+            reply_text = self._reply_text(resp.status_code, result, cache_key)
+        except Exception as e:
+            reply_text = f"❌ 请求失败：{e!r}"
+
+        latency = int((time.time() - start) * 1000)
+        return AgentOutput(text=reply_text, tool_calls=tool_calls, latency_ms=latency)
+
+    async def achat(self, history: List[Dict[str, str]], user_text: str, auto_search: bool = False, search_k: int = 5) -> AgentOutput:
+        messages = history + [{"role": "user", "content": user_text}]
+        return await self._call_agent_async(messages, auto_search=auto_search, search_k=search_k)
+
+    async def chat_many(
+        self,
+        conversations: List[List[Dict[str, str]]],
+        concurrency: int = 16,
+        timeout: Optional[float] = 60,
+        auto_search: bool = False,
+        search_k: int = 5
+    ) -> List[AgentOutput]:
+        """
+        并发跑一批对话（每段是完整的 messages，最后一条一般是 user），结果顺序和输入一致。
+        - concurrency：同时在飞的请求数上限（别把网关打到限流）
+        - timeout：单个请求的超时秒数（排队等信号量的时间不算，限速排队的时间算）；超时的那一条返回错误文本，不影响其他
+        批处理按 BATCH 优先级排队：同一进程里有人在聊天时，先让聊天的请求发
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(messages: List[Dict[str, str]]) -> AgentOutput:
+            async with sem:
+                start = time.time()
+                try:
+                    return await asyncio.wait_for(
+                        self._call_agent_async(messages, auto_search=auto_search, search_k=search_k, priority=BATCH), timeout
+                    )
+                except asyncio.TimeoutError:
+                    latency = int((time.time() - start) * 1000)
+                    return AgentOutput(text=f"❌ 请求超时（{timeout} 秒）", tool_calls=[], latency_ms=latency)
+
+        return list(await asyncio.gather(*(one(m) for m in conversations)))
@@ -13,87 +13,122 @@
 
 from dotenv import load_dotenv
 load_dotenv()
-import os,sys,re,datetime
+import os,sys,re,time
 os.chdir(os.path.dirname(os.path.abspath(sys.argv[0])))
 
-from langchain_openai import ChatOpenAI
-from langchain_core.tools import tool
-
-from pathlib import Path
-
-
-class SimpleFileMemory:
-    def __init__(self, file_path: str = "./memory/nainai_memory.txt", max_rounds: int = 20):
-        # ① 解析成绝对路径，保证不受“当前工作目录”影响
-        self.path = Path(file_path).resolve()
-        self.max_rounds = max_rounds
-
-        # ② 创建父目录
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-
-        # ③ 若文件不存在，先“touch”一下，确保后续可写
-        if not self.path.exists():
-            self.path.touch()
-
-    def load_history(self) -> str:
-        if not self.path.exists():
-            return ""
-        lines = self.path.read_text(encoding="utf-8").splitlines(True)
-        return "".join(lines[-self.max_rounds * 2:])  # 一轮两行（用户+助手）
-
-    def save_turn(self, user: str, assistant: str):
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with self.path.open("a", encoding="utf-8") as f:
-            f.write(f"[{ts}] 奶奶：{user}\n")
-            f.write(f"[{ts}] 助手：{assistant}\n")
-
+from memory_store import SimpleFileMemory, SegmentedFileMemory
+from context_builder import ContextBuilder, HistoryFit, TokenUsage
+from text_utils import count_tokens
+from memory_summary import RollingSummarizer
+from tool_registry import REGISTRY, ToolRegistry
+from local_router import LocalRouter, find_calculation
+from llm_resilience import CircuitOpenError, ResilientCaller
+from endpoint_pool import PooledChatModel, load_pool
+from prompt_layout import PROMPT_CACHE, layout_messages
+from rate_limiter import INTERACTIVE, RateLimiter, RateLimitRejected, estimate_tokens, get_limiter
 
 
 # ========= 作品版 Agent =========
 class ProductAgent:
-    def __init__(self, llm_client, memory: SimpleFileMemory | None = None, persona: str | None = None):
+    def __init__(
+        self,
+        llm_client,
+        memory: SimpleFileMemory | None = None,
+        persona: str | None = None,
+        token_budget: int = 3000,
+        summarizer: RollingSummarizer | None = None,
+        recall=None,
+        recall_k: int = 3,
+        tools: ToolRegistry | None = None,
+        fast_path: bool = True,
+        resilience: ResilientCaller | None = None,
+        limiter: RateLimiter | None = None,
+    ):
         self.llm_client = llm_client
         self.memory = memory
+        # 滚出原文窗口的旧对话由它折叠成摘要（后台更新），提示里带“摘要 + 最近几轮”
+        self.summarizer = summarizer
+        # 本地向量索引（memory_index.MemoryVectorIndex）：从全部历史里捞出和这句话最相关的几轮
+        self.recall = recall
+        self.recall_k = recall_k
+        # 整个提示（人设 + 历史 + 本轮输入）不超过 token_budget，历史从新到旧往里塞
+        self.context_builder = ContextBuilder(budget=token_budget)
+        self.last_token_usage: TokenUsage | None = None
+        self.last_cache: dict = {}  # 上一次调模型的 prompt_tokens / cached_tokens（网关报了才有）
         self.persona = persona or (
             "你是一位温柔的AI学习助理，用户是一位名叫奶奶的女士，"
             "她住在北京，在学习AI，目标是成为AI产品经理。"
             "你的语气要轻松、鼓励、生活化，给出分步骤建议。"
         )
 
-        @tool
-        def multiply(a: float, b: float) -> float:
-            """计算两个数字的乘积"""
-            return a * b
-
-        @tool
-        def today() -> str:
-            """返回今天的日期（YYYY-MM-DD）"""
-            return datetime.date.today().strftime("%Y-%m-%d")
-
-        @tool
-        def praise(name: str) -> str:
-            """生成一段夸奶奶的话"""
-            return (
-                f"{name}真了不起，90岁还在学AI，还想做AI产品经理，"
-                "说明她的好奇心和学习力都比很多年轻人还强！"
-            )
-
-        self.tools = {"multiply": multiply, "today": today, "praise": praise}
-
-    def build_prompt(self, history_text: str, user_input: str) -> str:
-        return f"""{self.persona}
-
-以下是你和奶奶之前的部分对话（用于保持上下文与记忆）：
-{history_text}
-
-现在奶奶说：
-“{user_input}”
+        # 工具都在 tool_registry 里注册好了（纯函数的结果会缓存，调用统计见 self.tools.stats()）
+        self.tools = tools or REGISTRY
+        # 纯算式、问日期 / 星期 / 几点：本地模板直接答，不调模型（fast_path=False 关掉）
+        self.router = LocalRouter(name="奶奶") if fast_path else None
+        self.last_route = "llm"  # 上一轮走的哪条路：llm / calc / date / time
+        # 调模型的重试 / 熔断 / 对冲（LLM_RETRY_ATTEMPTS、LLM_BREAKER_*、LLM_HEDGE 环境变量）
+        self.resilience = resilience or ResilientCaller.from_env()
+        # 进程内共用的限速排队（LLM_RPM / LLM_TPM）：奶奶的提问排在后台摘要前面
+        self.limiter = limiter or get_limiter()
+
+    INSTRUCTIONS = (
+        "你要做的：\n"
+        "1) 判断是否需要调用工具（算数、查日期、夸人）。\n"
+        "2) 如果不需要，直接用温柔、清晰的口吻回复；若需要，先调用工具，再把结果自然融合进回答。\n"
+        "3) 奶奶正在学AI、想做AI产品经理；给出可操作的下一步建议。\n"
+        "奶奶这次说的话是最后一条消息。"
+    )
 
-你要做的：
-1) 判断是否需要调用工具（算数、查日期、夸人）。
-2) 如果不需要，直接用温柔、清晰的口吻回复；若需要，先调用工具，再把结果自然融合进回答。
-3) 奶奶正在学AI、想做AI产品经理；给出可操作的下一步建议。
-"""
+    def build_prompt(self, history_text: str, summary: str = "") -> str:
+        """稳定前缀：人设和要求（一直不变）→ 摘要（折叠时才变）→ 之前的对话（只往后追加）。"""
+        summary_part = f"\n以下是你和奶奶更早对话的摘要（长期记忆）：\n{summary}\n" if summary else ""
+        history_part = f"\n以下是你和奶奶之前的部分对话（用于保持上下文与记忆）：\n{history_text}" if history_text else ""
+        return f"{self.persona}\n\n{self.INSTRUCTIONS}\n{summary_part}{history_part}"
+
+    def build_context(self, user_input: str) -> list[dict]:
+        """
+        按 token 预算拼好要发的 messages，并把各部分用了多少 token 记到 last_token_usage。
+        稳定的放前面（网关能缓存这段前缀），召回的相关旧记忆每次都不一样，放在奶奶这句话前面。
+        """
+        summary = self.summarizer.state()[0] if self.summarizer else ""
+        fixed_tokens = count_tokens(self.build_prompt("", summary))
+        user_tokens = count_tokens(user_input)
+        available = self.context_builder.budget - fixed_tokens - user_tokens
+        if self.memory:
+            window = self.summarizer.window() if self.summarizer else self.memory.max_rounds
+            turns = self.memory.load_turns(window)
+        else:
+            turns = []
+
+        # 相关旧记忆最多占剩余预算的四分之一，其余留给最近几轮
+        recalled = HistoryFit("", 0, 0, 0)
+        if self.recall is not None and self.memory:
+            hits = self.recall.search(user_input, k=self.recall_k, exclude_last=len(turns))
+            old_turns = [self.memory.load_turn(k) for k, _ in sorted(hits)]
+            recalled = self.context_builder.fit_history(old_turns, max(0, available) // 4)
+            available -= recalled.tokens
+        fit = self.context_builder.fit_history(turns, max(0, available))
+
+        persona_tokens = count_tokens(self.persona)
+        summary_tokens = count_tokens(summary)
+        self.last_token_usage = TokenUsage(
+            budget=self.context_builder.budget,
+            sections={
+                "persona": persona_tokens,
+                "summary": summary_tokens,
+                "recall": recalled.tokens,
+                "history": fit.tokens,
+                "user_input": user_tokens,
+                "instructions": max(0, fixed_tokens - persona_tokens - summary_tokens),
+            },
+        )
+        self.last_history_fit = fit
+        recalled_part = f"以下是更早的对话里和这次问题相关的几段（供参考）：\n{recalled.text}" if recalled.text else ""
+        return layout_messages(
+            [{"role": "system", "content": self.build_prompt(fit.text, summary)}],
+            [recalled_part],
+            [{"role": "user", "content": user_input}],
+        )
 
     def _need_calc(self, text: str) -> bool:
         """更稳的判断：是否需要算数（避免‘打算’等误触）"""
@@ -109,31 +144,52 @@ class ProductAgent:
             return True
         return False
 
-    def run(self, user_input: str) -> str:
-        # 1) 取历史，构造系统提示
-        history_text = self.memory.load_history() if self.memory else ""
-        system_prompt = self.build_prompt(history_text, user_input)
+    def _remember(self, user_input: str, reply: str):
+        if self.memory:
+            self.memory.save_turn(user_input, reply)
+            if self.summarizer:
+                self.summarizer.schedule()  # 后台折叠滚出窗口的旧轮次，不耽误这次回复
+            if self.recall is not None:
+                self.recall.sync()  # 只向量化刚写进去的这一轮
 
-        # 2) 是否需要工具
+    def run(self, user_input: str) -> str:
+        # 0) 整句都能本地答（纯算式、今天几号……）：不拼提示、不调模型
+        local = self.router.route(user_input) if self.router else None
+        if local is not None:
+            self.last_route = local.intent
+            self._remember(user_input, local.text)
+            return local.text
+        self.last_route = "llm"
+
+        # 1) 取历史，按 token 预算拼 messages（稳定前缀在前）
+        messages = self.build_context(user_input)
+
+        # 2) 是否需要工具（算式按奶奶实际写的算，找不到算式就不附加）
         extra = ""
         if self._need_calc(user_input):
-            result = self.tools["multiply"].invoke({"a": 12.5, "b": 8})
-            extra = f"（顺便我帮你算了一下：12.5×8={result}）"
+            calc = find_calculation(user_input)
+            if calc:
+                extra = f"（顺便我帮你算了一下：{calc.expr}={calc.value_text}）"
         elif "日期" in user_input or "今天" in user_input:
-            today_str = self.tools["today"].invoke({})
+            today_str = self.tools.call("today")
             extra = f"（今天是 {today_str}）"
         elif "夸" in user_input or "表扬" in user_input:
-            extra = self.tools["praise"].invoke({"name": "奶奶"})
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_input},
-        ]
+            extra = self.tools.call("praise", name="奶奶")
 
         # 3) 调用模型（容错）
         try:
-            prompt = f"{system_prompt}\n\n用户：{user_input}"
-            reply = self.llm_client.invoke(messages).content
+            tokens = estimate_tokens(messages)
+            t0 = time.time()
+            result = self.resilience.call(
+                lambda: self.limiter.run(lambda: self.llm_client.invoke(messages), tokens, INTERACTIVE)
+            )
+            # 网关报了命中前缀缓存的 token 数就记下来（SHOW_CACHE_STATS=1 退出时打印命中率）
+            self.last_cache = PROMPT_CACHE.record(getattr(result, "usage_metadata", None), int((time.time() - t0) * 1000))
+            reply = result.content
+        except RateLimitRejected:
+            reply = "奶奶，这会儿问大模型的人有点多，我排了好一会儿队还没轮上，你过一会儿再问我～"
+        except CircuitOpenError as e:
+            reply = f"奶奶，大模型那边刚才连着出错，我先歇 {e.retry_in:.0f} 秒再去问，你稍等一下再跟我说～"
         except Exception:
             reply = (
                 "奶奶，我去问大模型时它提示目前不可用（可能是额度不足或网络问题）。\n"
@@ -143,8 +199,7 @@ class ProductAgent:
         # 4) 合并工具结果 + 写入记忆
         if extra:
             reply += "\n" + extra
-        if self.memory:
-            self.memory.save_turn(user_input, reply)
+        self._remember(user_input, reply)
         return reply
 
 
@@ -157,24 +212,71 @@ def main():
     if not api_key:
         print("⚠️ 未检测到环境变量 ITEDUS_API_KEY，请在 .env 或系统环境变量中设置。")
 
-    llm_client = ChatOpenAI(
-        model="gpt-4o",
-        api_key=api_key,
-        base_url=base_url,
-        temperature=0.7,
-    )
+    def make_client(base_url: str, api_key: str | None, model: str = "gpt-4o"):
+        from langchain_openai import ChatOpenAI  # 用到才导入：langchain_openai 连带 openai SDK 要一秒多
+
+        return ChatOpenAI(
+            model=model,
+            api_key=api_key,
+            base_url=base_url,
+            temperature=0.7,
+            max_retries=0,  # 重试交给 ProductAgent 的 llm_resilience（不然两层重试叠在一起）
+        )
 
-    memory = SimpleFileMemory(file_path="./memory/nainai_memory.txt")
+    # LLM_ENDPOINTS 配了多个网关：每次调用挑当前最快、最健康的那个（endpoint_pool.py）
+    pool = load_pool(base_url, api_key, "gpt-4o")
+    if pool is not None:
+        print(f"🌐 已配置 {len(pool.endpoints)} 个网关：", ", ".join(ep.name for ep in pool.endpoints))
+        llm_client = PooledChatModel(pool, lambda ep: make_client(ep.base_url, ep.api_key, ep.model))
+    else:
+        llm_client = make_client(base_url, api_key)
+
+    # MEMORY_MODE=segmented：分段滚动日志（旧的单文件会自动迁移进去）
+    # MEMORY_MODE=sqlite：多会话 SQLite 仓库，用 SESSION_ID 区分不同用户
+    memory_mode = os.getenv("MEMORY_MODE", "file")
+    if memory_mode == "segmented":
+        memory = SegmentedFileMemory(file_path="./memory/nainai_memory.txt")
+    elif memory_mode == "sqlite":
+        from session_store import SessionStore  # 会连带导入 langchain_core，只有这种模式用得到
+
+        memory = SessionStore("./memory/sessions.db").memory(os.getenv("SESSION_ID", "nainai"))
+    else:
+        memory = SimpleFileMemory(file_path="./memory/nainai_memory.txt")
     print("🗂️ 记忆文件路径：", memory.path)
-    agent = ProductAgent(llm_client, memory)
+    # 旧对话滚动摘要（后台调用模型）；MEMORY_SUMMARY=0 可以关掉
+    summarizer = RollingSummarizer(llm_client, memory) if os.getenv("MEMORY_SUMMARY", "1") != "0" else None
+
+    # 相关旧记忆召回（需要 numpy）；MEMORY_RECALL=0 可以关掉
+    recall = None
+    if os.getenv("MEMORY_RECALL", "1") != "0":
+        try:
+            from memory_index import MemoryVectorIndex
+            recall = MemoryVectorIndex(memory)
+        except ImportError:
+            print("⚠️ 没装 numpy，跳过相关旧记忆召回。")
+    # LOCAL_FAST_PATH=0：所有问题都交给模型（不走本地快速通道）
+    agent = ProductAgent(
+        llm_client, memory, summarizer=summarizer, recall=recall,
+        fast_path=os.getenv("LOCAL_FAST_PATH", "1") != "0",
+    )
 
     while True:
         user_input = input("\n奶奶说：").strip()
         if user_input in ["退出", "exit", "bye", "quit"]:
             print("助手：好的奶奶，我们下次接着聊～")
+            if os.getenv("SHOW_TOOL_STATS"):
+                print("（工具调用统计：", agent.tools.stats(), "）")
+            if pool is not None and os.getenv("SHOW_ENDPOINT_STATS"):
+                print("（网关统计：", pool.stats(), "）")
+            if os.getenv("SHOW_LIMITER_STATS"):
+                print("（限速排队：", agent.limiter.stats(), "）")
+            if os.getenv("SHOW_CACHE_STATS"):
+                print("（提示前缀缓存：", PROMPT_CACHE.stats(), "）")
             break
         answer = agent.run(user_input)
         print("助手：", answer)
+        if os.getenv("SHOW_TOKEN_USAGE") and agent.last_token_usage:
+            print("（token 用量：", agent.last_token_usage.as_dict(), "）")
 
 
 if __name__ == "__main__":
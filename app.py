@@ -3,133 +3,20 @@ os.environ["OPENAI_API_KEY"] = "sk-mE3e4kW3oIYfnC9F0fC3Af298bE34f5aB264235562A0D
 os.environ["OPENAI_BASE_URL"] = "https://apis.itedus.cn/v1"
 os.environ["OPENAI_MODEL"] = "gpt-4o"
 
-import time
-import json
-import datetime
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict
 
-import requests
 import streamlit as st
-from duckduckgo_search import DDGS
-
-
-# ===================== 0) 小工具：联网搜索 =====================
-def web_search(query: str, max_results: int = 5) -> str:
-    """
-    用 DuckDuckGo 搜索，返回合并后的精简文本，方便喂给大模型。
-    """
-    if not query.strip():
-        return ""
-    items = []
-    try:
-        with DDGS() as ddgs:
-            for i, r in enumerate(ddgs.text(query, max_results=max_results)):
-                # r: {'title','href','body'}
-                title = r.get("title", "").strip()
-                href = r.get("href", "").strip()
-                body = r.get("body", "").strip()
-                items.append(f"{i+1}. {title}\nURL: {href}\n摘要: {body}")
-    except Exception as e:
-        items.append(f"（搜索失败：{e}）")
-    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    joined = "\n\n".join(items) if items else "（没有搜索结果）"
-    return f"【联网搜索·{ts}】\n查询：{query}\n\n{joined}"
-
-
-# ===================== 1) 适配器：调用 itedus.cn =====================
-@dataclass
-class AgentOutput:
-    text: str
-    tool_calls: List[Dict[str, Any]]
-    latency_ms: int
-
-
-class AgentAdapter:
-    """
-    把对话历史 messages 发到 itedus.cn，并返回回复。
-    支持可选的“先联网搜索，再让模型综合回答”。
-    """
-
-    def __init__(self, base_url: Optional[str], api_key: Optional[str], model: str, system_prompt: str):
-        # 默认 itedus；可被侧边栏/环境变量覆盖
-        self.base_url = (base_url or os.getenv("OPENAI_BASE_URL") or "https://apis.itedus.cn/v1").rstrip("/")
-        self.api_key = (api_key or os.getenv("OPENAI_API_KEY") or "").strip()
-        self.model = (model or os.getenv("OPENAI_MODEL") or "gpt-4o").strip()
-        self.system_prompt = system_prompt
-
-    def _call_agent(
-        self,
-        messages: List[Dict[str, str]],
-        auto_search: bool = False,
-        search_k: int = 5
-    ) -> AgentOutput:
-        """真正去请求 itedus.cn 的 /chat/completions"""
-        start = time.time()
-
-        # 1) 注入“当前本机时间”的 system 提示（方便回答日期/星期）
-        now = datetime.datetime.now()
-        weekday_map = ["一", "二", "三", "四", "五", "六", "日"]
-        time_hint = (
-            f"当前本机本地时间：{now.strftime('%Y-%m-%d %H:%M:%S')}，"
-            f"星期{weekday_map[now.weekday()] if now.weekday() < 7 else '?'}。"
-            "当用户询问日期、星期或‘今天几号’等时，请基于此时间直接回答。"
-        )
-
-        msg_list = messages[:]
-        if not msg_list or msg_list[0].get("role") != "system":
-            msg_list = [{"role": "system", "content": self.system_prompt or ""}] + msg_list
-        # 把时间提示也并入
-        msg_list = [{"role": "system", "content": time_hint}] + msg_list
-
-        # 2) 如勾选“自动联网搜索”，先查资料再给模型
-        if auto_search:
-            # 取用户最新一句作为搜索词
-            last_user = ""
-            for m in reversed(msg_list):
-                if m.get("role") == "user":
-                    last_user = m.get("content", "")
-                    break
-            search_text = web_search(last_user, max_results=search_k)
-            # 把搜索结果作为 system 信息注入，要求“基于这些结果回答，并标注可能的不确定性”
-            search_system = (
-                "以下是联网搜索到的资料（可能包含噪声）。"
-                "请先阅读，再结合用户问题给出**可信且简明**的答案；"
-                "如资料不足或相互矛盾，请如实说明不确定性：\n\n" + search_text
-            )
-            msg_list = [{"role": "system", "content": search_system}] + msg_list
-
-        # 3) 调 itedus.cn
-        url = f"{self.base_url}/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}",
-        }
-        payload = {
-            "model": self.model,
-            "messages": msg_list,
-        }
-
-        reply_text = ""
-        tool_calls: List[Dict[str, Any]] = []
-        try:
-            resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-            result = resp.json() if resp.content else {}
-            tool_calls.append(result)
-            if resp.status_code != 200:
-                err_msg = result.get("error", {}).get("message", f"HTTP {resp.status_code}")
-                reply_text = f"❌ 接口返回错误：{err_msg}"
-            else:
-                reply_text = result["choices"][0]["message"]["content"]
-        except Exception as e:
-            reply_text = f"❌ 请求失败：{e}"
 
-        latency = int((time.time() - start) * 1000)
-        return AgentOutput(text=reply_text, tool_calls=tool_calls, latency_ms=latency)
+from agent_adapter import AgentAdapter, AgentOutput
+from endpoint_pool import EndpointPool, load_pool
+from history_manager import HistoryManager, llm_summarizer
+from http_client import warm_up
+from rate_limiter import BACKGROUND
+from search_tools import SEARCH_POOL
+from text_utils import count_tokens
+from ttl_cache import TieredCache
 
-    def chat(self, history: List[Dict[str, str]], user_text: str, auto_search: bool, search_k: int) -> AgentOutput:
-        messages = history + [{"role": "user", "content": user_text}]
-        return self._call_agent(messages, auto_search=auto_search, search_k=search_k)
+# 0) 联网搜索、1) 调网关的适配器 都在 agent_adapter.py
 
 
 # ===================== 2) Streamlit UI（聊天气泡 + 侧边栏） =====================
@@ -147,10 +34,27 @@ with st.sidebar.expander("对话与显示"):
     show_tools = st.checkbox("显示工具调用记录", value=True)
     show_latency = st.checkbox("显示响应耗时", value=True)
     keep_memory = st.checkbox("保留上下文记忆（关掉则每次当新对话）", value=True)
+    # 发给模型的只有最近几轮（CHAT_HISTORY_TURNS / CHAT_HISTORY_TOKENS），更早的折叠成摘要或直接丢掉
+    summarize_old = st.checkbox("更早的对话自动压缩成摘要", value=True)
+    stream_reply = st.checkbox("流式输出（边生成边显示）", value=True)
+    # 页面只画最近这么多条消息的气泡，更早的收起来（CHAT_RENDER_WINDOW，默认 40）：
+    # 几百条的长对话，每次重跑也只画这几十条
+    render_window = int(os.getenv("CHAT_RENDER_WINDOW", "40"))
+    # 页面上最多留这么多条消息（CHAT_DISPLAY_MAX，默认 1000），再多就把最旧的删掉，会话占的内存有上限
+    display_max = int(os.getenv("CHAT_DISPLAY_MAX", "1000"))
 
 with st.sidebar.expander("联网搜索（可选）", expanded=True):
     auto_search = st.checkbox("自动联网搜索（先搜再回答）", value=True)
     search_k = st.slider("每次搜索条数", 3, 10, 5, 1)
+    search_deadline = st.slider("搜索最多等（秒）", 1.0, 10.0, 3.0, 0.5)
+    search_news = st.checkbox("同时搜新闻", value=False)
+    deep_search = st.checkbox("深度搜索（抓前几个网页的正文，慢一些）", value=False)
+    search_budget = st.slider("搜索资料最多占多少 token（0 = 不筛选）", 0, 4000, 1200, 100)
+
+with st.sidebar.expander("回答缓存（可选）"):
+    use_cache = st.checkbox("相同问题直接用缓存的回答", value=False)
+    cache_ttl_min = st.slider("缓存有效期（分钟）", 1, 240, 30, 1)
+    cache_on_disk = st.checkbox("缓存写到磁盘（重启后还在）", value=False)
 
 st.sidebar.caption("提示：使用 itedus.cn 时，Base URL 设为 https://apis.itedus.cn/v1 即可。")
 
@@ -159,31 +63,120 @@ st.title("🤖 Agent7 Web")
 st.caption("像聊天一样下指令，它会自动去做（带记忆 & 联网搜索 & 工具调用记录）")
 
 # --- Session State ---
-if "history" not in st.session_state:
-    st.session_state.history: List[Dict[str, str]] = [{"role": "system", "content": ""}]
+# 发给模型的对话历史：有窗口、有 token 预算，移出窗口的折叠成摘要（history_manager.py）
+if "history_manager" not in st.session_state:
+    st.session_state.history_manager = HistoryManager.from_env("")
 if "chat_display" not in st.session_state:
     st.session_state.chat_display: List[Dict[str, str]] = []
 
-# --- 初始化适配器 ---
-adapter = AgentAdapter(base_url=base_url, api_key=api_key, model=model, system_prompt=system_prompt)
+# --- 回答缓存：放在 cache_resource 里，页面每次重跑都拿到同一个对象 ---
+@st.cache_resource
+def get_response_cache(ttl_s: int, on_disk: bool) -> TieredCache:
+    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses.db") if on_disk else None
+    return TieredCache(maxsize=512, ttl=ttl_s, db_path=db_path, table="responses")
+
+
+# --- 多网关（环境变量 LLM_ENDPOINTS）：网关池也要跨重跑保留，耗时 / 错误率统计才有意义 ---
+@st.cache_resource
+def get_endpoint_pool(base_url: str, api_key: str, model: str) -> EndpointPool | None:
+    return load_pool(base_url, api_key, model)
+
+
+endpoint_pool = get_endpoint_pool(base_url, api_key, model)
+if endpoint_pool is not None:
+    st.sidebar.caption(f"已配置 {len(endpoint_pool.endpoints)} 个网关（LLM_ENDPOINTS），每次自动挑最快、最健康的那个。")
+
+
+# --- 适配器：同一份配置只建一次（页面每次重跑、每个会话都拿同一个），配置改了才换新的 ---
+@st.cache_resource(max_entries=16)
+def get_adapter(
+    base_url: str,
+    api_key: str,
+    model: str,
+    system_prompt: str,
+    search_deadline: float,
+    search_news: bool,
+    deep_search: bool,
+    search_budget: int,
+    use_cache: bool,
+    cache_ttl_s: int,
+    cache_on_disk: bool,
+) -> AgentAdapter:
+    return AgentAdapter(
+        base_url=base_url,
+        api_key=api_key,
+        model=model,
+        system_prompt=system_prompt,
+        cache=get_response_cache(cache_ttl_s, cache_on_disk) if use_cache else None,
+        search_deadline_s=search_deadline,
+        search_sources=("text", "news") if search_news else ("text",),
+        deep_search=deep_search,
+        search_token_budget=search_budget,
+        pool=get_endpoint_pool(base_url, api_key, model),
+    )
+
+
+# --- 进程级单例本来就跨重跑保留：连接池（http_client）、DDGS 客户端（search_tools）、分词器（text_utils）；
+#     每个网关地址第一次出现时在后台先把连接建好、分词器加载好，第一条消息不用再等 ---
+@st.cache_resource
+def warm_shared_clients(base_url: str) -> bool:
+    SEARCH_POOL.submit(warm_up, base_url)
+    SEARCH_POOL.submit(count_tokens, "预热分词器")
+    return True
+
+
+warm_shared_clients(base_url)
+adapter = get_adapter(
+    base_url, api_key, model, system_prompt, search_deadline, search_news, deep_search, search_budget,
+    use_cache, cache_ttl_min * 60, cache_on_disk,
+)
+history = st.session_state.history_manager
+# 摘要用当前这份配置的适配器发，走后台优先级排队，不和聊天抢配额
+history.summarize = llm_summarizer(lambda m: adapter.complete(m, priority=BACKGROUND)) if summarize_old else None
 
 # 若切换了 system prompt 或关闭记忆，需要重置对话
 def reset_dialog():
-    st.session_state.history = [{"role": "system", "content": system_prompt if keep_memory else ""}]
+    history.reset(system_prompt if keep_memory else "")
     st.session_state.chat_display = []
+    st.session_state.pop("older_md", None)
 
 # 在侧边栏提供重置按钮
 with st.sidebar:
     if st.button("🧹 清空/重置对话"):
         reset_dialog()
-        st.experimental_rerun()
+        st.rerun()
 
 # 首次进入时，确保 system prompt 已设置
-if st.session_state.history and st.session_state.history[0].get("content", "") != (system_prompt if keep_memory else ""):
+if history.system_prompt != (system_prompt if keep_memory else ""):
     reset_dialog()
 
-# --- 渲染历史聊天气泡 ---
-for m in st.session_state.chat_display:
+if keep_memory and len(history):
+    stats = history.stats()
+    st.sidebar.caption(
+        f"🧠 带给模型最近 {stats['kept']} 轮（约 {stats['tokens']} token）"
+        + (f"，更早的 {stats['summarized']} 轮已压缩成摘要" if stats["summarized"] else "")
+    )
+
+# --- 渲染历史聊天气泡：只画最近 render_window 条，更早的合成一段，勾上才显示 ---
+def older_markdown(messages: List[Dict[str, str]]) -> str:
+    """窗口外的旧消息拼成一段 markdown；存在 session_state 里，新滚出窗口的消息接在后面，不每次重拼。"""
+    count, text = st.session_state.get("older_md", (0, ""))
+    if count > len(messages):
+        count, text = 0, ""
+    parts = [text] if text else []
+    for m in messages[count:]:
+        who = "🧑 **你**" if m["role"] == "user" else "🤖 **助手**"
+        parts.append(f"{who}：\n\n{m['content']}")
+    text = "\n\n---\n\n".join(parts)
+    st.session_state.older_md = (len(messages), text)
+    return text
+
+
+display = st.session_state.chat_display
+split = max(0, len(display) - render_window)
+if split and st.toggle(f"📜 显示更早的 {split} 条消息", key="show_older"):
+    st.markdown(older_markdown(display[:split]))
+for m in display[split:]:
     with st.chat_message("user" if m["role"] == "user" else "assistant"):
         st.markdown(m["content"])
 
@@ -199,25 +192,41 @@ if user_text:
 
     # 2) 调 Agent
     with st.chat_message("assistant"):
-        with st.spinner("思考中..."):
-            out: AgentOutput = adapter.chat(
-                st.session_state.history,
+        if stream_reply:
+            reply = adapter.chat_stream(
+                history.messages(with_history=keep_memory),
                 user_text,
                 auto_search=auto_search,
                 search_k=search_k
             )
-        st.markdown(out.text)
+            st.write_stream(reply)  # 每来一段就追加到气泡里
+            out: AgentOutput = reply.output
+        else:
+            with st.spinner("思考中..."):
+                out = adapter.chat(
+                    history.messages(with_history=keep_memory),
+                    user_text,
+                    auto_search=auto_search,
+                    search_k=search_k
+                )
+            st.markdown(out.text)
         if show_latency:
-            st.caption(f"⏱️ {out.latency_ms} ms")
+            if out.cached:
+                st.caption(f"⚡ 缓存命中 · {out.latency_ms} ms")
+            elif out.ttft_ms is not None:
+                st.caption(f"⏱️ 首字 {out.ttft_ms} ms · 总计 {out.latency_ms} ms")
+            else:
+                st.caption(f"⏱️ {out.latency_ms} ms")
         if show_tools and out.tool_calls:
             st.markdown("**🔧 工具调用记录（含原始返回）**")
             st.json(out.tool_calls)
 
-    # 3) 更新历史
+    # 3) 更新历史（超出窗口的旧轮次在 append 里移出，后台折叠成摘要）
     if keep_memory:
-        st.session_state.history.append({"role": "user", "content": user_text})
-        st.session_state.history.append({"role": "assistant", "content": out.text})
-    else:
-        st.session_state.history = [{"role": "system", "content": system_prompt}]
+        history.append(user_text, out.text)
 
     st.session_state.chat_display.append({"role": "assistant", "content": out.text})
+    overflow = len(st.session_state.chat_display) - display_max
+    if overflow > 0:
+        del st.session_state.chat_display[:overflow]
+        st.session_state.pop("older_md", None)  # 开头变了，收起来的那段要重拼
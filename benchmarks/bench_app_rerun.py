@@ -0,0 +1,94 @@
+# =========================================
+# benchmarks/bench_app_rerun.py
+# Streamlit 每次交互都把 app.py 从头跑一遍：对话很长时，一次重跑要多久
+# 用 streamlit 自带的 AppTest 在本进程里跑 app.py，会话里先塞 --messages 条历史消息，
+# 然后来回切换一个侧边栏选项重跑 --reruns 次（不调模型），看每次重跑的耗时、页面上画了几个气泡
+# 对比：
+#  - 改之前：每次重跑都新建 AgentAdapter（连同回答缓存、网关池），每条消息都画
+#    （让 st.cache_resource 对这几个函数不生效，CHAT_RENDER_WINDOW 设成很大）
+#  - 现在：适配器等用 st.cache_resource 跨重跑复用，只画最近 40 条
+# 两边都打开“回答缓存”，这样改之前那边每次也要建缓存；顺便数重跑期间 AgentAdapter 建了几次
+# 用法：python benchmarks/bench_app_rerun.py [--messages 500] [--reruns 20]
+# =========================================
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import agent_adapter  # noqa: E402
+import streamlit as st  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+built = 0
+_init = agent_adapter.AgentAdapter.__init__
+
+
+def counting_init(self, *args, **kwargs):
+    global built
+    built += 1
+    _init(self, *args, **kwargs)
+
+
+agent_adapter.AgentAdapter.__init__ = counting_init
+
+# 改之前 app.py 每次重跑都直接新建的东西
+REBUILT_EACH_RERUN = {"get_adapter", "get_response_cache", "get_endpoint_pool"}
+_cache_resource = st.cache_resource
+
+
+def uncached_resource(fn=None, **kwargs):
+    """替身 st.cache_resource：REBUILT_EACH_RERUN 里的函数原样返回（每次都真的执行），其余照常缓存。"""
+    if fn is None:
+        return lambda f: uncached_resource(f, **kwargs)
+    return fn if fn.__name__ in REBUILT_EACH_RERUN else _cache_resource(fn, **kwargs)
+
+
+def run(label: str, cached: bool, window: int, base_url: str, args):
+    global built
+    os.environ["CHAT_RENDER_WINDOW"] = str(window)
+    st.cache_resource = _cache_resource if cached else uncached_resource
+    _cache_resource.clear()
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=60).run()
+    at.sidebar.text_input[1].set_value(base_url).run()
+    next(cb for cb in at.sidebar.checkbox if cb.label.startswith("相同问题直接用缓存")).set_value(True).run()
+    at.session_state["chat_display"] = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"第 {i} 条消息：**加粗**、`代码`、[链接](https://example.com)。" * 3}
+        for i in range(args.messages)
+    ]
+    at.run()
+    built = 0
+    samples = []
+    for i in range(args.reruns):
+        t0 = time.perf_counter()
+        at.sidebar.checkbox[0].set_value(i % 2 == 0).run()  # 切换“显示工具调用记录”：和敲字、点设置一样触发整页重跑
+        samples.append((time.perf_counter() - t0) * 1000)
+    print(
+        f"{label}：每次重跑 p50 {statistics.median(samples):.0f} ms，max {max(samples):.0f} ms，"
+        f"画了 {len(at.chat_message)} 个气泡，新建 AgentAdapter {built} 次"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_gateway()
+    try:
+        run("改之前（每次新建、每条都画）", False, 10**9, base_url, args)
+        run("现在（跨重跑复用、只画 40 条）", True, 40, base_url, args)
+    finally:
+        st.cache_resource = _cache_resource
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# =========================================
+# benchmarks/bench_async_batch.py
+# 批量跑对话：同步 AgentAdapter 一条条发 vs AsyncAgentAdapter.chat_many 并发发
+# 默认打本地假网关（每个请求模拟 --latency-ms 的生成耗时）
+# 用法：python benchmarks/bench_async_batch.py [--requests 300] [--concurrency 100] [--latency-ms 200]
+# =========================================
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import http_client  # noqa: E402
+from agent_adapter import AgentAdapter, AsyncAgentAdapter  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--sync-requests", type=int, default=20, help="同步版太慢，只跑这么多条再按条数折算")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_gateway(latency_ms=args.latency_ms)
+    conversations = [[{"role": "user", "content": f"第 {i} 道评测题"}] for i in range(args.requests)]
+
+    adapter = AgentAdapter(base_url, "sk-mock", "mock-model", "你是评测助手")
+    t0 = time.perf_counter()
+    for messages in conversations[:args.sync_requests]:
+        adapter._call_agent(messages)
+    sync_rps = args.sync_requests / (time.perf_counter() - t0)
+
+    async def run_batch():
+        async with AsyncAgentAdapter(base_url, "sk-mock", "mock-model", "你是评测助手",
+                                     max_connections=args.concurrency) as async_adapter:
+            return await async_adapter.chat_many(conversations, concurrency=args.concurrency, timeout=30)
+
+    t0 = time.perf_counter()
+    outputs = asyncio.run(run_batch())
+    batch_s = time.perf_counter() - t0
+    async_rps = len(outputs) / batch_s
+
+    in_order = all(f"第 {i} 道" in out.text for i, out in enumerate(outputs))
+    failed = sum(out.text.startswith("❌") for out in outputs)
+    print(f"同步一条条发：{sync_rps:7.1f} 条/秒（{args.requests} 条约需 {args.requests / sync_rps:.1f} s）")
+    print(f"chat_many（并发 {args.concurrency}）：{async_rps:7.1f} 条/秒（{args.requests} 条实际 {batch_s:.1f} s）")
+    print(f"结果顺序和输入一致：{in_order}，失败 {failed} 条，提速约 {async_rps / sync_rps:.0f} 倍")
+
+    http_client.close_all()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# =========================================
+# benchmarks/bench_deep_search.py
+# 深度搜索抓网页：本地起一个网页夹具服务器（正常文章 / GBK / 超大页 / 很慢的页 / PDF / 404），
+# 看并发抓取的总耗时、每个网站的并发上限、字节上限和总截止时间是否生效
+# 用法：python benchmarks/bench_deep_search.py [--pages 12] [--page-delay-ms 300] [--deadline 2]
+# =========================================
+
+import argparse
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from deep_search import fetch_pages  # noqa: E402
+
+ARTICLE = """<!doctype html><html><head><meta charset="utf-8"><title>第{n}篇</title>
+<script>var tracker = "不应该出现在正文里";</script><style>body{{color:red}}</style></head>
+<body><nav><a href="/">首页</a> <a href="/news">新闻</a> <a href="/about">关于我们</a></nav>
+<article><h1>老年人高血压日常管理指南（第{n}篇）</h1>
+<p>高血压是老年人最常见的慢性病之一。每天早晚各量一次血压，并记录下来，复诊时给医生看。</p>
+<p>降压药要按医嘱每天固定时间服用，不能觉得血压正常了就自己停药，否则血压容易反弹。</p>
+<p>饮食上少盐少油，每天食盐不超过五克；适量散步、打太极等运动也有帮助。</p></article>
+<div class="related"><a href="/1">相关文章一的标题比较长</a><a href="/2">相关文章二的标题也比较长</a></div>
+<footer>版权所有 © 2025 某某健康网 · 京ICP备00000000号</footer></body></html>"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    page_delay_ms = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端读够了字节上限就断开，正常
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            if url.path.startswith("/article"):
+                time.sleep(int(query.get("delay", [self.page_delay_ms])[0]) / 1000)
+                self._send(200, ARTICLE.format(n=url.path.rsplit("/", 1)[-1]).encode("utf-8"), "text/html; charset=utf-8")
+            elif url.path == "/gbk":
+                html = ARTICLE.format(n="GBK").replace('charset="utf-8"', 'charset="gbk"')
+                self._send(200, html.encode("gbk", errors="xmlcharrefreplace"), "text/html")
+            elif url.path == "/big":
+                self._send(200, ARTICLE.format(n="大").encode("utf-8") * 20000, "text/html; charset=utf-8")
+            elif url.path == "/slow":
+                time.sleep(10)
+                self._send(200, b"<p>too late</p>", "text/html")
+            elif url.path == "/pdf":
+                self._send(200, b"%PDF-1.4", "application/pdf")
+            else:
+                self._send(404, b"not found", "text/plain")
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+def start_fixture_server(**options):
+    handler = type("ConfiguredFixture", (FixtureHandler,), options)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.lock, server.active, server.peak = threading.Lock(), 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--page-delay-ms", type=int, default=300)
+    parser.add_argument("--deadline", type=float, default=2.0)
+    parser.add_argument("--per-host", type=int, default=4)
+    args = parser.parse_args()
+
+    server, base = start_fixture_server(page_delay_ms=args.page_delay_ms)
+    port = server.server_address[1]
+
+    # ① 同一个网站的一批文章：看并发上限
+    urls = [f"{base}/article/{i}" for i in range(args.pages)]
+    t0 = time.perf_counter()
+    pages = fetch_pages(urls, deadline_s=30, per_host=args.per_host)
+    elapsed = time.perf_counter() - t0
+    serial = args.pages * args.page_delay_ms / 1000
+    print(f"同一网站 {args.pages} 页（每页 {args.page_delay_ms} ms）：{elapsed:.2f} s（串行约 {serial:.1f} s），"
+          f"服务器同时在处理的请求最多 {server.peak} 个（上限 {args.per_host}）")
+    sample = pages[0]
+    print("正文抽取示例：", sample.text.replace("\n", " / ")[:120], "…")
+    print("  脚本/导航/页脚被去掉：", all(w not in sample.text for w in ("tracker", "关于我们", "版权所有")))
+
+    # ② 各种异常页面混在一起 + 总截止时间
+    mixed = [f"{base}/article/ok", f"http://localhost:{port}/gbk", f"{base}/big", f"{base}/slow", f"{base}/pdf", f"{base}/404"]
+    t0 = time.perf_counter()
+    pages = fetch_pages(mixed, deadline_s=args.deadline, max_bytes=256 * 1024)
+    elapsed = time.perf_counter() - t0
+    print(f"\n混合页面（总截止 {args.deadline} s）：实际 {elapsed:.2f} s")
+    for page in pages:
+        print(f"  {page.status:<8} {page.ms:>5} ms {page.bytes:>8} B  {len(page.chunks):>2} 块  {page.url.split('/', 3)[-1]:<12} {page.error}")
+    print("  GBK 页面正确解码：", "高血压" in pages[1].text)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# =========================================
+# benchmarks/bench_endpoint_pool.py
+# 三个假网关：A 最快（跑到一半开始 50% 回 503）、B 稍慢但稳定、C 过载（慢，且 5% 的请求慢 1.5 秒）
+# 同一批请求（--concurrency 个线程一起发），三种用法对比：只用 A / 三个轮询 / EndpointPool 按 EWMA 挑
+# 三种都套同样的 llm_resilience 重试，看成功率、p50 / p99、请求落在哪个网关
+# 用法：python benchmarks/bench_endpoint_pool.py [--requests 400] [--concurrency 8]
+# =========================================
+
+import argparse
+import itertools
+import statistics
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from agent_adapter import AgentAdapter  # noqa: E402
+from endpoint_pool import Endpoint, EndpointPool  # noqa: E402
+from llm_resilience import CircuitBreaker, ResilientCaller, RetryPolicy  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+
+
+class RoundRobinPool(EndpointPool):
+    """对照组：不看耗时和错误，挨个轮。"""
+
+    def __init__(self, endpoints):
+        super().__init__(endpoints)
+        self._cycle = itertools.cycle(endpoints)
+        self._rr_lock = threading.Lock()
+
+    def pick(self, exclude=()):
+        with self._rr_lock:
+            for ep in self._cycle:
+                if ep.name not in exclude or len(exclude) >= len(self.endpoints):
+                    ep.inflight += 1
+                    return ep
+
+
+def start_gateways():
+    a, url_a = start_mock_gateway(latency_ms=30)
+    b, url_b = start_mock_gateway(latency_ms=45)
+    c, url_c = start_mock_gateway(latency_ms=150, slow_rate=0.05, slow_ms=1500)
+    return [a, b, c], [url_a, url_b, url_c]
+
+
+def run(label: str, pool: EndpointPool, servers, n: int, concurrency: int):
+    servers[0].RequestHandlerClass.fail_rate = 0.0
+    adapter = AgentAdapter(
+        pool.endpoints[0].base_url, "sk-bench", "gpt-4o", "你是助手", pool=pool,
+        resilience=ResilientCaller(retry=RetryPolicy(attempts=3, base_delay=0.05), breaker=CircuitBreaker(10**9)),
+    )
+    done = Counter()
+
+    def one(i: int):
+        if i == n // 2:
+            servers[0].RequestHandlerClass.fail_rate = 0.5  # A 开始出故障
+        out = adapter.chat([], f"第 {i} 个问题", auto_search=False, search_k=0)
+        llm = next((t for t in out.tool_calls if t.get("stage") == "llm"), {})
+        done[llm.get("endpoint", "?")] += 1
+        return out.latency_ms, out.text.startswith("（假网关）")
+
+    with ThreadPoolExecutor(concurrency) as ex:
+        results = list(ex.map(one, range(n)))
+    samples = sorted(ms for ms, _ in results)
+    ok = sum(good for _, good in results)
+    share = "，".join(f"{name} {done[name]}" for name in sorted(done))
+    print(
+        f"{label}：成功 {ok}/{n}，p50 {statistics.median(samples):.0f} ms，"
+        f"p99 {samples[int(n * 0.99) - 1]:.0f} ms，平均 {statistics.mean(samples):.0f} ms（{share}）"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    servers, urls = start_gateways()
+    endpoints = lambda: [Endpoint(name, url, "sk-bench", "gpt-4o") for name, url in zip("ABC", urls)]  # noqa: E731
+    try:
+        run("只用 A    ", EndpointPool(endpoints()[:1]), servers, args.requests, args.concurrency)
+        run("三个轮询  ", RoundRobinPool(endpoints()), servers, args.requests, args.concurrency)
+        pool = EndpointPool(endpoints())
+        run("EWMA 路由", pool, servers, args.requests, args.concurrency)
+        for name, s in pool.stats().items():
+            print(f"  {name}: {s}")
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# =========================================
+# benchmarks/bench_history.py
+# 长对话聊 --turns 轮（不调模型）：每轮拼一次要发的 messages（AgentAdapter._prepare）、序列化成请求体
+# 对比：改之前的 st.session_state.history（列表只增不减，每次整个发出去） vs HistoryManager（窗口 + 摘要）
+# 看每轮拼消息 + 序列化的耗时、请求体多大、对话历史本身占多少内存（tracemalloc）
+# 摘要用一个假的 summarize（只拼字符串，不调模型），所以这里只看本地的开销
+# 用法：python benchmarks/bench_history.py [--turns 2000] [--reply-chars 300]
+# =========================================
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from agent_adapter import AgentAdapter  # noqa: E402
+from history_manager import HistoryManager  # noqa: E402
+
+SYSTEM_PROMPT = "你是中文助理，会在需要时使用工具并保留对话记忆，回答简洁友好。"
+
+
+def fake_summarize(summary: str, turns) -> str:
+    return (summary + "".join(f"· {turn.user[:20]}\n" for turn in turns))[-600:]
+
+
+class ListHistory:
+    """对照组：改之前 app.py 的写法。"""
+
+    def __init__(self):
+        self.history = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+    def messages(self):
+        return self.history
+
+    def append(self, user: str, assistant: str):
+        self.history.append({"role": "user", "content": user})
+        self.history.append({"role": "assistant", "content": assistant})
+
+
+def run(label: str, make_history, adapter: AgentAdapter, args):
+    # 先小跑一段不计：第一次用到才导入的模块、分词器等别算进历史占的内存
+    warm = make_history()
+    for t in range(50):
+        adapter._prepare(warm.messages() + [{"role": "user", "content": "预热"}])
+        warm.append(f"预热 {t}", "好" * args.reply_chars)
+    time.sleep(0.2)
+    del warm
+
+    tracemalloc.start()
+    history = make_history()
+    build_ms, sizes = [], []
+    for t in range(args.turns):
+        question = f"第 {t} 个问题：这个概念怎么理解？"
+        t0 = time.perf_counter()
+        msg_list, *_ = adapter._prepare(history.messages() + [{"role": "user", "content": question}])
+        body = json.dumps({"model": adapter.model, "messages": msg_list}, ensure_ascii=False).encode("utf-8")
+        build_ms.append((time.perf_counter() - t0) * 1000)
+        sizes.append(len(body))
+        history.append(question, f"第 {t} 个回答：" + "好" * args.reply_chars)
+    time.sleep(0.2)  # 等后台折叠做完
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tail = build_ms[-100:]
+    print(
+        f"{label}：最后一轮发 {len(msg_list)} 条消息、请求体 {sizes[-1] / 1024:.0f} KB；"
+        f"拼消息+序列化 最后100轮 p50 {statistics.median(tail):.2f} ms；"
+        f"历史占内存 {current / 1024:.0f} KB（峰值 {peak / 1024:.0f} KB）"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--reply-chars", type=int, default=300)
+    args = parser.parse_args()
+
+    adapter = AgentAdapter("http://127.0.0.1:9", "sk-bench", "gpt-4o", SYSTEM_PROMPT)
+    run("列表只增不减（旧）", ListHistory, adapter, args)
+    run("HistoryManager（新）", lambda: HistoryManager.from_env(SYSTEM_PROMPT, summarize=fake_summarize), adapter, args)
+
+
+if __name__ == "__main__":
+    main()
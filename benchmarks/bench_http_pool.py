@@ -0,0 +1,71 @@
+# =========================================
+# benchmarks/bench_http_pool.py
+# 每次 requests.post（每次新建连接） vs 共享连接池（http_client.py）的单次请求开销
+# 默认打本地假网关，每条新连接模拟 --handshake-ms 的握手耗时（本机回环上握手几乎不花时间）；
+# --url 可以换成真实网关，看实际的 DNS + TCP + TLS 开销
+# 用法：python benchmarks/bench_http_pool.py [--requests 200] [--handshake-ms 30] [--url https://apis.itedus.cn/v1]
+# =========================================
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import http_client  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+
+
+def run(label: str, post, n: int, url: str, headers: dict, server=None):
+    payload = {"model": "gpt-4o", "messages": [{"role": "user", "content": "夸夸90岁的奶奶"}]}
+    post(url, payload, headers)  # 热身（池子里先有一条连接）
+    opened = server.connections if server else 0
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        resp = post(url, payload, headers)
+        resp.json()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    conns = f"   新建连接 {server.connections - opened} 次" if server else ""
+    print(f"{label:<28} 中位数 {statistics.median(samples):7.2f} ms   p95 {samples[int(n * 0.95) - 1]:7.2f} ms{conns}")
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--url", default="", help="留空则起一个本地假网关")
+    parser.add_argument("--handshake-ms", type=int, default=30, help="假网关每条新连接模拟的握手耗时")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url.rstrip("/")
+    if not base_url:
+        server, base_url = start_mock_gateway(handshake_ms=args.handshake_ms)
+    url = f"{base_url}/chat/completions"
+    headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', 'sk-mock')}"}
+
+    cold = run("requests.post（每次新连接）", lambda u, p, h: requests.post(u, json=p, headers=h, timeout=60),
+               args.requests, url, headers, server)
+    pooled = run("http_client 连接池", lambda u, p, h: http_client.post_json(u, p, h), args.requests, url, headers, server)
+    try:
+        import httpx  # noqa: F401
+        os.environ["HTTP_CLIENT"] = "httpx"
+        run("http_client（httpx）", lambda u, p, h: http_client.post_json(u, p, h), args.requests, url, headers, server)
+    except ImportError:
+        print("（没装 httpx，跳过）")
+    print(f"连接池每个请求省下约 {cold - pooled:.2f} ms")
+
+    http_client.close_all()
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# =========================================
+# benchmarks/bench_local_router.py
+# 本地快速通道：同一批常见问题（一半是纯算式 / 问日期），ProductAgent 开 / 关 fast_path 各跑一遍，
+# 看调了几次模型、每句的耗时；再单独测 LocalRouter.route 本身要几微秒
+# 最后检查一批不该本地算的句子（超大数、日期、范围等）确实交给了模型，有误算时退出码为 1
+# 模型是本地假网关（每次调用模拟 --latency-ms 的生成耗时）
+# 用法：python benchmarks/bench_local_router.py [--latency-ms 300]
+# =========================================
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from langchain_openai import ChatOpenAI  # noqa: E402
+
+from ai_study_agent import ProductAgent  # noqa: E402
+from local_router import LocalRouter, find_calculation  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+
+QUESTIONS = [
+    "12.5×8 等于多少",
+    "帮我算一下 (1200-350)/3",
+    "今天几号",
+    "明天星期几？",
+    "现在几点了",
+    "3 乘以 4 是多少",
+    "我想学 prompt 该从哪开始？",
+    "帮我算 3*7，顺便夸夸我",
+    "AI 产品经理每天都做什么？",
+    "我打算明天去公园，有什么建议",
+]
+# 不该本地算的：数太大、从更大的词里截出来的数、日期 / 范围（route 返回 None，ProductAgent 也不附加“顺便算了一下”）
+NOT_LOCAL = [
+    "帮我算一下 " + "999999**64*" * 18 + "1",
+    "9**9**9 等于几",
+    "1e5*2",
+    "10/18 去医院，帮我算一下挂号费",
+    "3-5号楼怎么走，帮我算下",
+]
+
+
+def run_agent(base_url: str, fast_path: bool, server) -> tuple[list[float], int]:
+    llm = ChatOpenAI(model="gpt-4o", api_key="sk-bench", base_url=base_url, temperature=0.7)
+    agent = ProductAgent(llm, memory=None, fast_path=fast_path)
+    before = server.requests
+    samples = []
+    for q in QUESTIONS:
+        t0 = time.perf_counter()
+        agent.run(q)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples, server.requests - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_gateway(latency_ms=args.latency_ms)
+    try:
+        run_agent(base_url, False, server)  # 预热：建连接、导入
+        for fast_path in (False, True):
+            samples, calls = run_agent(base_url, fast_path, server)
+            label = "开快速通道" if fast_path else "全走模型  "
+            print(
+                f"{label}：{len(QUESTIONS)} 句调模型 {calls} 次，总计 {sum(samples):.0f} ms，"
+                f"每句中位数 {statistics.median(samples):.1f} ms"
+            )
+    finally:
+        server.shutdown()
+
+    router = LocalRouter()
+    local = [q for q in QUESTIONS if router.route(q)]
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for q in QUESTIONS:
+            router.route(q)
+    us = (time.perf_counter() - t0) * 1e6 / (args.repeat * len(QUESTIONS))
+    print(f"本地能答 {len(local)}/{len(QUESTIONS)} 句；route() 平均 {us:.1f} µs/句（答不了的也算在内）")
+    for q in local:
+        print(f"  {q} → {router.route(q).text}")
+
+    wrong = [q for q in NOT_LOCAL if router.route(q) is not None or find_calculation(q) is not None]
+    print(f"不该本地算的 {len(NOT_LOCAL)} 句：{'都交给了模型 ✅' if not wrong else '误算了 ❌ ' + str(wrong)}")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
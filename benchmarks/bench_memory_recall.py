@@ -0,0 +1,71 @@
+# =========================================
+# benchmarks/bench_memory_recall.py
+# 相关旧记忆召回：10 万轮时建索引 / 启动映射 / 单次查询各要多久
+# 用法：python benchmarks/bench_memory_recall.py [--turns 100000] [--queries 200]
+# =========================================
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from memory_index import MemoryVectorIndex  # noqa: E402
+from memory_store import SimpleFileMemory  # noqa: E402
+
+TOPICS = ["提示词", "向量数据库", "产品需求文档", "用户访谈", "大模型评测", "北京天气", "降压药", "广场舞", "孙子考试", "智能体"]
+QUERIES = ["我住在哪里来着", "上次说的降压药几点吃", "产品需求文档怎么写", "孙子考试考得怎么样", "什么是智能体"]
+
+
+def make_memory(path: Path, turns: int):
+    rnd = random.Random(0)
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(turns):
+            a, b = rnd.sample(TOPICS, 2)
+            f.write(f"[2025-11-05 13:02:33] 奶奶：今天想聊聊{a}和{b}，第{i}次\n")
+            f.write(f"[2025-11-05 13:02:33] 助手：好的奶奶，我们先说{a}，再说{b}。\n")
+        f.write("[2025-11-05 13:02:33] 奶奶：我住在北京海淀区，你记住哈\n")
+        f.write("[2025-11-05 13:02:33] 助手：记住啦，奶奶住在北京海淀区～\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=512)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "mem.txt"
+        make_memory(path, args.turns)
+        memory = SimpleFileMemory(str(path))
+
+        t0 = time.perf_counter()
+        MemoryVectorIndex(memory, dim=args.dim)
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index = MemoryVectorIndex(memory, dim=args.dim)  # 已有索引：只做 memmap
+        index.search("热身")
+        open_ms = (time.perf_counter() - t0) * 1000
+
+        samples = []
+        for i in range(args.queries):
+            q = QUERIES[i % len(QUERIES)]
+            t0 = time.perf_counter()
+            index.search(q, k=3, exclude_last=20)
+            samples.append((time.perf_counter() - t0) * 1000)
+
+        samples.sort()
+        print(f"轮数：{memory.turn_count()}，维度：{args.dim}，索引大小：{index.path.stat().st_size / 1024 ** 2:.1f} MB")
+        print(f"首次建索引：{build_s:.1f} s（一次性）")
+        print(f"再次启动（memmap + 首查）：{open_ms:.1f} ms")
+        print(f"单次查询：中位数 {statistics.median(samples):.2f} ms，p95 {samples[int(len(samples) * 0.95) - 1]:.2f} ms")
+        print("“我住在哪里来着” →", [memory.load_turn(k).splitlines()[0] for k, _ in index.search("我住在哪里来着", k=1)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# =========================================
+# benchmarks/bench_memory_tail.py
+# 记忆文件从 1 KB 涨到 1 GB 时，每轮“读历史 + 写一轮”的耗时对比：
+#   旧做法：read_text().splitlines() 整个文件
+#   新做法：偏移索引 / 倒序分块读取
+# 用法：python benchmarks/bench_memory_tail.py [--sizes 1K,1M,64M,1G] [--rounds 50]
+# =========================================
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from memory_store import SimpleFileMemory, read_tail_turns  # noqa: E402
+
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+TURN = (
+    "[2025-11-05 13:02:33] 奶奶：今天学了什么呀？\n"
+    "[2025-11-05 13:02:33] 助手：奶奶今天学了提示词工程，我们来复习一下：\n"
+    "1. 先说清楚角色；2. 再给出任务；3. 最后举个例子。加油！💪\n"
+).encode("utf-8")
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def make_file(path: Path, size: int):
+    """用重复的对话轮次写出一个约 size 字节的记忆文件。"""
+    chunk = TURN * max(1, (1024 * 1024) // len(TURN))
+    with path.open("wb") as f:
+        written = 0
+        while written + len(chunk) <= size:
+            f.write(chunk)
+            written += len(chunk)
+        while written < size:
+            f.write(TURN)
+            written += len(TURN)
+
+
+def legacy_load(path: Path, max_rounds: int) -> str:
+    lines = path.read_text(encoding="utf-8").splitlines(True)
+    return "".join(lines[-max_rounds * 2:])
+
+
+def timed(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1K,1M,64M,1G")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--max-rounds", type=int, default=20)
+    parser.add_argument("--legacy-limit", default="256M", help="超过这个大小就不再跑旧做法（太慢）")
+    args = parser.parse_args()
+    legacy_limit = parse_size(args.legacy_limit)
+
+    print(f"{'文件大小':>10} | {'建索引(一次)':>12} | {'索引读历史':>10} | {'倒序分块':>10} | {'第K轮':>8} | {'整文件读取':>10}  (ms, 中位数)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for text in args.sizes.split(","):
+            size = parse_size(text)
+            path = Path(tmp) / f"mem_{text}.txt"
+            make_file(path, size)
+
+            t0 = time.perf_counter()
+            memory = SimpleFileMemory(str(path), max_rounds=args.max_rounds)
+            build_ms = (time.perf_counter() - t0) * 1000
+            k = memory.turn_count() // 2
+
+            def one_turn():
+                memory.load_history()
+                memory.save_turn("测试一下", "好的奶奶～")
+
+            indexed = timed(one_turn, args.rounds)
+            tail = timed(lambda: read_tail_turns(path, args.max_rounds), args.rounds)
+            kth = timed(lambda: memory.load_turn(k), args.rounds)
+            if size <= legacy_limit:
+                legacy = f"{timed(lambda: legacy_load(path, args.max_rounds), max(3, args.rounds // 10)):10.3f}"
+            else:
+                legacy = f"{'(跳过)':>10}"
+            print(f"{text:>10} | {build_ms:12.1f} | {indexed:10.3f} | {tail:10.3f} | {kth:8.3f} | {legacy}")
+            path.unlink()
+            memory.index.path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# =========================================
+# benchmarks/bench_prompt_cache.py
+# 网关的提示前缀缓存能命中多少：--sessions 段对话、每段 --turns 轮，都走 AgentAdapter.chat_stream
+# 对照组是改之前的拼法：精确到秒的时间提示放在最前面（模拟每轮隔 20 秒），后面才是系统提示和历史
+# 假网关模拟前缀缓存：没命中的每个 token 多等 --prefill-us 微秒（模型读提示），usage 里报 cached_tokens
+# 看缓存命中率、平均首字耗时
+# 用法：python benchmarks/bench_prompt_cache.py [--sessions 5] [--turns 12] [--prefill-us 150]
+# =========================================
+
+import argparse
+import datetime
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from agent_adapter import AgentAdapter  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+from prompt_layout import split_turn  # noqa: E402
+
+SYSTEM_PROMPT = (
+    "你是一位温柔的AI学习助理，用户是一位名叫奶奶的女士，她住在北京，在学习AI，目标是成为AI产品经理。"
+    "你的语气要轻松、鼓励、生活化，给出分步骤建议。"
+) * 12  # 真实的系统提示（人设 + 规则 + 工具说明）一般上千字
+
+
+class LegacyLayout(AgentAdapter):
+    """对照组：时间提示（精确到秒）排在最前面，后面才是系统提示和历史。"""
+
+    clock = datetime.datetime(2026, 10, 18, 9, 0, 0)
+
+    def _prepare(self, messages, auto_search=False, search_k=5):
+        msg_list, cache_key, hit, trace = super()._prepare(messages, auto_search, search_k)
+        prefix, turn = split_turn(msg_list)
+        LegacyLayout.clock += datetime.timedelta(seconds=20)
+        time_hint = {"role": "system", "content": f"当前本机本地时间：{self.clock:%Y-%m-%d %H:%M:%S}。"}
+        return [time_hint] + prefix[:-1] + turn, cache_key, hit, trace
+
+
+def run(label: str, adapter_cls, server, base_url: str, args):
+    server.prefix_cache.clear()
+    adapter = adapter_cls(base_url, "sk-bench", "gpt-4o", SYSTEM_PROMPT)
+    prompt = cached = 0
+    ttft: list[int] = []
+    for s in range(args.sessions):
+        history: list[dict] = []
+        for t in range(args.turns):
+            question = f"第 {s} 段对话的第 {t} 个问题：这个概念怎么理解？"
+            reply = adapter.chat_stream(history, question, auto_search=False, search_k=0)
+            text = "".join(reply)
+            out = reply.output
+            llm = next(c for c in out.tool_calls if c.get("stage") == "llm")
+            prompt += llm.get("prompt_tokens", 0)
+            cached += llm.get("cached_tokens", 0)
+            ttft.append(out.ttft_ms)
+            history += [{"role": "user", "content": question}, {"role": "assistant", "content": text}]
+    print(
+        f"{label}：命中缓存 {cached}/{prompt} token（{cached / prompt:.0%}），"
+        f"首字 p50 {statistics.median(ttft):.0f} ms，平均 {statistics.mean(ttft):.0f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--latency-ms", type=int, default=20)
+    parser.add_argument("--prefill-us", type=int, default=150)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_gateway(latency_ms=args.latency_ms, prompt_cache=True, prefill_us=args.prefill_us)
+    try:
+        run("时间提示在最前（旧）", LegacyLayout, server, base_url, args)
+        run("稳定前缀在前（新）  ", AgentAdapter, server, base_url, args)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# =========================================
+# benchmarks/bench_rate_limiter.py
+# 网关有限额（假网关每秒最多 --quota 个请求，超了回 429 + Retry-After）时，
+# 后台摘要一股脑往上发（--background 个，--concurrency 个线程），同时奶奶每 100 ms 问一句（--interactive 个）
+# 对比：不限速（撞 429 再靠 llm_resilience 重试） vs rate_limiter（按限额的九成放行，聊天插队）
+# 看网关一共回了几次 429、两类请求的成功率和耗时
+# 用法：python benchmarks/bench_rate_limiter.py [--quota 20] [--background 120] [--interactive 40]
+# =========================================
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from agent_adapter import AgentAdapter  # noqa: E402
+from llm_resilience import CircuitBreaker, ResilientCaller, RetryPolicy  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+from rate_limiter import BACKGROUND, INTERACTIVE, RateLimiter  # noqa: E402
+
+
+class NoLimit(RateLimiter):
+    """对照组：不限速，撞了 429 也不让别人停，只靠各自重试。"""
+
+    def pause(self, seconds: float):
+        self.counters["throttled"] += 1
+
+
+def summarize(samples: list[tuple[float, bool]]) -> str:
+    ms = sorted(t for t, _ in samples)
+    ok = sum(good for _, good in samples)
+    return (
+        f"成功 {ok}/{len(samples)}，p50 {statistics.median(ms):.0f} ms，"
+        f"p95 {ms[int(len(ms) * 0.95) - 1]:.0f} ms，max {ms[-1]:.0f} ms"
+    )
+
+
+def run(label: str, limiter: RateLimiter, server, base_url: str, args):
+    # 两类请求共用一个网关的重试 / 熔断（熔断阈值调大：这里只看限速）
+    caller = ResilientCaller(retry=RetryPolicy(attempts=4, base_delay=0.1, budget_s=10), breaker=CircuitBreaker(10**9))
+    make = lambda priority: AgentAdapter(  # noqa: E731
+        base_url, "sk-bench", "gpt-4o", "你是助手", resilience=caller, limiter=limiter, priority=priority
+    )
+    chat, summary = make(INTERACTIVE), make(BACKGROUND)
+
+    def one(adapter: AgentAdapter, i: int) -> tuple[float, bool]:
+        out = adapter.chat([], f"第 {i} 个问题", auto_search=False, search_k=0)
+        return out.latency_ms, out.text.startswith("（假网关）")
+
+    time.sleep(1.0)  # 等上一轮的限额窗口过去
+    before_req, before_429 = server.requests, server.throttled
+    interactive: list[tuple[float, bool]] = []
+
+    def ask():
+        for i in range(args.interactive):
+            interactive.append(one(chat, i))
+            time.sleep(0.1)
+
+    t0 = time.monotonic()
+    asker = threading.Thread(target=ask)
+    asker.start()
+    with ThreadPoolExecutor(args.concurrency) as ex:
+        background = list(ex.map(lambda i: one(summary, i), range(args.background)))
+    asker.join()
+    elapsed = time.monotonic() - t0
+
+    print(f"{label}：共 {elapsed:.1f} 秒，网关收到 {server.requests - before_req} 个请求，回了 {server.throttled - before_429} 次 429")
+    print(f"  聊天：{summarize(interactive)}")
+    print(f"  后台：{summarize(background)}")
+    stats = limiter.stats()
+    for key in ("interactive_wait_ms", "background_wait_ms"):
+        if key in stats:
+            print(f"  {key}: {stats[key]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quota", type=int, default=20, help="假网关每秒放行多少个请求")
+    parser.add_argument("--latency-ms", type=int, default=30)
+    parser.add_argument("--background", type=int, default=120)
+    parser.add_argument("--interactive", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_gateway(latency_ms=args.latency_ms, quota_per_s=args.quota)
+    try:
+        run("不限速      ", NoLimit(), server, base_url, args)
+        # 按限额的九成放行；假网关是整秒窗口，桶只攒 0.25 秒的量，不然一下子放出去一整秒的额度，容易和网关的窗口错开撞上
+        run("rate_limiter", RateLimiter(rpm=args.quota * 60 * 0.9, burst_s=0.25), server, base_url, args)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# =========================================
+# benchmarks/bench_resilience.py
+# 网关出问题时 AgentAdapter 的表现：只发一次 vs llm_resilience（重试 / 熔断 / 对冲）
+#  ① 网关抽风：--fail-rate 的请求回 503，成功率对比
+#  ② 网关挂了：每个请求都 503，用户平均要等多久才拿到失败提示（有熔断时直接失败）
+#  ③ 长尾：--slow-rate 的请求额外慢 --slow-ms，p50 / p99 对比（对冲按最近 p95 触发）
+#  ④ 流式中途断开：半截回答不能进回答缓存（进了就退出码为 1）
+# 网关是本地假网关（mock_gateway 的故障注入），每次调用基础耗时 --latency-ms
+# 用法：python benchmarks/bench_resilience.py [--requests 200] [--fail-rate 0.2] [--slow-rate 0.03]
+# =========================================
+
+import argparse
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from agent_adapter import AgentAdapter  # noqa: E402
+from llm_resilience import CircuitBreaker, ResilientCaller, RetryPolicy  # noqa: E402
+from mock_gateway import start_mock_gateway  # noqa: E402
+from ttl_cache import TieredCache  # noqa: E402
+
+ONE_SHOT = dict(retry=RetryPolicy(attempts=1), breaker=CircuitBreaker(failure_threshold=10**9))
+
+
+def run(base_url: str, caller: ResilientCaller, n: int) -> tuple[list[float], int]:
+    adapter = AgentAdapter(base_url, "sk-bench", "gpt-4o", "你是助手", resilience=caller)
+    samples, ok = [], 0
+    for i in range(n):
+        out = adapter.chat([], f"第 {i} 个问题", auto_search=False, search_k=0)
+        samples.append(out.latency_ms)
+        ok += out.text.startswith("（假网关）")
+    return samples, ok
+
+
+def p99(samples: list[float]) -> float:
+    return sorted(samples)[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=int, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ms", type=int, default=2000)
+    args = parser.parse_args()
+    n = args.requests
+
+    server, base_url = start_mock_gateway(latency_ms=args.latency_ms)
+    handler = server.RequestHandlerClass
+    try:
+        print(f"① 网关抽风（{args.fail_rate:.0%} 回 503）")
+        handler.fail_rate = args.fail_rate
+        for label, caller in (
+            ("只发一次", ResilientCaller(**ONE_SHOT)),
+            ("重试 3 次", ResilientCaller(retry=RetryPolicy(attempts=3, base_delay=0.05))),
+        ):
+            samples, ok = run(base_url, caller, n)
+            print(f"  {label}：成功 {ok}/{n}，平均 {statistics.mean(samples):.0f} ms")
+
+        print("② 网关挂了（全部 503）")
+        handler.fail_rate = 1.0
+        for label, caller in (
+            ("重试不熔断", ResilientCaller(retry=RetryPolicy(attempts=3, base_delay=0.05), breaker=CircuitBreaker(10**9))),
+            ("重试 + 熔断", ResilientCaller(retry=RetryPolicy(attempts=3, base_delay=0.05), breaker=CircuitBreaker(5, 30))),
+        ):
+            before = server.requests
+            samples, _ = run(base_url, caller, n // 4)
+            print(
+                f"  {label}：每个请求平均 {statistics.mean(samples):.1f} ms 拿到失败提示，"
+                f"网关共挨了 {server.requests - before} 次请求"
+            )
+
+        print(f"③ 长尾（{args.slow_rate:.0%} 的请求额外慢 {args.slow_ms} ms）")
+        handler.fail_rate = 0.0
+        handler.slow_rate, handler.slow_ms = args.slow_rate, args.slow_ms
+        for label, caller in (
+            ("不对冲", ResilientCaller()),
+            ("p95 对冲", ResilientCaller(hedge=True)),
+        ):
+            before = server.requests
+            samples, _ = run(base_url, caller, n)
+            extra = server.requests - before - n
+            print(
+                f"  {label}：p50 {statistics.median(samples):.0f} ms，p99 {p99(samples):.0f} ms，"
+                f"max {max(samples):.0f} ms，多发了 {extra} 个请求（{extra / n:.1%}）"
+            )
+
+        print("④ 流式中途断开（发了 2 段就断，没有 [DONE]）")
+        handler.slow_rate = 0.0
+        handler.cut_stream_after = 2
+        cache = TieredCache(maxsize=16, ttl=600)
+        adapter = AgentAdapter(base_url, "sk-bench", "gpt-4o", "你是助手", cache=cache)
+        question = "这句话的回答会被截断"
+        cut = "".join(adapter.chat_stream([], question, auto_search=False, search_k=0))
+        handler.cut_stream_after = None
+        again = adapter.chat_stream([], question, auto_search=False, search_k=0)
+        full = "".join(again)
+        leaked = again.output.cached
+        print(f"  断开时拿到：{cut!r}；再问一次：{full!r}（{'用了缓存里的半截 ❌' if leaked else '重新问了网关 ✅'}）")
+    finally:
+        server.shutdown()
+    if leaked:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
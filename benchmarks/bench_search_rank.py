@@ -0,0 +1,73 @@
+# =========================================
+# benchmarks/bench_search_rank.py
+# 搜索资料筛选：原样全塞 vs BM25 排序 + 去重 + token 预算，注入的 token 数和筛选本身的耗时
+# 用法：python benchmarks/bench_search_rank.py [--results 10] [--chunks 12] [--budget 1200]
+# =========================================
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from search_rank import compress_results  # noqa: E402
+from search_tools import format_results  # noqa: E402
+from text_utils import count_tokens  # noqa: E402
+
+RELEVANT = [
+    "高血压患者每天早晚各量一次血压，并做好记录，复诊时交给医生参考。",
+    "降压药需要按医嘱在固定时间服用，血压正常后也不能自行停药，否则容易反弹。",
+    "饮食上要少盐少油，每天食盐摄入不超过五克，多吃蔬菜水果。",
+    "适量运动如散步、太极拳有助于控制血压，但要避免剧烈运动。",
+]
+NOISE = [
+    "本站所有文章仅供参考，转载请注明出处，如有侵权请联系删除。",
+    "热门推荐：广场舞新曲目大全、养老金调整最新消息、十一假期出行攻略。",
+    "扫码关注我们的公众号，每天推送健康小知识，还有机会领取精美礼品。",
+    "北京今天晴转多云，最高气温二十三度，空气质量良，适合户外活动。",
+]
+
+
+def make_results(n_results: int, n_chunks: int):
+    rnd = random.Random(0)
+    items, excerpts = [], {}
+    for i in range(n_results):
+        href = f"https://example{i}.com/article"
+        items.append({"title": f"老年人高血压怎么管理（第{i}篇）", "href": href, "body": rnd.choice(RELEVANT + NOISE)})
+        # 各网站的正文大同小异（互相转载），再夹杂一些无关内容
+        excerpts[href] = [
+            rnd.choice(RELEVANT) + rnd.choice(["", "这一点非常重要。", "请务必牢记。"]) if rnd.random() < 0.5 else rnd.choice(NOISE)
+            for _ in range(n_chunks)
+        ]
+    return items, excerpts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=12)
+    parser.add_argument("--budget", type=int, default=1200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    query = "我奶奶有高血压，降压药应该怎么吃？"
+    items, excerpts = make_results(args.results, args.chunks)
+    raw_tokens = count_tokens(format_results(query, items, excerpts=excerpts))
+
+    samples = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        kept_items, kept_excerpts, stats = compress_results(query, items, excerpts, args.budget)
+        samples.append((time.perf_counter() - t0) * 1000)
+    packed = format_results(query, kept_items, excerpts=kept_excerpts)
+
+    print(f"候选段落 {stats['candidates']} 段：去重 {stats['dup']}，无关 {stats['irrelevant']}，保留 {stats['kept']}")
+    print(f"注入 token：原样全塞 {raw_tokens} → 筛选后 {count_tokens(packed)}（预算 {args.budget}）")
+    print(f"筛选耗时：中位数 {statistics.median(samples):.2f} ms")
+    print("\n筛选后的资料：\n" + packed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# =========================================
+# benchmarks/bench_startup.py
+# 冷启动要多久：每个入口模块在新进程里 `python -X importtime -c "import xxx"`，跑 --runs 次取中位数
+#  - 和 BUDGET_MS 里的预算比，超了退出码为 1（发版前跑一下，变慢了能马上发现）
+#  - 列出最重的几个外部导入（第三方包和标准库），以及是哪个本仓库模块把它拉进来的
+#  - --record 文件名：把这次的结果追加成一行 JSON（带 git 版本），方便跨版本对比
+# 用法：python benchmarks/bench_startup.py [--runs 5] [--top 5] [--budget app=900] [--record startup.jsonl]
+# =========================================
+
+import argparse
+import datetime
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+LOCAL = {p.stem for p in ROOT.glob("*.py")}
+
+# 各入口的导入时间预算（毫秒）：按这台机器实测的 2 倍左右留余量
+BUDGET_MS = {
+    "ai_study_agent": 150,  # 命令行版：langchain_openai 等到建客户端时才导入
+    "talk_openai_direct": 50,  # 学习脚本：各方法里用到才导入 LangChain
+    "agent_adapter": 200,  # Web 版的适配器：不开联网搜索就不加载 duckduckgo_search
+    "tool_registry": 100,
+    "app": 1200,  # 大头是 streamlit 本身
+}
+
+
+def import_tree(module: str) -> list[tuple[int, str, int]]:
+    """新进程里导入一次 module，返回 importtime 的每一行 (层级, 模块名, 累计微秒)，顺序同输出（子模块在前）。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} 失败：{proc.stderr.strip().splitlines()[-1]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, name.strip(), int(cumulative)))
+    return rows
+
+
+def heavy_imports(rows: list[tuple[int, str, int]], top: int) -> list[tuple[str, str, int]]:
+    """本仓库模块直接导入的外部模块（第三方包、标准库），按累计耗时排序：(谁导入的, 导入了什么, 微秒)。"""
+    found: list[tuple[str, str, int]] = []
+    pending: list[tuple[int, str, int]] = []  # 还没找到父模块的行
+    for depth, name, us in rows:
+        children = []
+        while pending and pending[-1][0] > depth:
+            children.append(pending.pop())
+        if name.split(".")[0] in LOCAL:
+            found += [(name, child, cus) for _, child, cus in children if child.split(".")[0] not in LOCAL]
+        pending.append((depth, name, us))
+    return sorted(found, key=lambda item: -item[2])[:top]
+
+
+def measure(module: str, runs: int) -> tuple[float, list[tuple[int, str, int]]]:
+    """(导入耗时中位数 ms, 最后一次的 importtime 行)；第一次只用来热 .pyc 和磁盘缓存，不计。"""
+    import_tree(module)
+    samples, rows = [], []
+    for _ in range(runs):
+        rows = import_tree(module)
+        # 按名字找这一行，不看层级：app 这种会被 -X importtime 记在好几层缩进下面（前面先导入了别的）
+        samples.append(next(us for depth, name, us in reversed(rows) if name == module) / 1000)
+    return statistics.median(samples), rows
+
+
+def git_rev() -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return proc.stdout.strip() or "?"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=list(BUDGET_MS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--budget", action="append", default=[], help="覆盖预算，如 app=900")
+    parser.add_argument("--record", help="把结果追加到这个 JSONL 文件")
+    args = parser.parse_args()
+    budget = dict(BUDGET_MS)
+    for item in args.budget:
+        name, ms = item.split("=")
+        budget[name] = float(ms)
+
+    results, over = {}, []
+    for module in args.modules:
+        ms, rows = measure(module, args.runs)
+        limit = budget.get(module)
+        results[module] = {"ms": round(ms, 1), "budget_ms": limit}
+        flag = "" if limit is None else ("  ✅" if ms <= limit else "  ❌ 超预算")
+        print(f"{module:<20} {ms:8.1f} ms" + (f"（预算 {limit:.0f} ms）{flag}" if limit is not None else ""))
+        for parent, child, us in heavy_imports(rows, args.top):
+            print(f"    {us / 1000:7.1f} ms  {child}  ← {parent}")
+        if limit is not None and ms > limit:
+            over.append(module)
+
+    if args.record:
+        record = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "rev": git_rev(), "results": results}
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    if over:
+        print("超预算：", ", ".join(over))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
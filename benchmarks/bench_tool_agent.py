@@ -0,0 +1,155 @@
+# =========================================
+# benchmarks/bench_tool_agent.py
+# 方式八那种“JSON 决策 + 最后再整理”的多步 Agent vs tool_agent.py 的原生工具调用：
+# 同样的请求，各要调几次模型、总共花多久（本地假网关，每次调用模拟 --latency-ms 的生成耗时）；
+# 以及同一轮要了好几个慢工具（查网络那种）时，串行执行 vs 并行执行
+# 用法：python benchmarks/bench_tool_agent.py [--latency-ms 300] [--tool-ms 200]
+# =========================================
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import http_client  # noqa: E402
+from mock_gateway import ToolCallingHandler, start_mock_gateway  # noqa: E402
+from tool_agent import ToolCallingAgent, function_tool  # noqa: E402
+from tool_registry import REGISTRY  # noqa: E402
+
+
+TOOLS = REGISTRY.tools(["multiply", "today", "praise"])
+
+# 和 talk_openai_direct.py 方式八一字不差的两段提示词
+DECIDE_PROMPT = """你是一个会调用工具的智能体。你可以做多步推理。
+你目前已经知道的内容是：
+{context}
+
+用户的原始目标是：
+{user_input}
+
+你可以使用的工具有（只能从里面选）：
+- multiply(a, b): 计算两个数字的乘积
+- today(): 获取今天的日期
+- praise(name): 夸奖奶奶
+
+如果你觉得还需要用工具，请输出一个 JSON（只输出 JSON）：
+{{
+  "action": "tool",
+  "tool": "<工具名>",
+  "args": {{...}}
+}}
+
+如果你觉得已经有足够信息可以回答了，请输出：
+{{
+  "action": "finish",
+  "final": "<你要回答给用户的话的大纲>"
+}}
+只能输出 JSON，不能加 ``` 包裹，不能加文字。
+"""
+
+FINAL_PROMPT = """你是一个温柔的AI，请根据下面的信息，写出最终要跟奶奶说的话，口吻温柔、简短：
+用户原始需求：
+{user_input}
+
+你调用工具得到的中间信息：
+{context}
+
+请生成最终回答。"""
+
+
+def legacy_agent(base_url: str, user_input: str, max_steps: int = 4) -> str:
+    """方式八的主循环：每一步一次决策调用，最后再一次整理调用。"""
+    url = f"{base_url}/chat/completions"
+    tools = {t.name: t for t in TOOLS}
+
+    def invoke(prompt: str) -> str:
+        resp = http_client.post_json(url, {"model": "mock-model", "messages": [{"role": "user", "content": prompt}]})
+        return resp.json()["choices"][0]["message"]["content"]
+
+    context = []
+    for _ in range(max_steps):
+        decide = json.loads(invoke(DECIDE_PROMPT.format(context="\n".join(context) or "（目前还没有工具结果）", user_input=user_input)))
+        if decide.get("action") != "tool":
+            break
+        context.append(f"[{decide['tool']}] {tools[decide['tool']].invoke(decide.get('args', {}))}")
+    return invoke(FINAL_PROMPT.format(user_input=user_input, context="\n".join(context)))
+
+
+def slow_tools(tool_ms: int):
+    @function_tool
+    def weather(city: str) -> str:
+        """查天气（模拟一次网络请求）"""
+        time.sleep(tool_ms / 1000)
+        return f"{city}：晴，23 度"
+
+    @function_tool
+    async def news(topic: str) -> str:
+        """查新闻（async 工具）"""
+        await asyncio.sleep(tool_ms / 1000)
+        return f"{topic}：养老金上调"
+
+    @function_tool(timeout=tool_ms / 2000)
+    def stock(code: str) -> str:
+        """查行情（这个接口特别慢，会超时）"""
+        time.sleep(tool_ms * 3 / 1000)
+        return f"{code}：涨 1%"
+
+    return [weather, news, stock]
+
+
+def tool_call(i: int, name: str, **args) -> dict:
+    return {"id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)}}
+
+
+def measure(server, fn):
+    before = server.requests
+    t0 = time.perf_counter()
+    fn()
+    return server.requests - before, (time.perf_counter() - t0) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=int, default=300)
+    parser.add_argument("--tool-ms", type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_gateway(handler=ToolCallingHandler, latency_ms=args.latency_ms)
+    agent = ToolCallingAgent(base_url, "sk-mock", "mock-model", TOOLS, system_prompt="你是温柔的中文助理。")
+
+    cases = [
+        ("三个工具", "帮我查一下今天的日期，再算 12.5 * 8，最后夸夸叫“奶奶”的人"),
+        ("一个工具", "今天几号？"),
+        ("不需要工具", "你好呀，陪我聊聊天"),
+    ]
+    print(f"每次模型调用 {args.latency_ms} ms")
+    print(f"{'场景':<10}{'方式八 调用次数':>14}{'耗时':>10}{'原生工具调用 次数':>16}{'耗时':>10}")
+    for label, query in cases:
+        old_calls, old_ms = measure(server, lambda: legacy_agent(base_url, query))
+        new_calls, new_ms = measure(server, lambda: agent.run(query))
+        print(f"{label:<10}{old_calls:>14}{old_ms:>10.0f}{new_calls:>16}{new_ms:>10.0f}")
+
+    # 同一轮的多个工具：串行 vs 并行（结果顺序和模型给的顺序一致）
+    tools = slow_tools(args.tool_ms)
+    calls = [tool_call(0, "weather", city="北京"), tool_call(1, "news", topic="养老"), tool_call(2, "weather", city="上海")]
+    print(f"\n同一轮 {len(calls)} 个工具（每个约 {args.tool_ms} ms）：")
+    for label, parallel in (("串行", False), ("并行", True)):
+        runner = ToolCallingAgent(base_url, "sk-mock", "mock-model", tools, parallel_tools=parallel)
+        t0 = time.perf_counter()
+        records = runner.run_tool_calls(calls)
+        print(f"  {label}：{(time.perf_counter() - t0) * 1000:6.0f} ms  →", [r["result"] for r in records])
+    runner = ToolCallingAgent(base_url, "sk-mock", "mock-model", tools)
+    t0 = time.perf_counter()
+    records = runner.run_tool_calls(calls + [tool_call(3, "stock", code="600000")])
+    print(f"  加一个会超时的工具：{(time.perf_counter() - t0) * 1000:6.0f} ms  →", records[-1]["result"])
+
+    http_client.close_all()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# =========================================
+# benchmarks/mock_gateway.py
+# 本地假网关：模仿 OpenAI 兼容的 /chat/completions，给基准脚本用
+#   python benchmarks/mock_gateway.py --port 8765 --latency-ms 20
+# 也可以在脚本里 start_mock_gateway() 起一个后台线程版
+# =========================================
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，连接池才有意义
+    disable_nagle_algorithm = True  # 头和正文分两次写，不关 Nagle 会被延迟 ACK 卡 40 ms
+    latency_ms = 0
+    chunk_delay_ms = 0  # 流式时每段之间等这么久，模拟模型逐 token 生成
+    handshake_ms = 0  # 每条新连接额外等这么久，模拟公网上 DNS + TCP + TLS 握手
+    # 故障注入（测重试 / 熔断 / 对冲用）；跑起来以后也能改：server.RequestHandlerClass.fail_rate = 1.0
+    fail_first = 0  # 前 N 个 POST 直接回 fail_status
+    fail_rate = 0.0  # 之后每个 POST 有这么大概率回 fail_status
+    fail_status = 503
+    retry_after = None  # 失败时带上 Retry-After 头（秒）
+    slow_rate = 0.0  # 有这么大概率额外慢 slow_ms（长尾延迟）
+    slow_ms = 0
+    quota_per_s = 0  # 模拟网关限额：每秒最多这么多个 POST，超了回 429 + Retry-After（0 = 不限）
+    cut_stream_after = None  # 流式时发完这么多段就断开（不发 finish_reason 和 [DONE]），模拟网关中途掉线
+    # 模拟提示前缀缓存：按 cache_block 个字符一块，开头连续几块以前见过就算命中（一个字符当一个 token）；
+    # 没命中的部分每个 token 额外等 prefill_us 微秒（模型读提示的时间），usage 里报 cached_tokens
+    prompt_cache = False
+    cache_block = 64
+    prefill_us = 0
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1  # 每条新 TCP 连接 +1，用来看连接有没有被复用
+        if self.handshake_ms:
+            time.sleep(self.handshake_ms / 1000)
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None):
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def reply_text(self, payload: dict) -> str:
+        last = payload.get("messages", [{}])[-1].get("content", "")
+        return f"（假网关）收到：{last[:50]}"
+
+    def reply_message(self, payload: dict) -> dict:
+        return {"role": "assistant", "content": self.reply_text(payload)}
+
+    def _usage(self, payload: dict) -> dict:
+        """按前缀缓存算这次的 usage，并按没命中的 token 数等 prefill 时间。"""
+        text = "".join(f"{m.get('role')}:{m.get('content') or ''}\n" for m in payload.get("messages", []))
+        usage = {"prompt_tokens": len(text), "completion_tokens": 10, "total_tokens": len(text) + 10}
+        if not self.prompt_cache:
+            return usage
+        digest, keys = hashlib.sha1(), []
+        for i in range(0, len(text) - len(text) % self.cache_block, self.cache_block):
+            digest.update(text[i:i + self.cache_block].encode("utf-8"))
+            keys.append(digest.hexdigest())
+        with self.server.lock:
+            hits = next((i for i, key in enumerate(keys) if key not in self.server.prefix_cache), len(keys))
+            self.server.prefix_cache.update(keys)
+        cached = hits * self.cache_block
+        if self.prefill_us:
+            time.sleep((len(text) - cached) * self.prefill_us / 1e6)
+        usage["prompt_tokens_details"] = {"cached_tokens": cached}
+        return usage
+
+    def _send_sse(self, payload: dict, text: str, usage: dict | None = None):
+        """stream=true 时按 SSE 一段段发（分块传输编码），最后发 data: [DONE]。"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def emit(obj):
+            data = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)
+            raw = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(raw):X}\r\n".encode() + raw + b"\r\n")
+            self.wfile.flush()
+
+        pieces = [text[i:i + 4] for i in range(0, len(text), 4)]
+        for i, piece in enumerate(pieces):
+            if self.cut_stream_after is not None and i >= self.cut_stream_after:
+                self.wfile.write(b"0\r\n\r\n")
+                self.close_connection = True
+                return
+            if i and self.chunk_delay_ms:
+                time.sleep(self.chunk_delay_ms / 1000)
+            emit({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "mock-model"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            })
+        emit({"id": "chatcmpl-mock", "object": "chat.completion.chunk",
+              "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if usage is not None:  # stream_options.include_usage：最后单独发一段 usage
+            emit({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        emit("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_HEAD(self):
+        # 预热连接用：只回头，连接保持
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._send_json(200, {"object": "list", "data": [{"id": "mock-model"}]})
+
+    def _inject_fault(self) -> bool:
+        """按故障注入的设置决定这次要不要失败 / 变慢；回了错误就返回 True。"""
+        with self.server.lock:
+            n = self.server.requests
+            fail = n <= self.fail_first or self.server.rng.random() < self.fail_rate
+            slow = self.server.rng.random() < self.slow_rate
+        if slow:
+            time.sleep(self.slow_ms / 1000)
+        if not fail:
+            return False
+        self.server.failures += 1
+        headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+        self._send_json(self.fail_status, {"error": {"message": f"mock fault {self.fail_status}"}}, headers)
+        return True
+
+    def _over_quota(self) -> bool:
+        """按整秒的固定窗口数请求，超过 quota_per_s 就回 429，Retry-After 写到下一个窗口。"""
+        if not self.quota_per_s:
+            return False
+        with self.server.lock:
+            window = int(time.time())
+            if window != self.server.window:
+                self.server.window, self.server.window_count = window, 0
+            self.server.window_count += 1
+            over = self.server.window_count > self.quota_per_s
+            if over:
+                self.server.throttled += 1
+        if over:
+            self._send_json(429, {"error": {"message": "mock rate limit"}}, {"Retry-After": "1"})
+        return over
+
+    def do_POST(self):
+        payload = self._read_json()
+        with self.server.lock:
+            self.server.requests += 1
+        if self._over_quota() or self._inject_fault():
+            return
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        usage = self._usage(payload)
+        if payload.get("stream"):
+            include = (payload.get("stream_options") or {}).get("include_usage")
+            self._send_sse(payload, self.reply_text(payload), usage if include else None)
+            return
+        message = self.reply_message(payload)
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": payload.get("model", "mock-model"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+            }],
+            "usage": usage,
+        })
+
+
+class MockGatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512  # 默认 listen 队列只有 5，并发压测时新连接会被直接重置
+
+
+class ToolCallingHandler(MockGatewayHandler):
+    """
+    会“用工具”的假模型，回复是确定的，方便数调用次数。用户的话里提到日期 / 算 / 夸才需要工具：
+     - 请求带 tools：还没有工具结果时，一次回复里把要用的工具都要了；有了结果（或不需要工具）就直接作答
+     - 请求不带 tools（方式八那种 JSON 决策提示）：每次只决定一个工具，都用过了再输出 finish
+    """
+
+    plan = (("today", ("日期", "几号")), ("multiply", ("算",)), ("praise", ("夸",)))
+    sample_args = {"number": 8, "integer": 8, "string": "奶奶", "boolean": True}
+
+    def _wanted(self, user_text: str) -> list[str]:
+        return [name for name, words in self.plan if any(w in user_text for w in words)]
+
+    def _call_for(self, i: int, tool: dict) -> dict:
+        fn = tool["function"]
+        args = {k: self.sample_args.get(v.get("type"), "") for k, v in fn["parameters"].get("properties", {}).items()}
+        return {"id": f"call_{i}", "type": "function", "function": {"name": fn["name"], "arguments": json.dumps(args, ensure_ascii=False)}}
+
+    def reply_message(self, payload: dict) -> dict:
+        messages = payload.get("messages", [])
+        if payload.get("tools"):
+            user_text = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+            results = [m["content"] for m in messages if m.get("role") == "tool"]
+            wanted = self._wanted(user_text)
+            if wanted and not results and payload.get("tool_choice") != "none":
+                tools = [t for t in payload["tools"] if t["function"]["name"] in wanted]
+                return {"role": "assistant", "content": None, "tool_calls": [self._call_for(i, t) for i, t in enumerate(tools)]}
+            if results:
+                return {"role": "assistant", "content": "（假模型）根据工具结果：" + "；".join(results)}
+            return {"role": "assistant", "content": self.reply_text(payload)}
+        prompt = messages[-1].get("content", "") if messages else ""
+        if '"action"' in prompt:  # 决策提示：看上下文里已经有几个工具结果了
+            goal = re.search(r"目标是：\n(.*?)\n\n", prompt, re.S)
+            todo = [name for name in self._wanted(goal.group(1) if goal else "") if f"[{name}]" not in prompt]
+            if todo:
+                name = todo[0]
+                args = {"multiply": {"a": 12.5, "b": 8}, "praise": {"name": "奶奶"}}.get(name, {})
+                return {"role": "assistant", "content": json.dumps({"action": "tool", "tool": name, "args": args}, ensure_ascii=False)}
+            return {"role": "assistant", "content": json.dumps({"action": "finish", "final": "把结果都说一遍"}, ensure_ascii=False)}
+        return {"role": "assistant", "content": self.reply_text(payload)}
+
+
+def start_mock_gateway(port: int = 0, handler=MockGatewayHandler, **options):
+    """后台线程起一个假网关，返回 (server, base_url)；用完 server.shutdown()。"""
+    handler_cls = type("ConfiguredHandler", (handler,), options) if options else handler
+    server = MockGatewayServer(("127.0.0.1", port), handler_cls)
+    server.connections = 0
+    server.requests = 0  # 收到的 POST 次数：基准脚本用它数“调了几次模型”
+    server.failures = 0  # 故障注入回了几次错误
+    server.throttled = 0  # 超了 quota_per_s 回了几次 429
+    server.window, server.window_count = 0, 0
+    server.prefix_cache = set()  # prompt_cache=True 时见过的前缀块
+    server.lock = threading.Lock()
+    server.rng = random.Random(0)  # 故障注入的随机数固定种子，每次跑结果一样
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--handshake-ms", type=int, default=0)
+    parser.add_argument("--chunk-delay-ms", type=int, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=int, default=0)
+    parser.add_argument("--quota-per-s", type=int, default=0)
+    args = parser.parse_args()
+    server, url = start_mock_gateway(
+        args.port, latency_ms=args.latency_ms, handshake_ms=args.handshake_ms, chunk_delay_ms=args.chunk_delay_ms,
+        fail_rate=args.fail_rate, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+        quota_per_s=args.quota_per_s,
+    )
+    print("假网关已启动：", url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
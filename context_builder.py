@@ -0,0 +1,64 @@
+# =========================================
+# context_builder.py
+# 按 token 预算拼上下文：从最新一轮往回塞，塞不下的旧轮次截断或丢掉
+# =========================================
+
+from dataclasses import dataclass, field
+
+from text_utils import count_tokens, truncate_to_tokens
+
+
+@dataclass
+class HistoryFit:
+    text: str
+    tokens: int
+    turns_used: int
+    turns_dropped: int
+    truncated: bool = False
+
+
+@dataclass
+class TokenUsage:
+    budget: int
+    sections: dict = field(default_factory=dict)  # persona / history / user_input / instructions ...
+
+    @property
+    def total(self) -> int:
+        return sum(self.sections.values())
+
+    def as_dict(self) -> dict:
+        return {**self.sections, "total": self.total, "budget": self.budget}
+
+
+class ContextBuilder:
+    def __init__(self, budget: int = 3000, min_turn_tokens: int = 64):
+        self.budget = budget
+        # 剩余空间小于这个数就不再截断旧轮次（截出来只剩半句话没意义）
+        self.min_turn_tokens = min_turn_tokens
+
+    def fit_history(self, turns: list[str], available: int) -> HistoryFit:
+        """turns 从旧到新；返回能放进 available 个 token 的那部分（保持原顺序）。"""
+        picked: list[str] = []
+        used = 0
+        truncated = False
+        for turn in reversed(turns):
+            cost = count_tokens(turn)
+            if used + cost <= available:
+                picked.append(turn)
+                used += cost
+                continue
+            room = available - used
+            if room >= self.min_turn_tokens:
+                cut = truncate_to_tokens(turn.rstrip("\n"), room - 1) + "\n"
+                picked.append(cut)
+                used += count_tokens(cut)
+                truncated = True
+            break
+        picked.reverse()
+        return HistoryFit(
+            text="".join(picked),
+            tokens=used,
+            turns_used=len(picked),
+            turns_dropped=len(turns) - len(picked),
+            truncated=truncated,
+        )
@@ -0,0 +1,239 @@
+# =========================================
+# deep_search.py
+# 深度搜索：把搜索结果的前几个网页真正抓下来，抽正文、切块，给模型看比摘要更多的内容
+#  - 线程池并发抓，同一个网站同时最多 per_host 个请求（别把人家打挂）
+#  - 边下边解码，超过 max_bytes 就不读了；只要 HTML / 纯文本
+#  - 整个阶段有总截止时间，到点没抓完的直接放弃，不会卡住一轮对话
+# 环境变量：DEEP_SEARCH_DEADLINE_S（默认 4 秒）、DEEP_SEARCH_MAX_BYTES（默认 512 KB）
+# =========================================
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+import requests
+
+from http_client import get_session
+
+FETCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+USER_AGENT = "Mozilla/5.0 (compatible; Agent7DeepSearch/1.0)"
+
+_host_lock = threading.Lock()
+# (网站, 并发上限) -> 信号量；按最近使用保留 MAX_HOST_SLOTS 个，常驻的 Streamlit 进程里不会越攒越多
+_host_slots: OrderedDict[tuple[str, int], threading.Semaphore] = OrderedDict()
+MAX_HOST_SLOTS = 256
+
+
+@dataclass
+class Page:
+    url: str
+    status: str = "pending"  # ok / error / timeout / skipped（类型不对）
+    text: str = ""
+    chunks: list[str] = field(default_factory=list)
+    ms: int = 0
+    bytes: int = 0
+    error: str = ""
+
+    def trace(self) -> dict:
+        record = {"stage": "fetch", "url": self.url, "status": self.status, "ms": self.ms, "bytes": self.bytes}
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+# ===== 正文抽取（标准库 HTMLParser，不额外装依赖） =====
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe"}
+_BLOCK_TAGS = {"p", "div", "li", "ul", "ol", "section", "article", "main", "br", "tr", "table", "pre", "blockquote",
+               "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt", "title"}
+
+
+class _TextExtractor(HTMLParser):
+    """按块收集文字，顺便记下每块里有多少字是链接文字（导航、推荐列表的链接占比很高）。"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: list[tuple[str, int]] = []  # (文字, 其中链接文字的长度)
+        self._buf: list[str] = []
+        self._link_chars = 0
+        self._skip = 0
+        self._in_link = 0
+
+    def _flush(self):
+        text = " ".join("".join(self._buf).split())
+        if text:
+            self.blocks.append((text, self._link_chars))
+        self._buf, self._link_chars = [], 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag == "a":
+            self._in_link += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "a":
+            self._in_link = max(0, self._in_link - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self._buf.append(data)
+        if self._in_link:
+            self._link_chars += len(data.strip())
+
+
+def extract_main_text(html: str, min_block_chars: int = 20, max_link_ratio: float = 0.5) -> str:
+    """去掉脚本、导航、页脚；短块和链接占一大半的块（菜单、相关推荐）也不要。"""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass  # 残缺的 HTML：已经解析出来的部分照用
+    parser._flush()
+    kept = [
+        text for text, link_chars in parser.blocks
+        if len(text) >= min_block_chars and link_chars <= len(text) * max_link_ratio
+    ]
+    return "\n".join(kept)
+
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;])|(?<=\.)\s")
+
+
+def chunk_text(text: str, max_chars: int = 500, overlap: int = 50) -> list[str]:
+    """按段落 / 句子切成不超过 max_chars 的块，相邻块重叠 overlap 个字，免得一句话被切断后丢了上下文。"""
+    pieces: list[str] = []
+    for para in text.split("\n"):
+        for sent in _SENTENCE_END.split(para):
+            sent = sent.strip()
+            while len(sent) > max_chars:  # 超长的一句硬切
+                pieces.append(sent[:max_chars])
+                sent = sent[max_chars:]
+            if sent:
+                pieces.append(sent)
+
+    chunks: list[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            # 重叠部分要给下一段留位置：重叠 + 空格 + 这一段 也不能超过 max_chars
+            keep = min(overlap, max_chars - len(piece) - 1)
+            current = current[-keep:] if keep > 0 else ""
+        current = f"{current} {piece}".strip() if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ===== 抓取 =====
+def _charset(content_type: str, head: bytes) -> str:
+    m = re.search(r"charset=([\w-]+)", content_type, re.I) or re.search(rb"<meta[^>]+charset=[\"']?([\w-]+)", head, re.I)
+    if not m:
+        return "utf-8"
+    name = m.group(1)
+    return name.decode("ascii", "ignore") if isinstance(name, bytes) else name
+
+
+def _host_slot(url: str, per_host: int) -> threading.Semaphore:
+    host = urlsplit(url).netloc.lower()
+    with _host_lock:
+        slot = _host_slots.get((host, per_host))
+        if slot is None:
+            slot = _host_slots[(host, per_host)] = threading.Semaphore(per_host)
+            while len(_host_slots) > MAX_HOST_SLOTS:
+                _host_slots.popitem(last=False)  # 最久没用的网站；正在抓的都是最近用过的，不会被挤掉
+        else:
+            _host_slots.move_to_end((host, per_host))
+        return slot
+
+
+def fetch_page(url: str, deadline: float, max_bytes: int, per_host: int = 2, chunk_chars: int = 500) -> Page:
+    """抓一个网页（deadline 是 time.monotonic() 的绝对时刻）。"""
+    page = Page(url)
+    t0 = time.monotonic()
+    slot = _host_slot(url, per_host)
+    if not slot.acquire(timeout=max(0.0, deadline - t0)):
+        page.status = "timeout"
+        return page
+    try:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            page.status = "timeout"
+            return page
+        resp = get_session().get(
+            url, headers={"User-Agent": USER_AGENT}, stream=True, timeout=(min(3.0, remaining), remaining)
+        )
+        try:
+            content_type = resp.headers.get("Content-Type", "")
+            if resp.status_code != 200:
+                page.status, page.error = "error", f"HTTP {resp.status_code}"
+                return page
+            if content_type and not re.match(r"text/(html|plain)|application/xhtml", content_type, re.I):
+                page.status, page.error = "skipped", content_type.split(";")[0]
+                return page
+            raw = bytearray()
+            for block in resp.iter_content(chunk_size=16384):
+                raw += block
+                if len(raw) >= max_bytes or time.monotonic() > deadline:
+                    break
+            page.bytes = len(raw)
+            if time.monotonic() > deadline:
+                page.status = "timeout"
+                return page
+        finally:
+            resp.close()
+        html = bytes(raw[:max_bytes]).decode(_charset(content_type, bytes(raw[:2048])), errors="replace")
+        page.text = extract_main_text(html) if "plain" not in content_type else html
+        page.chunks = chunk_text(page.text, max_chars=chunk_chars)
+        page.status = "ok"
+    except requests.Timeout as e:
+        page.status, page.error = "timeout", str(e)
+    except Exception as e:  # 连不上、网页声明了不认识的编码……
+        page.status, page.error = "error", str(e)
+    finally:
+        slot.release()
+        page.ms = int((time.monotonic() - t0) * 1000)
+    return page
+
+
+def fetch_pages(
+    urls: list[str],
+    deadline_s: float | None = None,
+    max_bytes: int | None = None,
+    per_host: int = 2,
+    chunk_chars: int = 500,
+) -> list[Page]:
+    """并发抓一批网页，返回顺序和 urls 一致；到总截止时间还没抓完的记为 timeout。"""
+    deadline_s = float(os.getenv("DEEP_SEARCH_DEADLINE_S", "4")) if deadline_s is None else deadline_s
+    max_bytes = int(os.getenv("DEEP_SEARCH_MAX_BYTES", str(512 * 1024))) if max_bytes is None else max_bytes
+    deadline = time.monotonic() + deadline_s
+    urls = [u for u in dict.fromkeys(urls) if u.startswith(("http://", "https://"))]
+    futures = [FETCH_POOL.submit(fetch_page, u, deadline, max_bytes, per_host, chunk_chars) for u in urls]
+    wait(futures, timeout=max(0.0, deadline - time.monotonic()) + 0.05)
+
+    pages = []
+    for url, fut in zip(urls, futures):
+        if fut.done():
+            pages.append(fut.result())
+        else:
+            fut.cancel()
+            pages.append(Page(url, status="timeout", ms=int(deadline_s * 1000)))
+    return pages
@@ -0,0 +1,254 @@
+# =========================================
+# endpoint_pool.py
+# 多个 OpenAI 兼容网关一起用：每个网关有自己的 key / 模型 / 权重，每次请求挑当前最好的那个
+#  - 每个网关记两条 EWMA（指数加权平均）：耗时、错误率；挑的时候还看它手上有几个请求没回来
+#  - 随机挑两个（按权重）比一比，选分数低的（power of two choices）：不会所有请求都挤到同一个网关上
+#  - 好久没被挑中的网关，耗时估计慢慢回落到最快的水平，过一阵会被重新试一下（不会一次慢了就永远没机会）
+#  - 错误率太高、或者连续好几次比最快的慢好几倍：摘下来歇 drain_s 秒；回来时从头重新量
+#  - 挑中的网关出错（5xx / 429 / 连不上），马上换一个没试过的再发一次
+# 配置：环境变量 LLM_ENDPOINTS = JSON 列表（或 JSON 文件路径），每项
+#   {"name": "a", "base_url": "...", "api_key": "..."（或 "api_key_env": "环境变量名"）, "model": "...", "weight": 1（> 0）}
+# =========================================
+
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from llm_resilience import RETRY_STATUSES, is_retryable_error, status_of
+
+
+@dataclass
+class Endpoint:
+    name: str
+    base_url: str
+    api_key: str = ""
+    model: str = ""
+    weight: float = 1.0
+    # ===== 运行时统计（EndpointPool 维护） =====
+    ewma_ms: float | None = field(default=None, repr=False)  # None = 还没量过
+    err_rate: float = field(default=0.0, repr=False)
+    inflight: int = field(default=0, repr=False)
+    samples: int = field(default=0, repr=False)  # 上次摘下以来的请求数
+    slow_streak: int = field(default=0, repr=False)  # 连续几次比最快的慢 slow_factor 倍
+    updated_at: float = field(default=0.0, repr=False)
+    requests: int = field(default=0, repr=False)
+    errors: int = field(default=0, repr=False)
+    drained_until: float = field(default=0.0, repr=False)
+    drains: int = field(default=0, repr=False)
+
+
+class EndpointPool:
+    """
+    pool = EndpointPool([Endpoint("a", url_a, key_a, "gpt-4o"), Endpoint("b", url_b, key_b, "gpt-4o", weight=2)])
+    resp = pool.call(lambda ep: post_json(f"{ep.base_url}/chat/completions", {...}, headers=...))
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        alpha: float = 0.3,
+        max_error_rate: float = 0.5,
+        slow_factor: float = 3.0,
+        drain_s: float = 30.0,
+        min_samples: int = 5,
+        failover: int = 2,
+        decay_s: float = 10.0,
+        rng: random.Random | None = None,
+    ):
+        if not endpoints:
+            raise ValueError("至少要有一个网关")
+        self.endpoints = endpoints
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.slow_factor = slow_factor  # 比最快的健康网关慢这么多倍就摘掉
+        self.drain_s = drain_s
+        self.min_samples = min_samples  # 样本太少不下结论
+        self.failover = failover  # 一次 call 最多试几个网关
+        self.decay_s = decay_s  # 多久没新样本，耗时估计和最快的差距减半
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def single(cls, base_url: str, api_key: str, model: str) -> "EndpointPool":
+        return cls([Endpoint("default", base_url, api_key, model)])
+
+    def _score(self, ep: Endpoint, floor_ms: float, now: float) -> float:
+        # 没量过的按目前最快的算（乐观），这样新网关 / 刚恢复的网关会被试到
+        if ep.ewma_ms is None:
+            latency = floor_ms
+        else:
+            latency = floor_ms + (ep.ewma_ms - floor_ms) * 0.5 ** ((now - ep.updated_at) / self.decay_s)
+        return (latency + 1.0) * (1 + ep.inflight) / ep.weight / max(0.05, 1 - ep.err_rate)
+
+    def pick(self, exclude: tuple[str, ...] | list[str] = ()) -> Endpoint:
+        """挑一个网关并把它的 inflight +1；用完必须 record()。"""
+        with self._lock:
+            now = time.monotonic()
+            left = [ep for ep in self.endpoints if ep.name not in exclude] or list(self.endpoints)
+            candidates = [ep for ep in left if now >= ep.drained_until]
+            if not candidates:  # 全都摘下了：挑最快回来的那个，总不能不发
+                candidates = [min(left, key=lambda ep: ep.drained_until)]
+            if len(candidates) == 1:
+                best = candidates[0]
+            else:
+                known = [ep.ewma_ms for ep in candidates if ep.ewma_ms is not None]
+                floor = min(known) if known else 0.0
+                a = self.rng.choices(candidates, weights=[ep.weight for ep in candidates])[0]
+                rest = [ep for ep in candidates if ep is not a]
+                b = self.rng.choices(rest, weights=[ep.weight for ep in rest])[0]
+                best = min((a, b), key=lambda ep: self._score(ep, floor, now))
+            best.inflight += 1
+            return best
+
+    def record(self, ep: Endpoint, ok: bool, ms: float | None = None):
+        """一次请求的结果：ok=False 算这个网关的错；ms=None 表示耗时不计入（出错 / 流式）。"""
+        with self._lock:
+            ep.inflight = max(0, ep.inflight - 1)
+            ep.requests += 1
+            ep.samples += 1
+            if not ok:
+                ep.errors += 1
+            elif ms is not None:
+                ep.ewma_ms = ms if ep.ewma_ms is None else self.alpha * ms + (1 - self.alpha) * ep.ewma_ms
+                ep.updated_at = time.monotonic()
+            ep.err_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * ep.err_rate
+            self._maybe_drain(ep)
+
+    def _maybe_drain(self, ep: Endpoint):
+        if ep.samples < self.min_samples:
+            return
+        now = time.monotonic()
+        others = [o for o in self.endpoints if o is not ep and now >= o.drained_until]
+        if not others:
+            return  # 最后一个能用的网关不摘
+        known = [o.ewma_ms for o in others if o.ewma_ms is not None]
+        slow = bool(known) and ep.ewma_ms is not None and ep.ewma_ms > self.slow_factor * min(known)
+        ep.slow_streak = ep.slow_streak + 1 if slow else 0  # 偶尔一次慢请求不算，持续慢才摘
+        if ep.err_rate > self.max_error_rate or ep.slow_streak >= self.min_samples:
+            ep.drained_until = now + self.drain_s
+            ep.drains += 1
+            # 回来时从头量：耗时清空（按乐观值先试几次），错误率从及格线的一半起步
+            ep.ewma_ms, ep.err_rate, ep.samples, ep.slow_streak = None, self.max_error_rate / 2, 0, 0
+
+    def _bad(self, result: Any) -> bool:
+        return status_of(result) in RETRY_STATUSES
+
+    def call(self, send: Callable[[Endpoint], Any], info: dict | None = None, track: bool = True) -> Any:
+        """
+        send(endpoint) 发一次请求；挑中的网关出错就换一个没试过的。info 里会填上最后用的 endpoint。
+        track=False：耗时不计入 EWMA（流式请求只等到响应头，和普通请求的耗时不可比）。
+        """
+        tried: list[str] = []
+        attempts = min(self.failover, len(self.endpoints))
+        for i in range(attempts):
+            ep = self.pick(exclude=tried)
+            tried.append(ep.name)
+            if info is not None:
+                info["endpoint"] = ep.name
+            t0 = time.monotonic()
+            try:
+                result = send(ep)
+            except Exception as e:
+                retryable = is_retryable_error(e)
+                self.record(ep, ok=not retryable)
+                if not retryable or i == attempts - 1:
+                    raise
+                continue
+            bad = self._bad(result)
+            self.record(ep, ok=not bad, ms=(time.monotonic() - t0) * 1000 if track else None)
+            if not bad or i == attempts - 1:
+                return result
+
+    async def acall(self, send: Callable[[Endpoint], Awaitable[Any]], info: dict | None = None, track: bool = True) -> Any:
+        tried: list[str] = []
+        attempts = min(self.failover, len(self.endpoints))
+        for i in range(attempts):
+            ep = self.pick(exclude=tried)
+            tried.append(ep.name)
+            if info is not None:
+                info["endpoint"] = ep.name
+            t0 = time.monotonic()
+            try:
+                result = await send(ep)
+            except BaseException as e:  # 包括被取消（对冲输了）：inflight 要还回去
+                retryable = isinstance(e, Exception) and is_retryable_error(e)
+                self.record(ep, ok=not retryable)
+                if not retryable or i == attempts - 1:
+                    raise
+                continue
+            bad = self._bad(result)
+            self.record(ep, ok=not bad, ms=(time.monotonic() - t0) * 1000 if track else None)
+            if not bad or i == attempts - 1:
+                return result
+
+    def stats(self) -> dict[str, dict]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                ep.name: {
+                    "ewma_ms": round(ep.ewma_ms, 1) if ep.ewma_ms is not None else None,
+                    "err_rate": round(ep.err_rate, 3),
+                    "inflight": ep.inflight,
+                    "requests": ep.requests,
+                    "errors": ep.errors,
+                    "drained": now < ep.drained_until,
+                    "drains": ep.drains,
+                }
+                for ep in self.endpoints
+            }
+
+
+def load_pool(base_url: str | None = None, api_key: str | None = None, model: str | None = None) -> EndpointPool | None:
+    """
+    按 LLM_ENDPOINTS 建网关池；没配置返回 None（调用方照旧只用一个 base_url）。
+    某一项没写 api_key / model 时用传进来的默认值。
+    """
+    raw = os.getenv("LLM_ENDPOINTS", "").strip()
+    if not raw:
+        return None
+    if not raw.startswith("["):
+        raw = Path(raw).read_text(encoding="utf-8")
+    endpoints = []
+    for i, item in enumerate(json.loads(raw)):
+        name = item.get("name") or f"endpoint{i}"
+        url = (item.get("base_url") or base_url or "").rstrip("/")
+        key = item.get("api_key") or os.getenv(item.get("api_key_env", ""), "") or api_key or ""
+        weight = float(item.get("weight", 1.0))
+        if not weight > 0:  # 打分要除以权重；不想用某个网关就从列表里删掉
+            raise ValueError(f"LLM_ENDPOINTS 里 {name} 的 weight 必须大于 0（现在是 {item.get('weight')}）")
+        endpoints.append(Endpoint(
+            name=name,
+            base_url=url,
+            api_key=key,
+            model=item.get("model") or model or "gpt-4o",
+            weight=weight,
+        ))
+    return EndpointPool(endpoints)
+
+
+class PooledChatModel:
+    """
+    给只会 llm_client.invoke(messages) 的代码（ProductAgent、RollingSummarizer）用：
+    每个网关一个客户端（factory(endpoint) 创建，比如 ChatOpenAI），invoke 时由网关池挑。
+    """
+
+    def __init__(self, pool: EndpointPool, factory: Callable[[Endpoint], Any]):
+        self.pool = pool
+        self.factory = factory
+        self._clients: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _client(self, ep: Endpoint):
+        with self._lock:
+            client = self._clients.get(ep.name)
+            if client is None:
+                client = self._clients[ep.name] = self.factory(ep)
+            return client
+
+    def invoke(self, messages, **kwargs):
+        return self.pool.call(lambda ep: self._client(ep).invoke(messages, **kwargs))
@@ -0,0 +1,208 @@
+# =========================================
+# history_manager.py
+# Web 版的对话历史：每个会话一个 HistoryManager，代替只增不减的 st.session_state.history
+#  - 每轮存成一个小对象（__slots__）：原文 + token 数 + 发给模型用的两个 dict（只建一次，拼列表时直接引用）
+#  - 最多留 max_turns 轮、token_budget 个 token 的原文；超了就把最旧的整批移出（一次至少 evict_batch 轮）：
+#    两次移出之间发出去的开头不变，网关的前缀缓存一直能命中（见 prompt_layout.py）
+#  - 移出的轮次交给 summarize(旧摘要, 轮次) 折叠成摘要，在后台线程做；没给 summarize 就直接丢掉
+#  - 等着折叠的轮次也有上限（摘要一直失败也不会越攒越多），所以一个会话占的内存有上界
+# 环境变量：CHAT_HISTORY_TURNS（默认 20）、CHAT_HISTORY_TOKENS（默认 3000）、CHAT_HISTORY_EVICT（默认 4）
+# =========================================
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from text_utils import count_tokens, truncate_to_tokens
+
+SUMMARY_PROMPT = """你在帮一个聊天助理压缩对话历史。下面是已有的摘要，以及之后又聊的几轮。
+请把新对话合并进摘要：保留用户的背景、需求、做过的决定和没聊完的事，去掉寒暄和重复，
+新信息和旧摘要冲突时以新的为准；用简洁的中文条目输出，不超过 {max_chars} 字，只输出摘要本身。
+
+【已有摘要】
+{summary}
+
+【新的对话】
+{turns}
+"""
+
+# 所有会话共用的后台线程：折叠摘要要调模型，但不占用回答用户的那次请求
+SUMMARY_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+
+class Turn:
+    __slots__ = ("user", "assistant", "tokens", "messages")
+
+    def __init__(self, user: str, assistant: str):
+        self.user = user
+        self.assistant = assistant
+        # 每轮只数一次：绕开 count_tokens 的 lru_cache，不然移出窗口的原文还被缓存拽着释放不掉
+        count = count_tokens.__wrapped__
+        self.tokens = count(user) + count(assistant) + 8  # 每条消息的角色标记大约 4 个 token
+        self.messages = ({"role": "user", "content": user}, {"role": "assistant", "content": assistant})
+
+    def text(self) -> str:
+        return f"用户：{self.user}\n助手：{self.assistant}\n"
+
+
+Summarize = Callable[[str, list[Turn]], str]
+
+
+def llm_summarizer(complete: Callable[[list[dict]], str], max_chars: int = 600) -> Summarize:
+    """complete(messages) 返回模型回复的文字（比如 AgentAdapter.complete，按后台优先级排队）。"""
+
+    def summarize(summary: str, turns: list[Turn]) -> str:
+        prompt = SUMMARY_PROMPT.format(
+            max_chars=max_chars,
+            summary=summary or "（暂无）",
+            turns="".join(turn.text() for turn in turns),
+        )
+        return complete([{"role": "user", "content": prompt}]).strip()
+
+    return summarize
+
+
+class HistoryManager:
+    """
+    history = HistoryManager("你是中文助理", summarize=llm_summarizer(adapter.complete))
+    reply = adapter.chat(history.messages(), user_text, ...)
+    history.append(user_text, reply.text)
+    """
+
+    def __init__(
+        self,
+        system_prompt: str = "",
+        max_turns: int = 20,
+        token_budget: int = 3000,
+        evict_batch: int = 4,
+        summarize: Summarize | None = None,
+        max_pending: int | None = None,
+    ):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.evict_batch = evict_batch
+        self.summarize = summarize
+        self.max_pending = max_pending or 2 * max_turns  # 等着折叠的轮次最多这么多，再多就丢最旧的
+        self._lock = threading.Lock()
+        self._generation = 0  # 每次 reset +1：后台折叠回来时对话已经重置，就不要它的结果
+        self.reset(system_prompt)
+
+    @classmethod
+    def from_env(cls, system_prompt: str = "", summarize: Summarize | None = None) -> "HistoryManager":
+        return cls(
+            system_prompt,
+            max_turns=int(os.getenv("CHAT_HISTORY_TURNS", "20")),
+            token_budget=int(os.getenv("CHAT_HISTORY_TOKENS", "3000")),
+            evict_batch=int(os.getenv("CHAT_HISTORY_EVICT", "4")),
+            summarize=summarize,
+        )
+
+    def reset(self, system_prompt: str = ""):
+        with self._lock:
+            self.system_prompt = system_prompt
+            self._system_msg = {"role": "system", "content": system_prompt}
+            self.turns: deque[Turn] = deque()
+            self.tokens = 0
+            self.summary = ""
+            self._summary_msg: dict | None = None
+            self._pending: list[Turn] = []  # 已移出窗口、还没折叠进摘要的
+            self._busy = False
+            self._generation += 1
+            self.counters = {"turns": 0, "evicted": 0, "summarized": 0, "dropped": 0}
+
+    # ---------- 写 ----------
+    def append(self, user: str, assistant: str):
+        turn = Turn(user, assistant)
+        with self._lock:
+            self.turns.append(turn)
+            self.tokens += turn.tokens
+            self.counters["turns"] += 1
+            evicted = self._evict()
+        if evicted:
+            self._hand_over(evicted)
+
+    def _evict(self) -> list[Turn]:
+        """调用时已持有锁。超了就从最旧的开始移出，至少 evict_batch 轮；最新的一轮总是留着。"""
+        if len(self.turns) <= self.max_turns and self.tokens <= self.token_budget:
+            return []
+        evicted: list[Turn] = []
+        while len(self.turns) > 1 and (
+            len(evicted) < self.evict_batch or len(self.turns) > self.max_turns or self.tokens > self.token_budget
+        ):
+            turn = self.turns.popleft()
+            self.tokens -= turn.tokens
+            evicted.append(turn)
+        self.counters["evicted"] += len(evicted)
+        return evicted
+
+    def _hand_over(self, evicted: list[Turn]):
+        if self.summarize is None:
+            return
+        with self._lock:
+            self._pending.extend(evicted)
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.counters["dropped"] += overflow
+            if self._busy:
+                return  # 正在折叠的那次做完会接着处理
+            self._busy = True
+        SUMMARY_POOL.submit(self._fold)
+
+    def _fold(self):
+        """后台：把攒着的轮次一批批并进摘要；失败就保留旧摘要，等下次移出时再试。"""
+        while True:
+            with self._lock:
+                batch, summary, generation = list(self._pending), self.summary, self._generation
+                if not batch or self.summarize is None:
+                    self._busy = False
+                    return
+            try:
+                new_summary = self.summarize(summary, batch)
+            except Exception as e:
+                print("⚠️ 对话摘要更新失败（保留旧摘要，下次再试）：", e)
+                with self._lock:
+                    if generation == self._generation:
+                        self._busy = False
+                return
+            # 摘要也要有上限：模型不听话写太长时截断。长度检查不经过 count_tokens 的缓存；
+            # 真超长时 truncate_to_tokens 会经过缓存（只有这种少见情况，缓存本身也有上限）
+            limit = max(256, self.token_budget // 4)
+            if count_tokens.__wrapped__(new_summary) > limit:
+                new_summary = truncate_to_tokens(new_summary, limit)
+            with self._lock:
+                if generation != self._generation:  # 折叠期间对话被重置了，结果作废（_busy 归新的那次管）
+                    return
+                self.summary = new_summary
+                self._summary_msg = {"role": "system", "content": f"以下是更早对话的摘要：\n{new_summary}"} if new_summary else None
+                folded = {id(turn) for turn in batch}
+                left = [turn for turn in self._pending if id(turn) not in folded]
+                self.counters["summarized"] += len(self._pending) - len(left)
+                self._pending = left
+
+    # ---------- 读 ----------
+    def messages(self, with_history: bool = True) -> list[dict]:
+        """要发给模型的消息：system → 摘要 → 窗口里的各轮；dict 都是建好的，这里只拼一个新列表。"""
+        with self._lock:
+            out = [self._system_msg]
+            if with_history:
+                if self._summary_msg is not None:
+                    out.append(self._summary_msg)
+                for turn in self.turns:
+                    out.extend(turn.messages)
+        return out
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "kept": len(self.turns),
+                "tokens": self.tokens,
+                "summary_tokens": count_tokens.__wrapped__(self.summary),
+                "pending": len(self._pending),
+            }
@@ -0,0 +1,144 @@
+# =========================================
+# http_client.py
+# 进程级共享的 HTTP 客户端：连接池 + keep-alive
+#  - 同一个网关的 DNS / TCP / TLS 只建一次，后面的请求直接复用连接
+#  - 模块级单例：Streamlit 每次重跑 app.py 时模块不会重新导入，所以连接池一直在
+#  - HTTP_CLIENT=httpx 时改用 httpx（装了 h2 就走 HTTP/2）
+# 环境变量：HTTP_POOL_SIZE（默认 20）、HTTP_CONNECT_TIMEOUT（默认 5 秒）、HTTP_READ_TIMEOUT（默认 60 秒）
+# =========================================
+
+import contextlib
+import os
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+_lock = threading.Lock()
+_clients: dict = {}
+
+
+def default_timeout() -> tuple[float, float]:
+    """(连接超时, 读超时)：连不上要快点失败，模型生成慢一点可以多等。"""
+    return (
+        float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+    )
+
+
+def backend() -> str:
+    return os.getenv("HTTP_CLIENT", "requests").lower()
+
+
+def get_session(pool_size: int | None = None) -> "requests.Session":
+    """共享的 requests.Session；同样的 pool_size 拿到的是同一个对象（requests 第一次发请求时才导入）。"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", "20"))
+    key = ("requests", pool_size)
+    with _lock:
+        session = _clients.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _clients[key] = session
+        return session
+
+
+def get_httpx_client(pool_size: int | None = None):
+    """共享的 httpx.Client（装了 h2 时开 HTTP/2，多个请求复用同一条连接）。"""
+    import httpx
+
+    pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", "20"))
+    key = ("httpx", pool_size)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                http2 = False
+            connect, read = default_timeout()
+            client = httpx.Client(
+                http2=http2,
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+            _clients[key] = client
+        return client
+
+
+def post_json(url: str, payload: dict, headers: dict | None = None, timeout=None):
+    """POST 一个 JSON；返回的对象两种后端都有 status_code / content / headers / json()。"""
+    if backend() == "httpx":
+        import httpx
+
+        if timeout is not None and not isinstance(timeout, (int, float)):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        return get_httpx_client().post(url, json=payload, headers=headers, timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+    return get_session().post(url, json=payload, headers=headers, timeout=timeout or default_timeout())
+
+
+def warm_up(url: str, timeout: float = 3.0) -> bool:
+    """提前把到 url 所在主机的连接（DNS + TCP + TLS）建好放进连接池；失败不要紧，返回是否连上。"""
+    try:
+        if backend() == "httpx":
+            get_httpx_client().head(url, timeout=timeout)
+        else:
+            get_session().head(url, timeout=timeout)
+        return True
+    except Exception:
+        return False
+
+
+class _StreamResponse:
+    """流式响应的统一外壳：status_code / headers / iter_lines()（逐行 str）/ json()。"""
+
+    def __init__(self, resp, is_httpx: bool):
+        self._resp = resp
+        self._httpx = is_httpx
+        self.status_code = resp.status_code
+        self.headers = resp.headers
+
+    def iter_lines(self):
+        if self._httpx:
+            return self._resp.iter_lines()
+        self._resp.encoding = "utf-8"  # SSE 规定是 UTF-8；不设的话 requests 会按 ISO-8859-1 解中文
+        return self._resp.iter_lines(decode_unicode=True)
+
+    def json(self) -> dict:
+        if self._httpx:
+            self._resp.read()
+        return self._resp.json() if self._resp.content else {}
+
+
+@contextlib.contextmanager
+def stream_post(url: str, payload: dict, headers: dict | None = None, timeout=None):
+    """POST 一个 JSON，边收边读（SSE）；连接在 with 结束时还回连接池。"""
+    if backend() == "httpx":
+        import httpx
+
+        if timeout is not None and not isinstance(timeout, (int, float)):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        with get_httpx_client().stream(
+            "POST", url, json=payload, headers=headers, timeout=timeout or httpx.USE_CLIENT_DEFAULT
+        ) as resp:
+            yield _StreamResponse(resp, is_httpx=True)
+        return
+    resp = get_session().post(url, json=payload, headers=headers, timeout=timeout or default_timeout(), stream=True)
+    try:
+        yield _StreamResponse(resp, is_httpx=False)
+    finally:
+        resp.close()
+
+
+def close_all():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,379 @@
+# =========================================
+# llm_resilience.py
+# 调大模型网关的容错层：重试 + 熔断 + 对冲请求
+#  - 重试：429 / 5xx / 连不上 / 超时才重试，指数退避 + 全抖动（大家别同一时刻一起重试），
+#    服务端给了 Retry-After 就听它的；有总时间预算，不会越重试越久
+#  - 熔断：网关连续失败 N 次就“断开”，这段时间里的请求直接失败，不再每个都干等超时；
+#    冷却时间过了放一个请求去试探，成功就恢复
+#  - 对冲（可选）：等到最近 p95 耗时还没回来，就再发一个一样的请求，谁先回来用谁
+# 不绑定具体的 HTTP 库：call(send) / acall(send) 里的 send 是“发一次请求”的函数
+# 环境变量：LLM_RETRY_ATTEMPTS（默认 3）、LLM_BREAKER_THRESHOLD（默认 5）、LLM_BREAKER_RESET_S（默认 30）、
+#          LLM_HEDGE=1 打开对冲
+# =========================================
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+# 对冲请求要在另一个线程里发；请求本身大多在等网络
+HEDGE_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+# 各家 HTTP 库的“网络层”异常名字不同（requests / httpx / openai），按类名认
+_NETWORK_ERROR = re.compile(r"Timeout|Connect|Transport|Network|Protocol|ReadError|WriteError")
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断中：没有真正发请求。"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"网关连续失败，已暂停请求（{retry_in:.0f} 秒后再试）")
+        self.retry_in = retry_in
+
+
+def status_of(result: Any) -> int | None:
+    """HTTP 响应或 openai 的 APIStatusError 都有 status_code；langchain 的消息对象没有。"""
+    return getattr(result, "status_code", None)
+
+
+def is_retryable_error(e: BaseException) -> bool:
+    if isinstance(e, CircuitOpenError):
+        return False
+    if status_of(e) is not None:
+        return status_of(e) in RETRY_STATUSES
+    if isinstance(e, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    return any(_NETWORK_ERROR.search(cls.__name__) for cls in type(e).__mro__)
+
+
+def retry_after_of(result: Any) -> float | None:
+    """响应头里的 Retry-After（秒）；openai 的异常把响应挂在 .response 上。"""
+    headers = getattr(result, "headers", None) or getattr(getattr(result, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None  # 没给，或者给的是 HTTP 日期格式（不常见，按自己的退避算）
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 3  # 总共最多发几次（含第一次）
+    base_delay: float = 0.25
+    max_delay: float = 4.0
+    budget_s: float | None = 30.0  # 从第一次开始算，超过这么久就不再发新的一次
+    statuses: frozenset = RETRY_STATUSES
+
+    def delay(self, retry_no: int, retry_after: float | None = None) -> float:
+        """
+        第 retry_no 次重试前等多久（从 0 数）：0 ~ base * 2^n 之间随机。
+        网关给了 Retry-After 就照它等，不截到 max_delay（早了去也是再被拒一次）；等不起由 budget_s 决定不再重试。
+        """
+        if retry_after is not None:
+            return max(0.0, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry_no))
+
+
+class CircuitBreaker:
+    """closed（正常）→ 连续失败 failure_threshold 次 → open（直接拒绝）→ reset_timeout 秒后 half_open（放一个试探）。"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+    def before_call(self):
+        """放行就返回；熔断中抛 CircuitOpenError。半开时只放第一个试探请求。"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_timeout or self._probing:
+                raise CircuitOpenError(max(0.0, self.reset_timeout - waited))
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures, self._opened_at, self._probing = 0, None, False
+
+    def release(self):
+        """这次没真的发到网关（本地排队被拒等）：不算成功也不算失败，只把半开时占的试探名额还回去。"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()  # 试探失败：重新计时
+            self._probing = False
+
+
+class LatencyTracker:
+    """最近 window 次成功请求的耗时（秒），用来算对冲的等待时间。"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    caller = ResilientCaller(hedge=True)
+    resp = caller.call(lambda: post_json(url, payload, headers=headers))        # 同步
+    resp = await caller.acall(lambda: client.post(url, json=payload))          # 异步
+    重试完还是 429 / 5xx 时把最后那个响应原样返回（调用方照常显示错误）；网络异常重试完照样抛出。
+    info 传一个 dict 进来，会填上 attempts / hedged / hedge_won。
+    hedge=False：这次不对冲、耗时也不进 p95（流式请求：拿到响应头就算返回，和普通请求的耗时不是一回事）。
+    """
+
+    def __init__(
+        self,
+        retry: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+    ):
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples  # 样本太少时 p95 不靠谱，先不对冲
+        self.latency = LatencyTracker()
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ResilientCaller":
+        return cls(
+            retry=RetryPolicy(attempts=int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+            ),
+            hedge=os.getenv("LLM_HEDGE", "0") == "1",
+        )
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counters[key] += n
+
+    def hedge_delay(self) -> float | None:
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.quantile(self.hedge_quantile)
+
+    def _bad(self, result: Any) -> bool:
+        return status_of(result) in self.retry.statuses
+
+    def _settle(self, result: Any = None, error: BaseException | None = None, seconds: float | None = None):
+        """
+        一次尝试的结果记到熔断器和耗时统计里。只有网络异常和 5xx 算网关故障；
+        429（限流）、400 这类说明网关还活着，算成功（但 429 的耗时不进 p95）；
+        没到网关的本地错误（限速排队被拒等，没有状态码、也不是网络错误）不记，免得把坏网关“洗白”。
+        """
+        if error is not None:
+            if status_of(error) is None and not is_retryable_error(error):
+                self.breaker.release()
+            elif is_retryable_error(error) and status_of(error) != 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return
+        status = status_of(result)
+        if status is not None and status >= 500:
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+        if status != 429 and seconds is not None:
+            self.latency.add(seconds)
+
+    def _give_up(self, started: float, retry_no: int, wait_s: float) -> bool:
+        if retry_no + 1 >= self.retry.attempts:
+            return True
+        return self.retry.budget_s is not None and time.monotonic() - started + wait_s > self.retry.budget_s
+
+    # ===== 同步 =====
+    def _timed(self, send: Callable[[], Any], track: bool = True):
+        t0 = time.monotonic()
+        try:
+            result = send()
+        except Exception as e:
+            self._settle(error=e)
+            raise
+        self._settle(result, seconds=time.monotonic() - t0 if track else None)
+        return result
+
+    def _attempt(self, send: Callable[[], Any], info: dict, hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return self._timed(send, track=hedge)
+        first = HEDGE_POOL.submit(self._timed, send)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        self._count("hedges")
+        info["hedged"] = True
+        second = HEDGE_POOL.submit(self._timed, send)
+        pending = {first, second}
+        outcome = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None and not self._bad(fut.result()):
+                    if fut is second:
+                        self._count("hedge_wins")
+                        info["hedge_won"] = True
+                    return fut.result()  # 慢的那个不等了，回来后结果扔掉
+                outcome = outcome or fut
+        return outcome.result()  # 两个都失败：按先失败的那个处理（异常会抛出来）
+
+    def call(self, send: Callable[[], Any], info: dict | None = None, hedge: bool | None = None) -> Any:
+        info = {} if info is None else info
+        self._count("calls")
+        started = time.monotonic()
+        retry_no = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+            self._count("attempts")
+            info["attempts"] = retry_no + 1
+            try:
+                result = self._attempt(send, info, hedge is not False)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                wait_s = self.retry.delay(retry_no, retry_after_of(e))
+                if self._give_up(started, retry_no, wait_s):
+                    raise
+            else:
+                if not self._bad(result):
+                    return result
+                wait_s = self.retry.delay(retry_no, retry_after_of(result))
+                if self._give_up(started, retry_no, wait_s):
+                    return result
+            self._count("retries")
+            time.sleep(wait_s)
+            retry_no += 1
+
+    # ===== 异步 =====
+    async def _atimed(self, send: Callable[[], Awaitable[Any]], track: bool = True):
+        t0 = time.monotonic()
+        try:
+            result = await send()
+        except Exception as e:
+            self._settle(error=e)
+            raise
+        self._settle(result, seconds=time.monotonic() - t0 if track else None)
+        return result
+
+    async def _aattempt(self, send: Callable[[], Awaitable[Any]], info: dict, hedge: bool) -> Any:
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return await self._atimed(send, track=hedge)
+        first = asyncio.ensure_future(self._atimed(send))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        self._count("hedges")
+        info["hedged"] = True
+        second = asyncio.ensure_future(self._atimed(send))
+        pending, outcome = {first, second}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and not self._bad(task.result()):
+                        if task is second:
+                            self._count("hedge_wins")
+                            info["hedge_won"] = True
+                        return task.result()
+                    outcome = outcome or task
+            return outcome.result()
+        finally:
+            for task in pending:
+                task.cancel()  # 异步的可以真取消，连接直接还回去
+
+    async def acall(self, send: Callable[[], Awaitable[Any]], info: dict | None = None, hedge: bool | None = None) -> Any:
+        info = {} if info is None else info
+        self._count("calls")
+        started = time.monotonic()
+        retry_no = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+            self._count("attempts")
+            info["attempts"] = retry_no + 1
+            try:
+                result = await self._aattempt(send, info, hedge is not False)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                wait_s = self.retry.delay(retry_no, retry_after_of(e))
+                if self._give_up(started, retry_no, wait_s):
+                    raise
+            else:
+                if not self._bad(result):
+                    return result
+                wait_s = self.retry.delay(retry_no, retry_after_of(result))
+                if self._give_up(started, retry_no, wait_s):
+                    return result
+            self._count("retries")
+            await asyncio.sleep(wait_s)
+            retry_no += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        p95 = self.latency.quantile(0.95)
+        return {**counters, "breaker": self.breaker.state, "p95_ms": int(p95 * 1000) if p95 is not None else None}
+
+
+# 同一个网关共用一个（熔断状态、耗时统计都是按网关算的）
+_callers: dict[str, ResilientCaller] = {}
+_callers_lock = threading.Lock()
+
+
+def for_endpoint(base_url: str) -> ResilientCaller:
+    with _callers_lock:
+        caller = _callers.get(base_url)
+        if caller is None:
+            caller = _callers[base_url] = ResilientCaller.from_env()
+        return caller
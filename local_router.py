@@ -0,0 +1,215 @@
+# =========================================
+# local_router.py
+# 本地快速通道：纯算式、“今天几号 / 星期几 / 现在几点”这类问题不用问大模型，本地几微秒就答
+#  - 正则都预编译；算式用 ast 白名单求值（只允许数字和 + - * / % ** 括号），不用 eval
+#  - 整句都能本地答才走快速通道；“算一下 3*5 然后夸夸我”这种混合的还是交给模型，
+#    但算式本身可以先本地算好（find_calculation）
+#  - 回复用模板，口吻和人设一致（称呼可改）
+# =========================================
+
+import ast
+import datetime
+import operator
+import re
+import unicodedata
+from dataclasses import dataclass
+
+WEEKDAYS = "一二三四五六日"
+
+_BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARYOPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_MAX_ABS = 10**100  # 每一步的结果都不能超过这个，不然连乘几个大数就能把进程算死、转字符串也会出错
+
+# 口语运算符 → Python 运算符（只在两个数字之间替换，免得误伤“加油”“减肥”）
+_WORD_OPS = [
+    (re.compile(r"(?<=[\d)])\s*(?:[xX×✕*]|乘以|乘)\s*(?=[\d(-])"), "*"),
+    (re.compile(r"(?<=[\d)])\s*(?:÷|除以)\s*(?=[\d(-])"), "/"),
+    (re.compile(r"(?<=[\d)])\s*(?:加上|加)\s*(?=[\d(-])"), "+"),
+    (re.compile(r"(?<=[\d)])\s*(?:减去|减)\s*(?=[\d(-])"), "-"),
+    (re.compile(r"\^"), "**"),
+]
+# 一段“像算式”的字符：数字、小数点、括号、运算符、空格，且至少有一个运算符夹在数字中间
+# 数字不能从更大的词里截出来：前面不能是字母 / 数字 / 小数点，也不能是千分位逗号（1e5、v2、1,000）
+_EXPR = re.compile(r"[-(]*(?<![A-Za-z0-9_.])(?<!\d,)\d[\d.\s()+\-*/%]*")
+_EXPR_TAIL = re.compile(r"[A-Za-z_]|,\d")  # 算式后面紧跟这些，说明是从更大的词里截出来的
+_HAS_OP = re.compile(r"\d\s*\)*\s*(?:\*\*|[-+*/%])\s*\(*\s*-?\d")
+# 看着像算式其实不是：日期（2026-10-18、2026/10/18）、电话 / 编号（138-1234-5678，连字符串起来 7 位数字以上）
+_NOT_EXPR = re.compile(r"\d{4}[-/]\d{1,2}(?:[-/]\d{1,2})?|(?=(?:-?\d){7})\d+(?:-\d+){2,}")
+# 夹在一句话里时有歧义的写法，先改掉再找算式：10/18（月/日）、3-5号楼 / 3-5天（范围）
+_MONTH_DAY = re.compile(r"(?<![\d/.])((?:0?[1-9]|1[0-2]))/((?:0?[1-9]|[12]\d|3[01]))(?![\d/.])")
+_RANGE = re.compile(r"(?<![\d.])(\d+)-(\d+)(?=[号楼栋层室单元点岁天年月日周个次元块斤米])")
+# 算式前后允许出现的客气话 / 问法（去掉这些后什么都不剩，才算“纯算式”）
+_CALC_FILLER = re.compile(
+    r"(?:请问|请|麻烦|帮我|帮忙|给我|你|奶奶问|计算一下|计算|算一下|算算|算|一下|等于|是|多少|几|结果|"
+    r"呀|啊|呢|吧|嗯|[=?？!！。,，:：\s])*"
+)
+
+_DAY_OFFSETS = {"今天": 0, "今儿": 0, "明天": 1, "后天": 2, "昨天": -1, "前天": -2}
+_DATE_Q = re.compile(
+    r"^(?:请问|奶奶问)?(今天|今儿|明天|后天|昨天|前天)(?:是)?"
+    r"(?:(?:几月)?几[号日]|星期几|周几|礼拜几|日期|什么日子|[,，、和])+"
+    r"(?:啊|呀|呢|了|来着)?[?？。!！]*$"
+)
+_TIME_Q = re.compile(r"^(?:请问)?(?:现在)?(?:是)?几点(?:了|啦|钟)?(?:啊|呀|呢)?[?？。!！]*$")
+
+
+@dataclass
+class Calculation:
+    expr: str  # 规范化后的算式（给人看的写法：× ÷）
+    value: float | int
+
+    @property
+    def value_text(self) -> str:
+        if isinstance(self.value, float):
+            if self.value.is_integer() and abs(self.value) < 1e15:
+                return str(int(self.value))
+            return f"{self.value:.10g}"
+        return str(self.value)
+
+
+@dataclass
+class LocalAnswer:
+    intent: str  # calc / date / time
+    text: str
+
+
+def _bounded(value):
+    if abs(value) > _MAX_ABS:
+        raise ValueError("数太大")
+    return value
+
+
+def _eval_node(node):
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return _bounded(node.value)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARYOPS:
+        return _UNARYOPS[type(node.op)](_eval_node(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        left, right = _eval_node(node.left), _eval_node(node.right)
+        if isinstance(node.op, ast.Pow) and (abs(right) > 64 or abs(left) > 1e6):
+            raise ValueError("指数太大")  # 9**9**9 这种会把进程算死
+        return _bounded(_BINOPS[type(node.op)](left, right))
+    raise ValueError("不支持的表达式")
+
+
+def safe_eval(expr: str):
+    """只算数字四则运算（含 % 和 **）；别的语法一律 ValueError，除以 0 抛 ZeroDivisionError。"""
+    if len(expr) > 200:
+        raise ValueError("算式太长")
+    return _eval_node(ast.parse(expr, mode="eval"))
+
+
+def _normalize(text: str, strict: bool = False) -> str:
+    """strict：算式夹在一句话里时用，把日期、范围这种有歧义的写法先改掉，不当算式。"""
+    text = unicodedata.normalize("NFKC", text)  # 全角数字 / 括号 / 运算符 → 半角
+    if strict:
+        text = _MONTH_DAY.sub(r"\1月\2", text)
+        text = _RANGE.sub(r"\1至\2", text)
+    for pattern, op in _WORD_OPS:
+        text = pattern.sub(op, text)
+    return text
+
+
+def _find_exprs(text: str) -> list[tuple[str, int, int]]:
+    """在规范化后的文本里找出所有合法算式，返回 [(算式, 起点, 终点)]。"""
+    found = []
+    for m in _EXPR.finditer(text):
+        start = m.start() + len(m.group()) - len(m.group().lstrip())
+        candidate = m.group().strip().rstrip(" +-*/%(.")
+        if not _HAS_OP.search(candidate):
+            continue
+        # 括号可能没配平（“(3+5)*2)”），从右往左削到能解析为止
+        while candidate:
+            try:
+                ast.parse(candidate, mode="eval")
+                break
+            except SyntaxError:
+                candidate = candidate[:-1].rstrip(" +-*/%(.")
+        if not candidate or _NOT_EXPR.fullmatch(candidate):
+            continue
+        end = start + len(candidate)
+        if _EXPR_TAIL.match(text, end):
+            continue
+        if _HAS_OP.search(candidate):
+            found.append((candidate, start, end))
+    return found
+
+
+def _find_expr(text: str) -> tuple[str, int, int] | None:
+    """最长的那段算式。"""
+    return max(_find_exprs(text), key=lambda item: len(item[0]), default=None)
+
+
+def _pretty(expr: str) -> str:
+    return re.sub(r"\s+", "", expr).replace("**", "^").replace("*", "×").replace("/", "÷")
+
+
+def find_calculation(text: str) -> Calculation | None:
+    """从一句话里找出真正的算式并算出来；找不到、算不了、或者有好几段拿不准是哪段，都返回 None。"""
+    found = _find_exprs(_normalize(text, strict=True))
+    if len(found) != 1:
+        return None
+    try:
+        calc = Calculation(_pretty(found[0][0]), safe_eval(found[0][0]))
+        calc.value_text  # 转成文字也可能出错（数太长），先试一下，出错就当没找到
+    except (ValueError, ZeroDivisionError, OverflowError, SyntaxError, TypeError):
+        return None
+    return calc
+
+
+class LocalRouter:
+    """router.route("12.5×8 等于多少") -> LocalAnswer；不能完全本地回答时返回 None。"""
+
+    def __init__(self, name: str = "奶奶", now=datetime.datetime.now):
+        self.name = name
+        self.now = now  # 测试时可以换成固定时间
+
+    def _calc(self, text: str) -> LocalAnswer | None:
+        normalized = _normalize(text)
+        found = _find_expr(normalized)
+        if not found:
+            return None
+        expr, start, end = found
+        rest = normalized[:start] + normalized[end:]
+        if not _CALC_FILLER.fullmatch(rest):
+            return None  # 除了算式还说了别的事
+        try:
+            calc = Calculation(_pretty(expr), safe_eval(expr))
+            return LocalAnswer("calc", f"{self.name}，{calc.expr} = {calc.value_text}，算好啦～")
+        except ZeroDivisionError:
+            return LocalAnswer("calc", f"{self.name}，{_pretty(expr)} 里有除以 0，这个没法算哦～")
+        except (ValueError, OverflowError, SyntaxError, TypeError):
+            return None  # 算不了（数太大等）就交给模型
+
+    def _date(self, text: str) -> LocalAnswer | None:
+        m = _DATE_Q.match(text)
+        if not m:
+            return None
+        word = m.group(1)
+        day = self.now().date() + datetime.timedelta(days=_DAY_OFFSETS[word])
+        return LocalAnswer(
+            "date",
+            f"{self.name}，{word}是 {day.year}年{day.month}月{day.day}日，星期{WEEKDAYS[day.weekday()]}～",
+        )
+
+    def _time(self, text: str) -> LocalAnswer | None:
+        if not _TIME_Q.match(text):
+            return None
+        now = self.now()
+        return LocalAnswer("time", f"{self.name}，现在是 {now.hour}点{now.minute:02d}分～")
+
+    def route(self, text: str) -> LocalAnswer | None:
+        text = re.sub(r"\s+", "", text)
+        if not text or len(text) > 80:
+            return None
+        return self._date(text) or self._time(text) or self._calc(text)
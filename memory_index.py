@@ -0,0 +1,113 @@
+# =========================================
+# memory_index.py
+# 对话记忆的本地向量索引（纯 CPU，只依赖 NumPy）
+#  - 哈希向量化：词项哈希到固定维度，不用下载任何模型
+#  - 第 k 行向量就是第 k 轮对话，存成裸 float32 文件，启动时 np.memmap 映射
+#  - save_turn 之后 sync() 只补算新增的那几轮
+# =========================================
+
+import json
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from text_utils import split_terms
+
+INDEX_VERSION = "crc32-signed-v1"  # 向量化方式变了就改这个，旧索引会自动重建
+
+# 每行开头的“[时间] 奶奶：/助手：”每轮都有，不参与相似度
+_LINE_META = re.compile(r"^\[[^\]\n]*\] [^：\n]{1,8}：", re.M)
+
+
+class HashingVectorizer:
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def transform(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for term, tf in Counter(split_terms(text)).items():
+            h = zlib.crc32(term.encode("utf-8"))  # 跨进程稳定（内置 hash() 每次启动都变）
+            sign = 1.0 if h & 0x80000000 else -1.0  # 带符号哈希，冲突时互相抵消而不是叠加
+            vec[h % self.dim] += sign * (1.0 + math.log(tf))
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            vec /= norm
+        return vec
+
+
+class MemoryVectorIndex:
+    """
+    放在记忆文件旁边：memory/xxx.txt.vec（向量）+ memory/xxx.txt.vec.json（维度/版本）。
+    10 万轮 × 512 维 ≈ 200 MB，查询是一次矩阵乘向量，毫秒级。
+    """
+
+    def __init__(self, memory, dim: int = 512):
+        self.memory = memory
+        self.dim = dim
+        self.vectorizer = HashingVectorizer(dim)
+        self.path = memory.sidecar_path(".vec")
+        self.meta_path = memory.sidecar_path(".vec.json")
+        self._matrix: np.ndarray | None = None
+        self._rows = -1
+
+        meta = json.loads(self.meta_path.read_text(encoding="utf-8")) if self.meta_path.exists() else {}
+        if meta.get("dim") != dim or meta.get("version") != INDEX_VERSION or not self.path.exists():
+            self._reset()
+        elif self.path.stat().st_size % self._row_bytes:
+            # 上次写到一半退出了：砍掉不完整的那一行
+            with self.path.open("r+b") as f:
+                f.truncate(len(self) * self._row_bytes)
+        self.sync()
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * 4
+
+    def __len__(self) -> int:
+        return self.path.stat().st_size // self._row_bytes
+
+    def _reset(self):
+        self._matrix, self._rows = None, -1
+        self.path.write_bytes(b"")
+        self.meta_path.write_text(json.dumps({"dim": self.dim, "version": INDEX_VERSION}), encoding="utf-8")
+
+    def _map(self) -> np.ndarray:
+        """文件长度变了才重新映射；映射本身不读数据，由系统按需换页。"""
+        n = len(self)
+        if n != self._rows:
+            self._matrix = (
+                np.memmap(self.path, dtype=np.float32, mode="r", shape=(n, self.dim))
+                if n else np.zeros((0, self.dim), dtype=np.float32)
+            )
+            self._rows = n
+        return self._matrix
+
+    def sync(self, batch: int = 1000) -> int:
+        """把记忆里还没向量化的轮次补上，返回补了多少轮。"""
+        done, total = len(self), self.memory.turn_count()
+        if done > total:  # 记忆文件被改小/重写了，整体重建
+            self._reset()
+            done = 0
+        with self.path.open("ab") as f:
+            for start in range(done, total, batch):
+                end = min(total, start + batch)
+                rows = np.stack([
+                    self.vectorizer.transform(_LINE_META.sub("", self.memory.load_turn(k)))
+                    for k in range(start, end)
+                ])
+                rows.tofile(f)
+        return total - done
+
+    def search(self, query: str, k: int = 3, exclude_last: int = 0, min_score: float = 0.15) -> list[tuple[int, float]]:
+        """返回最相关的 (轮次, 相似度)，按相似度从高到低；exclude_last 排除最近几轮（它们本来就在提示里）。"""
+        matrix = self._map()
+        n = matrix.shape[0] - exclude_last
+        if n <= 0 or k <= 0:
+            return []
+        scores = matrix[:n] @ self.vectorizer.transform(query)
+        top = np.argpartition(-scores, k - 1)[:k] if n > k else np.arange(n)
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] >= min_score]
@@ -0,0 +1,537 @@
+# =========================================
+# memory_store.py
+# 对话记忆的文件存储：按“轮”读写 memory/*.txt
+#  - 倒序分块读取：只读文件末尾够用的几块，拿到最近 N 轮
+#  - 偏移索引（.idx）：记录每一轮在文件里的起始字节，第 K 轮 O(1) 读取
+#  - 分段滚动日志：按大小/按天切段 + manifest + 后台合并/归档
+# =========================================
+
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+from array import array
+from pathlib import Path
+
+# 一轮以“用户行”开头：[2025-11-05 13:02:33] 奶奶：...
+# 助手的回答可能有多行，所以不能简单按“一轮两行”来切
+TURN_START = re.compile(r"^\[[^\]\n]{1,40}\] 奶奶：".encode("utf-8"), re.M)
+
+TURN_TS = re.compile(rb"^\[([^\]\n]{1,40})\] ")
+
+_OFFSET = array("q").itemsize  # 索引里每个偏移量占 8 字节
+
+
+def _tail_bytes(path: Path, n: int, block_size: int = 64 * 1024) -> bytes:
+    if n <= 0:
+        return b""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+            # 块开头的匹配不一定在行首（前一个字节未知），等下一块拼上再算
+            starts = [m.start() for m in TURN_START.finditer(buf) if m.start() > 0 or pos == 0]
+            if len(starts) >= n:
+                return buf[starts[-n]:]
+            block_size *= 2  # 回答很长时块逐步加倍，总读取量仍与结果同阶
+        return buf
+
+
+def read_tail_turns(path: Path, n: int, block_size: int = 64 * 1024) -> str:
+    """从文件末尾往前按块读取，凑够最近 n 轮就停，不读整个文件。"""
+    return _tail_bytes(path, n, block_size).decode("utf-8", errors="replace")
+
+
+class TurnIndex:
+    """
+    记忆文件的偏移索引（memory/xxx.txt.idx）：
+    [已索引到的文件长度][第0轮起点][第1轮起点]...，全是 8 字节整数。
+    文件被外部追加时只补扫新增部分；被截断/改小时整体重建。
+    """
+
+    def __init__(self, data_path: Path):
+        self.data_path = data_path
+        self.path = data_path.with_name(data_path.name + ".idx")
+        self.sync()
+
+    # ---------- 读 ----------
+    def __len__(self) -> int:
+        return max(0, self.path.stat().st_size // _OFFSET - 1)
+
+    def _read(self, start: int, count: int) -> array:
+        offsets = array("q")
+        with self.path.open("rb") as f:
+            f.seek((start + 1) * _OFFSET)
+            offsets.frombytes(f.read(count * _OFFSET))
+        return offsets
+
+    def covered(self) -> int:
+        """索引已经覆盖到的数据文件长度。"""
+        header = array("q")
+        with self.path.open("rb") as f:
+            header.frombytes(f.read(_OFFSET))
+        return header[0] if header else -1
+
+    def offset(self, k: int) -> int:
+        return self._read(k, 1)[0]
+
+    def span(self, k: int) -> tuple[int, int]:
+        """第 k 轮在数据文件里的 [起, 止) 字节区间。"""
+        pair = self._read(k, 2)
+        end = pair[1] if len(pair) > 1 else self.covered()
+        return pair[0], end
+
+    # ---------- 写 ----------
+    def append(self, offset: int, covered: int):
+        with self.path.open("r+b") as f:
+            f.seek(0, os.SEEK_END)
+            array("q", [offset]).tofile(f)
+            f.seek(0)
+            array("q", [covered]).tofile(f)
+
+    def sync(self):
+        """保证索引和数据文件一致（缺失/落后/过期时补扫或重建）。"""
+        size = self.data_path.stat().st_size
+        start = self.covered() if self.path.exists() and self.path.stat().st_size >= _OFFSET else -1
+        if start == size:
+            return
+        if start < 0 or start > size:
+            start = 0
+            with self.path.open("wb") as f:
+                array("q", [0]).tofile(f)
+
+        offsets = array("q")
+        pos = start
+        with self.data_path.open("rb") as f:
+            f.seek(start)
+            for line in f:
+                if TURN_START.match(line):
+                    offsets.append(pos)
+                pos += len(line)
+
+        with self.path.open("r+b") as f:
+            f.seek(0, os.SEEK_END)
+            offsets.tofile(f)
+            f.seek(0)
+            array("q", [size]).tofile(f)
+
+
+def load_summary_file(path: Path) -> tuple[str, int]:
+    """滚动摘要 sidecar：返回 (摘要, 已折叠进摘要的轮数)。"""
+    if not path.exists():
+        return "", -1
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return data.get("summary", ""), data.get("covered", 0)
+
+
+def save_summary_file(path: Path, summary: str, covered: int):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({
+        "summary": summary,
+        "covered": covered,
+        "updated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class SimpleFileMemory:
+    def __init__(self, file_path: str = "./memory/nainai_memory.txt", max_rounds: int = 20, use_index: bool = True):
+        # ① 解析成绝对路径，保证不受“当前工作目录”影响
+        self.path = Path(file_path).resolve()
+        self.max_rounds = max_rounds
+
+        # ② 创建父目录
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # ③ 若文件不存在，先“touch”一下，确保后续可写
+        if not self.path.exists():
+            self.path.touch()
+
+        # ④ 偏移索引（目录只读等情况建不了索引，就退回倒序分块读取）
+        self.index = None
+        if use_index:
+            try:
+                self.index = TurnIndex(self.path)
+            except OSError:
+                self.index = None
+
+    def sidecar_path(self, suffix: str) -> Path:
+        """和记忆文件放在一起的派生文件，比如 memory/xxx.txt.vec。"""
+        return self.path.with_name(self.path.name + suffix)
+
+    # ---------- 滚动摘要（memory/xxx.txt.summary.json） ----------
+    def load_summary(self) -> tuple[str, int]:
+        return load_summary_file(self.path.with_name(self.path.name + ".summary.json"))
+
+    def save_summary(self, summary: str, covered: int):
+        save_summary_file(self.path.with_name(self.path.name + ".summary.json"), summary, covered)
+
+    def turn_count(self) -> int:
+        if self.index is not None:
+            return len(self.index)
+        with self.path.open("rb") as f:
+            return sum(1 for line in f if TURN_START.match(line))
+
+    def load_turn(self, k: int) -> str:
+        """读取第 k 轮（支持负数下标），有索引时只 seek 一次。"""
+        n = self.turn_count()
+        if k < 0:
+            k += n
+        if not 0 <= k < n:
+            raise IndexError(f"第 {k} 轮不存在（共 {n} 轮）")
+        if self.index is None:
+            raw = _tail_bytes(self.path, n - k)
+            nxt = TURN_START.search(raw, 1)
+            return (raw[: nxt.start()] if nxt else raw).decode("utf-8", errors="replace")
+        start, end = self.index.span(k)
+        with self.path.open("rb") as f:
+            f.seek(start)
+            return f.read(end - start).decode("utf-8", errors="replace")
+
+    def load_last(self, n: int) -> str:
+        """最近 n 轮的原文（按文件里的格式）。"""
+        if not self.path.exists() or n <= 0:
+            return ""
+        if self.index is None:
+            return read_tail_turns(self.path, n)
+        total = len(self.index)
+        start = self.index.offset(total - n) if total > n else 0
+        with self.path.open("rb") as f:
+            f.seek(start)
+            return f.read().decode("utf-8", errors="replace")
+
+    def load_turns(self, n: int) -> list[str]:
+        """最近 n 轮，每轮一个字符串（从旧到新）。"""
+        return _split_turns(self.load_last(n).encode("utf-8"))
+
+    def load_history(self) -> str:
+        return self.load_last(self.max_rounds)
+
+    def save_turn(self, user: str, assistant: str):
+        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        record = f"[{ts}] 奶奶：{user}\n[{ts}] 助手：{assistant}\n"
+        with self.path.open("ab") as f:
+            offset = f.tell()
+            # 按字节写才能拿到准确偏移；换行沿用文本模式的本机换行符
+            f.write(record.replace("\n", os.linesep).encode("utf-8"))
+            end = f.tell()
+        if self.index is not None:
+            if self.index.covered() == offset:
+                self.index.append(offset, end)
+            else:
+                self.index.sync()  # 期间被别人写过，补扫一下
+
+
+def _turn_ts(turn: str) -> str:
+    m = TURN_TS.match(turn.encode("utf-8"))
+    return m.group(1).decode("utf-8") if m else ""
+
+
+def _split_turns(raw: bytes) -> list[str]:
+    starts = [m.start() for m in TURN_START.finditer(raw)]
+    if not starts:
+        return []
+    starts[0] = 0  # 第一轮之前的零散内容并进第一轮，保证无损
+    ends = starts[1:] + [len(raw)]
+    return [raw[a:b].decode("utf-8", errors="replace") for a, b in zip(starts, ends)]
+
+
+# ========= 分段滚动日志 =========
+class SegmentedFileMemory:
+    """
+    分段版记忆：memory/nainai_memory.segments/ 下按大小或按天滚出多个段文件，
+    manifest.json 记下每一段（热段 hot / 冷段 cold / 已归档 archived）。
+    最新的热段很小，启动、读历史、写入都只碰它（不够时才往前翻冷段）；
+    冷段由后台线程整理：相邻小段合并成大段，过期的段压缩进 archive/。
+    每段仍是“[ts] 奶奶：/ [ts] 助手：”格式，旧的单文件会被无损切分迁移进来。
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(
+        self,
+        file_path: str = "./memory/nainai_memory.txt",
+        max_rounds: int = 20,
+        max_segment_bytes: int = 4 * 1024 * 1024,
+        roll_daily: bool = True,
+        merge_target_bytes: int = 32 * 1024 * 1024,
+        archive_after_days: int = 30,
+        background: bool = True,
+    ):
+        self.legacy_path = Path(file_path).resolve()
+        self.path = self.legacy_path.with_suffix(".segments")
+        self.archive_dir = self.path / "archive"
+        self.max_rounds = max_rounds
+        self.max_segment_bytes = max_segment_bytes
+        self.roll_daily = roll_daily
+        self.merge_target_bytes = merge_target_bytes
+        self.archive_after_days = archive_after_days
+        self.background = background
+
+        self._lock = threading.RLock()
+        self._compactor: threading.Thread | None = None
+        self._cold: dict[str, SimpleFileMemory] = {}  # 打开过的冷段
+        self._archive_cache: tuple[str, list[str]] = ("", [])  # 最近解压过的归档段
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.path / self.MANIFEST
+        if manifest_path.exists():
+            self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        else:
+            self.manifest = {"version": 1, "next_id": 1, "segments": []}
+            self._migrate_legacy()
+            self._new_hot()
+            self._write_manifest()
+        self._hot = SimpleFileMemory(str(self._seg_path(self._hot_entry())), max_rounds)
+
+    # ---------- manifest ----------
+    def _write_manifest(self):
+        tmp = self.path / (self.MANIFEST + ".tmp")
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path / self.MANIFEST)
+
+    def _seg_path(self, entry: dict) -> Path:
+        if entry["state"] == "archived":
+            return self.archive_dir / entry["name"]
+        return self.path / entry["name"]
+
+    def _hot_entry(self) -> dict:
+        return self.manifest["segments"][-1]
+
+    def _alloc_name(self) -> str:
+        name = f"seg-{self.manifest['next_id']:06d}.txt"
+        self.manifest["next_id"] += 1
+        return name
+
+    def _new_hot(self):
+        name = self._alloc_name()
+        (self.path / name).touch()
+        self.manifest["segments"].append({
+            "name": name,
+            "state": "hot",
+            "day": datetime.date.today().isoformat(),
+            "turns": 0,
+            "bytes": 0,
+            "first_ts": "",
+            "last_ts": "",
+        })
+
+    def _cold_entry(self, name: str, state: str = "cold") -> dict:
+        """给一个写完的段统计轮数、大小、首尾时间。"""
+        mem = SimpleFileMemory(str(self.path / name), self.max_rounds)
+        turns = mem.turn_count()
+        first_ts = _turn_ts(mem.load_turn(0)) if turns else ""
+        last_ts = _turn_ts(mem.load_turn(-1)) if turns else ""
+        return {
+            "name": name,
+            "state": state,
+            "day": first_ts[:10],
+            "turns": turns,
+            "bytes": mem.path.stat().st_size,
+            "first_ts": first_ts,
+            "last_ts": last_ts,
+        }
+
+    # ---------- 迁移旧单文件 ----------
+    def _migrate_legacy(self):
+        """把旧的 nainai_memory.txt 按天/按大小切成冷段；原文件保留不动。"""
+        if not self.legacy_path.exists() or self.legacy_path.stat().st_size == 0:
+            return
+        names = []
+        out = None
+        day, size = None, 0
+        with self.legacy_path.open("rb") as f:
+            for line in f:
+                m = TURN_TS.match(line) if TURN_START.match(line) else None
+                line_day = m.group(1)[:10].decode("utf-8", errors="replace") if m else day
+                if out is None or (m and (line_day != day or size >= self.max_segment_bytes)):
+                    if out is not None:
+                        out.close()
+                    names.append(self._alloc_name())
+                    out = (self.path / names[-1]).open("wb")
+                    day, size = line_day, 0
+                out.write(line)
+                size += len(line)
+        if out is not None:
+            out.close()
+        self.manifest["segments"].extend(self._cold_entry(name) for name in names)
+        self.manifest["migrated_from"] = {
+            "path": self.legacy_path.name,
+            "bytes": self.legacy_path.stat().st_size,
+        }
+
+    # ---------- 读 ----------
+    def _open_segment(self, entry: dict):
+        """返回 (轮数, 取最近 n 轮的函数, 取第 k 轮的函数)。"""
+        if entry["state"] == "hot":
+            mem = self._hot
+        elif entry["state"] == "archived":
+            # 归档段要整段解压；连续按轮读取（比如建索引）时别每轮都解压一遍
+            name, turns = self._archive_cache
+            if name != entry["name"]:
+                with gzip.open(self._seg_path(entry), "rb") as f:
+                    turns = _split_turns(f.read())
+                self._archive_cache = (entry["name"], turns)
+            return len(turns), lambda n: "".join(turns[-n:]) if n > 0 else "", turns.__getitem__
+        else:
+            mem = self._cold.get(entry["name"])
+            if mem is None:
+                mem = self._cold[entry["name"]] = SimpleFileMemory(str(self._seg_path(entry)), self.max_rounds)
+        return mem.turn_count(), mem.load_last, mem.load_turn
+
+    def sidecar_path(self, suffix: str) -> Path:
+        return self.path / ("memory" + suffix)
+
+    def load_summary(self) -> tuple[str, int]:
+        return load_summary_file(self.path / "summary.json")
+
+    def save_summary(self, summary: str, covered: int):
+        save_summary_file(self.path / "summary.json", summary, covered)
+
+    def turn_count(self) -> int:
+        with self._lock:
+            cold = sum(e["turns"] for e in self.manifest["segments"][:-1])
+            return cold + self._hot.turn_count()
+
+    def load_turn(self, k: int) -> str:
+        with self._lock:
+            n = self.turn_count()
+            if k < 0:
+                k += n
+            if not 0 <= k < n:
+                raise IndexError(f"第 {k} 轮不存在（共 {n} 轮）")
+            for entry in self.manifest["segments"]:
+                turns = self._hot.turn_count() if entry["state"] == "hot" else entry["turns"]
+                if k < turns:
+                    return self._open_segment(entry)[2](k)
+                k -= turns
+        raise IndexError(k)
+
+    def load_last(self, n: int) -> str:
+        """从热段往前翻，凑够最近 n 轮就停。"""
+        parts = []
+        with self._lock:
+            for entry in reversed(self.manifest["segments"]):
+                if n <= 0:
+                    break
+                turns, load_last, _ = self._open_segment(entry)
+                take = min(n, turns)
+                if take:
+                    parts.append(load_last(take))
+                n -= take
+        return "".join(reversed(parts))
+
+    def load_turns(self, n: int) -> list[str]:
+        """最近 n 轮，每轮一个字符串（从旧到新）。"""
+        return _split_turns(self.load_last(n).encode("utf-8"))
+
+    def load_history(self) -> str:
+        return self.load_last(self.max_rounds)
+
+    # ---------- 写 ----------
+    def save_turn(self, user: str, assistant: str):
+        with self._lock:
+            hot = self._hot_entry()
+            today = datetime.date.today().isoformat()
+            if self._hot.turn_count() and (
+                self._hot.path.stat().st_size >= self.max_segment_bytes
+                or (self.roll_daily and hot["day"] != today)
+            ):
+                self._roll()
+            self._hot.save_turn(user, assistant)
+
+    def _roll(self):
+        """热段封存成冷段，另开一个新的热段。"""
+        segments = self.manifest["segments"]
+        segments[-1] = self._cold_entry(segments[-1]["name"])
+        self._new_hot()
+        self._write_manifest()
+        self._hot = SimpleFileMemory(str(self._seg_path(self._hot_entry())), self.max_rounds)
+        if self.background:
+            self.compact_in_background()
+
+    # ---------- 后台整理 ----------
+    def compact_in_background(self) -> threading.Thread:
+        with self._lock:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self._compact_safely, name="memory-compaction", daemon=True)
+                self._compactor.start()
+            return self._compactor
+
+    def _compact_safely(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print("⚠️ 记忆整理失败（下次滚动时会再试）：", e)
+
+    def compact(self):
+        """先把相邻的小冷段合并，再归档过期冷段。冷段不再被写，重活都在锁外做。"""
+        self._merge_small()
+        self._archive_old()
+
+    def _archive_old(self):
+        cutoff = (datetime.date.today() - datetime.timedelta(days=self.archive_after_days)).isoformat()
+        with self._lock:
+            old = [dict(e) for e in self.manifest["segments"][:-1]
+                   if e["state"] == "cold" and e["last_ts"][:10] < cutoff]
+        if not old:
+            return
+        self.archive_dir.mkdir(exist_ok=True)
+        for entry in old:
+            src = self._seg_path(entry)
+            name = entry["name"] + ".gz"
+            tmp = self.archive_dir / (name + ".tmp")
+            with src.open("rb") as fin, gzip.open(tmp, "wb") as fout:
+                shutil.copyfileobj(fin, fout)
+            os.replace(tmp, self.archive_dir / name)
+            with self._lock:
+                for e in self.manifest["segments"]:
+                    if e["name"] == entry["name"]:
+                        e.update(name=name, state="archived")
+                self._write_manifest()
+                self._drop(src)
+
+    def _merge_small(self):
+        with self._lock:
+            groups, run, size = [], [], 0
+            for e in self.manifest["segments"][:-1]:
+                if e["state"] == "cold" and (not run or size + e["bytes"] <= self.merge_target_bytes):
+                    run.append(dict(e))
+                    size += e["bytes"]
+                    continue
+                if len(run) > 1:
+                    groups.append(run)
+                run, size = ([dict(e)], e["bytes"]) if e["state"] == "cold" else ([], 0)
+            if len(run) > 1:
+                groups.append(run)
+
+        for run in groups:
+            with self._lock:
+                name = self._alloc_name()
+            tmp = self.path / (name + ".tmp")
+            with tmp.open("wb") as out:
+                for e in run:
+                    with self._seg_path(e).open("rb") as f:
+                        shutil.copyfileobj(f, out)
+            os.replace(tmp, self.path / name)
+            merged = self._cold_entry(name)
+            with self._lock:
+                names = [e["name"] for e in self.manifest["segments"]]
+                first = names.index(run[0]["name"])
+                self.manifest["segments"][first:first + len(run)] = [merged]
+                self._write_manifest()
+                for e in run:
+                    self._drop(self.path / e["name"])
+
+    def _drop(self, seg: Path):
+        self._cold.pop(seg.name, None)
+        for p in (seg, seg.with_name(seg.name + ".idx")):
+            p.unlink(missing_ok=True)
@@ -0,0 +1,98 @@
+# =========================================
+# memory_summary.py
+# 滚动摘要：滚出“原文窗口”的旧轮次折叠进一段持久化的摘要
+#  - 每次只把新滚出来的那几轮（增量）和旧摘要一起交给模型，不从头重算
+#  - 在后台线程里做，不占用回答奶奶的那次请求；限速排队时排在最后（BACKGROUND）
+# =========================================
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from rate_limiter import BACKGROUND, RateLimiter, estimate_tokens, get_limiter
+
+SUMMARY_PROMPT = """你在帮一位AI学习助理维护它和奶奶之间的“长期记忆摘要”。
+下面是已有的摘要，以及之后新发生的几轮对话。请把新对话合并进摘要：
+- 保留事实：奶奶的个人信息、住址、学习进度、目标、喜好、做过的约定、没聊完的事；
+- 去掉寒暄和重复内容，新信息和旧摘要冲突时以新的为准；
+- 用简洁的中文条目输出，不超过 {max_chars} 字，只输出摘要本身。
+
+【已有摘要】
+{summary}
+
+【新的对话】
+{turns}
+"""
+
+
+class RollingSummarizer:
+    def __init__(
+        self,
+        llm_client,
+        memory,
+        keep_rounds: int | None = None,
+        batch: int = 5,
+        backfill: int = 40,
+        max_chars: int = 600,
+        limiter: RateLimiter | None = None,
+    ):
+        self.llm_client = llm_client
+        self.limiter = limiter or get_limiter()
+        self.memory = memory
+        self.keep_rounds = keep_rounds or memory.max_rounds  # 最近这么多轮保持原文
+        self.batch = batch          # 攒够这么多轮才折叠一次，少调几次模型
+        self.backfill = backfill    # 第一次启用时，最多往回折叠这么多轮（更早的不补算）
+        self.max_chars = max_chars
+
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+        self._pending: Future | None = None
+
+    # ---------- 读 ----------
+    def state(self) -> tuple[str, int]:
+        """(摘要, 已折叠的轮数)；从没摘要过时按 backfill 定一个起点。"""
+        summary, covered = self.memory.load_summary()
+        if covered < 0:
+            covered = max(0, self.memory.turn_count() - self.keep_rounds - self.backfill)
+        return summary, covered
+
+    def window(self) -> int:
+        """原文部分应该带多少轮：摘要还没追上的那几轮也带上，不留空档。"""
+        _, covered = self.state()
+        return max(self.keep_rounds, min(self.memory.turn_count() - covered, self.keep_rounds + 2 * self.batch))
+
+    # ---------- 更新 ----------
+    def schedule(self) -> Future | None:
+        """够一批了就丢给后台线程；已有任务在跑就不重复提交。"""
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return self._pending
+            _, covered = self.state()
+            if self.memory.turn_count() - self.keep_rounds - covered < self.batch:
+                return None
+            self._pending = self._executor.submit(self._update_safely)
+            return self._pending
+
+    def _update_safely(self):
+        try:
+            self.update()
+        except Exception as e:
+            print("⚠️ 记忆摘要更新失败（保留旧摘要，下轮再试）：", e)
+
+    def update(self):
+        """把 [covered, 总轮数 - keep_rounds) 这段增量折叠进摘要。"""
+        summary, covered = self.state()
+        target = self.memory.turn_count() - self.keep_rounds
+        while target - covered >= self.batch:
+            end = min(target, covered + self.batch * 4)  # 一次最多交给模型这么多轮
+            turns = "".join(self.memory.load_turn(k) for k in range(covered, end))
+            prompt = SUMMARY_PROMPT.format(
+                max_chars=self.max_chars,
+                summary=summary or "（暂无）",
+                turns=turns,
+            )
+            messages = [{"role": "user", "content": prompt}]
+            summary = self.limiter.run(
+                lambda: self.llm_client.invoke(messages), estimate_tokens(messages, self.max_chars * 2), BACKGROUND
+            ).content.strip()
+            covered = end
+            self.memory.save_summary(summary, covered)
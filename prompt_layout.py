@@ -0,0 +1,124 @@
+# =========================================
+# prompt_layout.py
+# 让网关的提示前缀缓存（prompt caching）命中：同一段对话里，每次请求开头那一大段逐字节不变
+#  - 开头（稳定）：人设 / 系统提示 → 摘要 → 更早的历史；新内容只往后追加
+#  - 结尾（每次都变）：当前时间、联网搜索资料、相关旧记忆，合成一条 system 放在这次的问题前面
+#  - 时间只精确到 PROMPT_TIME_GRANULARITY_MIN 分钟（默认 15），不会每秒都不一样
+#  - 从响应的 usage 里读出命中缓存的 token 数，PROMPT_CACHE.stats() 看命中率、命中 / 没命中时的耗时
+# =========================================
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+
+WEEKDAYS = "一二三四五六日"
+
+
+def time_hint(now: datetime.datetime | None = None, granularity_min: int | None = None) -> str:
+    """“当前本机本地时间”提示；分钟按 granularity_min 向下取整（>= 1440 就只给日期）。"""
+    now = now or datetime.datetime.now()
+    step = granularity_min or int(os.getenv("PROMPT_TIME_GRANULARITY_MIN", "15"))
+    if step >= 1440:
+        stamp = now.strftime("%Y-%m-%d")
+    else:
+        minutes = now.hour * 60 + now.minute
+        minutes -= minutes % step
+        stamp = f"{now:%Y-%m-%d} {minutes // 60:02d}:{minutes % 60:02d}"
+    return (
+        f"当前本机本地时间：{stamp}（精确到 {step} 分钟），星期{WEEKDAYS[now.weekday()]}。"
+        "当用户询问日期、星期或‘今天几号’等时，请基于此时间直接回答。"
+    )
+
+
+def split_turn(messages: list[dict]) -> tuple[list[dict], list[dict]]:
+    """拆成 (稳定前缀, 本轮)：本轮 = 最后一条 user 消息及其后面的。"""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].get("role") == "user":
+            return messages[:i], messages[i:]
+    return messages, []
+
+
+def layout_messages(prefix: list[dict], volatile: list[str], turn: list[dict]) -> list[dict]:
+    """稳定前缀 + 一条合并的易变 system（空的部分跳过）+ 本轮消息。"""
+    parts = [text for text in volatile if text]
+    tail = [{"role": "system", "content": "\n\n".join(parts)}] if parts else []
+    return prefix + tail + turn
+
+
+def prefix_fingerprint(prefix: list[dict]) -> str:
+    """稳定前缀的指纹：同一段对话里相邻两轮的指纹只在“追加了历史”时变化，排查缓存没命中时看它。"""
+    raw = json.dumps(prefix, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:10]
+
+
+def cached_tokens(usage: dict | None) -> int | None:
+    """
+    命中缓存的输入 token 数；网关没报就是 None。认这几种写法：
+    OpenAI 的 prompt_tokens_details.cached_tokens、DeepSeek 的 prompt_cache_hit_tokens、
+    langchain usage_metadata 的 input_token_details.cache_read。
+    """
+    if not usage:
+        return None
+    details = usage.get("prompt_tokens_details") or {}
+    if "cached_tokens" in details:
+        return details["cached_tokens"] or 0
+    if "prompt_cache_hit_tokens" in usage:
+        return usage["prompt_cache_hit_tokens"] or 0
+    details = usage.get("input_token_details") or {}
+    if "cache_read" in details:
+        return details["cache_read"] or 0
+    return None
+
+
+def prompt_tokens(usage: dict | None) -> int | None:
+    if not usage:
+        return None
+    return usage.get("prompt_tokens", usage.get("input_tokens"))
+
+
+class PromptCacheStats:
+    """记每次请求的 输入 token / 命中缓存的 token / 耗时（流式记首字耗时），算命中率。"""
+
+    def __init__(self, maxlen: int = 1000):
+        self._lock = threading.Lock()
+        self._samples: deque[tuple[int, int, int | None]] = deque(maxlen=maxlen)
+        self.unreported = 0  # 响应里没有缓存信息的次数（网关不支持，或流式没开 include_usage）
+
+    def record(self, usage: dict | None, ms: int | None = None) -> dict:
+        """记一次；返回 {"prompt_tokens", "cached_tokens"}，调用方直接并进 trace（没报就是空 dict）。"""
+        total, cached = prompt_tokens(usage), cached_tokens(usage)
+        with self._lock:
+            if total is None or cached is None:
+                self.unreported += 1
+                return {}
+            self._samples.append((total, cached, ms))
+        return {"prompt_tokens": total, "cached_tokens": cached}
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+            unreported = self.unreported
+        total = sum(t for t, _, _ in samples)
+        cached = sum(c for _, c, _ in samples)
+
+        def mean_ms(hit: bool) -> int | None:
+            ms = [m for _, c, m in samples if (c > 0) == hit and m is not None]
+            return int(sum(ms) / len(ms)) if ms else None
+
+        return {
+            "requests": len(samples),
+            "hit_requests": sum(c > 0 for _, c, _ in samples),
+            "prompt_tokens": total,
+            "cached_tokens": cached,
+            "hit_rate": round(cached / total, 3) if total else 0.0,
+            "hit_ms": mean_ms(True),
+            "miss_ms": mean_ms(False),
+            "unreported": unreported,
+        }
+
+
+# 进程里共用一份：AgentAdapter、ProductAgent 都记到这里
+PROMPT_CACHE = PromptCacheStats()
@@ -0,0 +1,299 @@
+# =========================================
+# rate_limiter.py
+# 调大模型之前先排队：整个进程共用一个限速器（Streamlit 的所有会话、后台摘要、批处理都走它）
+#  - 两个令牌桶：每分钟请求数（RPM）、每分钟 token 数（TPM）；都有富余才放行
+#  - 排队按优先级：聊天（INTERACTIVE）> 批处理（BATCH）> 后台摘要（BACKGROUND），同级先来先走；
+#    队伍有上限，满了直接拒绝，不让请求无限堆着
+#  - 网关回 429 时看 Retry-After：这段时间里所有人都先别发（不然大家一起撞墙）
+#  - 每个请求排队等了多久都记下来（按优先级分开统计），stats() 看 p50 / p95
+# 环境变量：LLM_RPM、LLM_TPM（不设 = 不限）、LLM_QUEUE_MAX（默认 256）
+# =========================================
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from llm_resilience import retry_after_of, status_of
+from text_utils import count_tokens
+
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+DEFAULT_COMPLETION_TOKENS = 512  # 估算时给回答预留的 token
+
+
+class RateLimitRejected(RuntimeError):
+    """队伍满了，或者排队超过了 timeout：请求没有发出去。"""
+
+
+def estimate_tokens(messages: list[dict], completion: int = DEFAULT_COMPLETION_TOKENS) -> int:
+    """请求大概要用多少 token（提示 + 预留的回答）；真实用量回来后用 adjust() 多退少补。"""
+    return sum(count_tokens(m.get("content") or "") + 4 for m in messages) + completion
+
+
+def usage_tokens(result: Any) -> int | None:
+    """从响应里找真实 token 用量：原始 HTTP 响应（usage.total_tokens）或 langchain 消息（usage_metadata）。"""
+    meta = getattr(result, "usage_metadata", None)
+    if meta:
+        return meta.get("total_tokens")
+    if status_of(result) == 200 and hasattr(result, "json"):
+        try:
+            return (result.json().get("usage") or {}).get("total_tokens")
+        except Exception:
+            return None
+    return None
+
+
+class TokenBucket:
+    """per_minute <= 0 表示不限。桶最多攒 burst 个；一次要的比 burst 还多时，等桶满了放行并“欠账”。"""
+
+    def __init__(self, per_minute: float, burst: float | None = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(n, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, n: float):
+        if self.rate > 0:
+            self.level -= n
+
+    def refund(self, n: float):
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level + n)
+
+
+@dataclass
+class Grant:
+    tokens: int
+    priority: int
+    waited_s: float
+
+
+class _Ticket:
+    __slots__ = ("tokens",)
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+
+
+class RateLimiter:
+    """
+    limiter = RateLimiter(rpm=60, tpm=90000)
+    grant = limiter.acquire(tokens=1500, priority=INTERACTIVE)   # 阻塞到轮到自己
+    resp = limiter.run(lambda: post_json(...), tokens=1500)         # 排队 + 发请求 + 看 429 / 用量，一步到位
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_queue: int = 256, burst_s: float = 10.0):
+        # 桶只攒 burst_s 秒的量：一分钟的额度不会在第一秒就被一波请求用光
+        self.requests = TokenBucket(rpm, max(1.0, rpm * burst_s / 60))
+        self.tokens = TokenBucket(tpm, tpm * burst_s / 60)
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._heap: list[tuple[int, int, _Ticket]] = []
+        self._seq = itertools.count()
+        self._blocked_until = 0.0
+        self._waits = {p: deque(maxlen=1000) for p in PRIORITY_NAMES}
+        self.counters = {"granted": 0, "rejected": 0, "throttled": 0}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            rpm=float(os.getenv("LLM_RPM", "0")),
+            tpm=float(os.getenv("LLM_TPM", "0")),
+            max_queue=int(os.getenv("LLM_QUEUE_MAX", "256")),
+        )
+
+    # ===== 排队 =====
+    def _enqueue(self, tokens: int, priority: int) -> _Ticket:
+        with self._cond:
+            if len(self._heap) >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise RateLimitRejected(f"排队的请求太多（{len(self._heap)} 个），稍后再试")
+            ticket = _Ticket(tokens)
+            heapq.heappush(self._heap, (priority, next(self._seq), ticket))
+            return ticket
+
+    def _try_grant(self, ticket: _Ticket) -> float | None:
+        """调用时已持有锁。0 = 放行（已出队、已扣额度）；>0 = 排在最前但还要等这么久；None = 前面还有人。"""
+        if self._heap[0][2] is not ticket:
+            return None
+        now = time.monotonic()
+        wait = max(
+            self._blocked_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(ticket.tokens, now),
+        )
+        if wait > 0:
+            return wait
+        heapq.heappop(self._heap)
+        self.requests.take(1)
+        self.tokens.take(ticket.tokens)
+        self.counters["granted"] += 1
+        self._cond.notify_all()  # 下一个人变成队首了
+        return 0.0
+
+    def _leave(self, ticket: _Ticket):
+        """超时 / 被取消：从队伍里拿掉。"""
+        with self._cond:
+            self._heap = [entry for entry in self._heap if entry[2] is not ticket]
+            heapq.heapify(self._heap)
+            self.counters["rejected"] += 1
+            self._cond.notify_all()
+
+    def _granted(self, ticket: _Ticket, priority: int, t0: float) -> Grant:
+        waited = time.monotonic() - t0
+        with self._cond:
+            self._waits[priority].append(waited)
+        return Grant(ticket.tokens, priority, waited)
+
+    def acquire(self, tokens: int = 0, priority: int = INTERACTIVE, timeout: float | None = None) -> Grant:
+        t0 = time.monotonic()
+        ticket = self._enqueue(tokens, priority)
+        try:
+            with self._cond:
+                while True:
+                    wait = self._try_grant(ticket)
+                    if wait == 0:
+                        break
+                    remaining = None if timeout is None else timeout - (time.monotonic() - t0)
+                    if remaining is not None and remaining <= 0:
+                        raise RateLimitRejected(f"排队超过 {timeout} 秒")
+                    # 队首按需要的时间睡；后面的人等队首走了被叫醒（最多睡 1 秒再看一眼）
+                    self._cond.wait(min(x for x in (wait or 1.0, remaining) if x is not None))
+        except BaseException:
+            # 超时、Ctrl+C 等：把自己从队伍里拿掉，不然后面的人永远排在这张票后面
+            self._leave(ticket)
+            raise
+        return self._granted(ticket, priority, t0)
+
+    async def aacquire(self, tokens: int = 0, priority: int = INTERACTIVE, timeout: float | None = None) -> Grant:
+        """异步版：不占线程，轮询着等（最多 50 ms 看一次）。"""
+        t0 = time.monotonic()
+        ticket = self._enqueue(tokens, priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_grant(ticket)
+                if wait == 0:
+                    break
+                if timeout is not None and time.monotonic() - t0 >= timeout:
+                    raise RateLimitRejected(f"排队超过 {timeout} 秒")
+                await asyncio.sleep(min(wait or 0.02, 0.05))
+        except BaseException:
+            self._leave(ticket)
+            raise
+        return self._granted(ticket, priority, t0)
+
+    # ===== 请求回来以后 =====
+    def pause(self, seconds: float):
+        """网关说“太快了”：接下来 seconds 秒谁都不放行。"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self.counters["throttled"] += 1
+
+    def adjust(self, grant: Grant, actual_tokens: int | None):
+        """按真实用量多退少补。"""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            diff = actual_tokens - grant.tokens
+            if diff > 0:
+                self.tokens.take(diff)
+            else:
+                self.tokens.refund(-diff)
+
+    def observe(self, result: Any, grant: Grant | None = None):
+        """看一眼响应（或异常）：429 就按 Retry-After 暂停（没给就歇 1 秒）；给了 grant 再按真实用量结算。"""
+        if status_of(result) == 429:
+            self.pause(retry_after_of(result) or 1.0)
+        elif grant is not None:
+            self.adjust(grant, usage_tokens(result))
+
+    def run(
+        self,
+        send: Callable[[], Any],
+        tokens: int = 0,
+        priority: int = INTERACTIVE,
+        info: dict | None = None,
+        track_usage: bool = True,
+    ) -> Any:
+        """
+        排队 → send() → 看结果。info 里累加 queue_ms（重试、对冲每次都要排队）。
+        track_usage=False：别去读响应体找用量（流式响应读了就没了）。
+        """
+        grant = self.acquire(tokens, priority)
+        if info is not None:
+            info["queue_ms"] = info.get("queue_ms", 0) + int(grant.waited_s * 1000)
+        try:
+            result = send()
+        except Exception as e:
+            self.observe(e)
+            raise
+        self.observe(result, grant if track_usage else None)
+        return result
+
+    async def arun(
+        self,
+        send: Callable[[], Awaitable[Any]],
+        tokens: int = 0,
+        priority: int = INTERACTIVE,
+        info: dict | None = None,
+    ) -> Any:
+        grant = await self.aacquire(tokens, priority)
+        if info is not None:
+            info["queue_ms"] = info.get("queue_ms", 0) + int(grant.waited_s * 1000)
+        try:
+            result = await send()
+        except Exception as e:
+            self.observe(e)
+            raise
+        self.observe(result, grant)
+        return result
+
+    # ===== 指标 =====
+    def stats(self) -> dict:
+        with self._cond:
+            waits = {p: sorted(samples) for p, samples in self._waits.items()}
+            stats = {
+                **self.counters,
+                "queued": len(self._heap),
+                "paused_s": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            }
+        for p, samples in waits.items():
+            if samples:
+                stats[f"{PRIORITY_NAMES[p]}_wait_ms"] = {
+                    "p50": int(samples[len(samples) // 2] * 1000),
+                    "p95": int(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000),
+                    "max": int(samples[-1] * 1000),
+                    "n": len(samples),
+                }
+        return stats
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    """进程里共用的那一个（按环境变量配置）。"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter.from_env()
+        return _limiter
@@ -0,0 +1,162 @@
+# =========================================
+# search_rank.py
+# 搜索资料注入前先筛一遍：只把和问题最相关、互不重复的段落塞进固定的 token 预算
+#  ① 候选段落：每条结果的摘要 + 深度搜索抓到的正文块
+#  ② BM25 打分（内存里临时建一个小倒排索引，词项用 text_utils.split_terms）
+#  ③ 分数远低于最高分的段落不要；去近似重复：字符 3-gram（shingle）的 Jaccard 相似度超过阈值就不要
+#  ④ 按分数从高到低装进 token 预算，最后按原来的结果顺序输出
+# =========================================
+
+import math
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from text_utils import count_tokens, split_terms, truncate_to_tokens
+
+
+@dataclass
+class Passage:
+    source: int  # 第几条搜索结果
+    order: int  # 在这条结果里的位置（0 = 摘要，1.. = 正文块）
+    text: str
+    score: float = 0.0
+
+
+def _term_weight(term: str) -> float:
+    """中文单字（“我”“有”“天”）几乎不带意思，权重压低；相邻两字、英文单词照常算。"""
+    return 0.3 if len(term) == 1 and term >= "\u2e80" else 1.0
+
+
+class BM25:
+    """最朴素的 BM25：倒排表 词项 -> {段落号: 词频}。"""
+
+    def __init__(self, docs: list[list[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.lengths = [len(terms) for terms in docs]
+        self.avg_len = sum(self.lengths) / len(docs) if docs else 0.0
+        self.postings: dict[str, dict[int, int]] = defaultdict(dict)
+        for i, terms in enumerate(docs):
+            for term, tf in Counter(terms).items():
+                self.postings[term][i] = tf
+        n = len(docs)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def scores(self, query_terms: list[str]) -> list[float]:
+        scores = [0.0] * len(self.lengths)
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term] * _term_weight(term)
+            for i, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_len or 1))
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+def shingles(text: str, n: int = 3) -> set[str]:
+    compact = "".join(text.lower().split())
+    if len(compact) <= n:
+        return {compact} if compact else set()
+    return {compact[i:i + n] for i in range(len(compact) - n + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def collect_passages(items: list[dict], excerpts: dict[str, list[str]] | None = None) -> list[Passage]:
+    passages = []
+    for i, r in enumerate(items):
+        if r.get("body"):
+            passages.append(Passage(i, 0, r["body"]))
+        for j, chunk in enumerate((excerpts or {}).get(r["href"], []), start=1):
+            passages.append(Passage(i, j, chunk))
+    return passages
+
+
+def pack_passages(
+    query: str,
+    passages: list[Passage],
+    budget_tokens: int,
+    dup_threshold: float = 0.6,
+    min_rel_score: float = 0.25,
+    titles: list[str] | None = None,
+) -> tuple[list[Passage], dict]:
+    """
+    按 BM25 分数挑段落装进预算；titles[i] 是第 i 条结果第一次被选中时要额外占的开销（标题 + 网址）。
+    分数不到最高分 min_rel_score 倍的段落算无关（只沾了“有”“天”这类常见单字）。
+    """
+    tokens_before = sum(count_tokens(p.text) for p in passages) + sum(count_tokens(t) for t in titles or [])
+    index = BM25([split_terms(p.text) for p in passages])
+    for p, score in zip(passages, index.scores(split_terms(query))):
+        p.score = score
+
+    chosen: list[Passage] = []
+    chosen_shingles: list[set] = []
+    used_sources: set[int] = set()
+    used, dropped_dup, dropped_irrelevant = 0, 0, 0
+    best = max((p.score for p in passages), default=0.0)
+    # 分数一样时摘要优先、排名靠前的结果优先
+    for p in sorted(passages, key=lambda p: (-p.score, p.source, p.order)):
+        if best > 0 and p.score < best * min_rel_score:  # 全都不沾边时 best = 0，就按原顺序装
+            dropped_irrelevant += 1
+            continue
+        sh = shingles(p.text)
+        if any(jaccard(sh, other) >= dup_threshold for other in chosen_shingles):
+            dropped_dup += 1
+            continue
+        overhead = 0 if p.source in used_sources or not titles else count_tokens(titles[p.source])
+        cost = count_tokens(p.text) + overhead
+        if used + cost > budget_tokens:
+            room = budget_tokens - used - overhead
+            if room < 60 or chosen:  # 剩的地方太小，或者已经有内容了：不硬塞半段
+                continue
+            p.text = truncate_to_tokens(p.text, room)  # 第一段就放不下：截短也要给模型一点资料
+            cost = count_tokens(p.text) + overhead
+        chosen.append(p)
+        chosen_shingles.append(sh)
+        used_sources.add(p.source)
+        used += cost
+
+    stats = {
+        "candidates": len(passages),
+        "kept": len(chosen),
+        "dup": dropped_dup,
+        "irrelevant": dropped_irrelevant,
+        "tokens_before": tokens_before,
+        "tokens_after": used,
+    }
+    return sorted(chosen, key=lambda p: (p.source, p.order)), stats
+
+
+def compress_results(
+    query: str,
+    items: list[dict],
+    excerpts: dict[str, list[str]] | None = None,
+    budget_tokens: int = 1200,
+) -> tuple[list[dict], dict[str, list[str]], dict]:
+    """
+    返回 (筛过的结果, 筛过的正文块, 统计)：可以直接交给 search_tools.format_results。
+    一条段落都没选中的结果整条去掉；摘要没选中时该条的摘要置空。
+    """
+    t0 = time.perf_counter()
+    passages = collect_passages(items, excerpts)
+    titles = [f"{r['title']} {r['href']}" for r in items]
+    chosen, stats = pack_passages(query, passages, budget_tokens, titles=titles)
+
+    kept_items, kept_excerpts = [], {}
+    for i, r in enumerate(items):
+        mine = [p for p in chosen if p.source == i]
+        if not mine:
+            continue
+        body = next((p.text for p in mine if p.order == 0), "")
+        kept_items.append({**r, "body": body})
+        chunks = [p.text for p in mine if p.order > 0]
+        if chunks:
+            kept_excerpts[r["href"]] = chunks
+    stats["ms"] = int((time.perf_counter() - t0) * 1000)
+    return kept_items, kept_excerpts, stats
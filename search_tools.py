@@ -0,0 +1,218 @@
+# =========================================
+# search_tools.py
+# 联网搜索（DuckDuckGo）：几个查询变体 / 几个来源并行搜，共用一个截止时间
+#  - 够条数了就提前收工，到截止时间还没回来的不等了（后台线程自己跑完丢掉）
+#  - 每个子任务的耗时 / 条数 / 状态都记下来，放进工具调用记录
+#  - 结果缓存：按 (来源, 规范化后的查询, 条数) 存，带 TTL；同样的搜索同时只发一次（single-flight）
+#  - DDGS 客户端每个线程一个，长期复用（不再每次新建会话）
+# 环境变量：SEARCH_DEADLINE_S（默认 3 秒）、SEARCH_CACHE_TTL_S（默认 600 秒，0 = 不缓存）、
+#          SEARCH_CACHE_SIZE（默认 512 条）、SEARCH_CACHE_DB（设了就同时存到这个 SQLite 文件）
+# =========================================
+
+import datetime
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ttl_cache import SingleFlight, TieredCache, canonical_key
+
+# 搜索是 IO 等待为主，线程池常驻，免得每次现开线程
+SEARCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
+# 口语里的客气话 / 语气词，去掉后搜索引擎更容易命中
+_FILLER = re.compile(r"^(请问|麻烦|帮我|给我|你知道|告诉我)+|(查一下|搜一下|看一下|是什么|吗|呢|呀|啊)+[？?。!！]*$")
+
+
+def default_deadline() -> float:
+    return float(os.getenv("SEARCH_DEADLINE_S", "3"))
+
+
+def query_variants(query: str, limit: int = 2) -> list[str]:
+    """原句 + 去掉客气话的精简版（和原句一样就不重复搜）。"""
+    query = query.strip()
+    variants = [query] if query else []
+    short = _FILLER.sub("", query).strip()
+    if short and short not in variants:
+        variants.append(short)
+    return variants[:limit]
+
+
+def normalize_query(query: str) -> str:
+    """缓存用：全角转半角、大小写统一、多个空白并成一个。"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+# ===== 长期复用的 DDGS 客户端（每个线程一个，出错就换新的） =====
+_local = threading.local()
+
+
+def _ddgs():
+    client = getattr(_local, "ddgs", None)
+    if client is None:
+        from duckduckgo_search import DDGS  # 第一次搜索时才导入，不开联网搜索就不用加载
+
+        client = _local.ddgs = DDGS()
+    return client
+
+
+def _with_client(call):
+    try:
+        return call(_ddgs())
+    except Exception:
+        _local.ddgs = None  # 连接可能坏了（被限流 / 断开），下次重建
+        raise
+
+
+def _ddg_text(query: str, max_results: int) -> list[dict]:
+    return [
+        {"title": r.get("title", "").strip(), "href": r.get("href", "").strip(), "body": r.get("body", "").strip()}
+        for r in _with_client(lambda ddgs: ddgs.text(query, max_results=max_results))
+    ]
+
+
+def _ddg_news(query: str, max_results: int) -> list[dict]:
+    return [
+        {"title": r.get("title", "").strip(), "href": r.get("url", "").strip(), "body": r.get("body", "").strip()}
+        for r in _with_client(lambda ddgs: ddgs.news(query, max_results=max_results))
+    ]
+
+
+SOURCES = {"text": _ddg_text, "news": _ddg_news}
+
+
+# ===== 结果缓存 + single-flight =====
+_cache_lock = threading.Lock()
+_cache: TieredCache | None = None
+_flight = SingleFlight()
+
+
+def get_search_cache() -> TieredCache | None:
+    """进程级的搜索缓存（第一次用时按环境变量建）；SEARCH_CACHE_TTL_S=0 时返回 None。"""
+    global _cache
+    ttl = float(os.getenv("SEARCH_CACHE_TTL_S", "600"))
+    if ttl <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TieredCache(
+                maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+                ttl=ttl,
+                db_path=os.getenv("SEARCH_CACHE_DB") or None,
+                table="search_results",
+            )
+        return _cache
+
+
+def cached_search(source: str, query: str, max_results: int) -> tuple[list[dict], bool]:
+    """带缓存地搜一次，返回 (结果, 是否命中缓存)；失败不缓存，异常照常抛。"""
+    cache = get_search_cache()
+    key = canonical_key(source, normalize_query(query), max_results)
+    if cache is not None:
+        items = cache.get(key)
+        if items is not None:
+            return items, True
+
+    def fetch():
+        items = SOURCES[source](query, max_results)
+        if cache is not None:
+            cache.set(key, items)
+        return items
+
+    # 同样的搜索正在进行（别的会话 / 别的线程）就等它，不重复打 DuckDuckGo
+    return _flight.do(key, fetch), False
+
+
+def _timed(source: str, query: str, max_results: int):
+    t0 = time.perf_counter()
+    items, hit = cached_search(source, query, max_results)
+    return items, int((time.perf_counter() - t0) * 1000), hit
+
+
+def gather_results(
+    query: str,
+    max_results: int = 5,
+    deadline_s: float | None = None,
+    sources: tuple[str, ...] = ("text",),
+    variants: int = 2,
+) -> tuple[list[dict], list[dict]]:
+    """
+    并行搜 (查询变体 × 来源)，返回 (按 href 去重后的结果, 每个子任务的记录)。
+    结果按任务优先级排（原句 + 第一个来源最靠前），不按谁先回来排，保证同样的输入顺序稳定。
+    """
+    deadline_s = default_deadline() if deadline_s is None else deadline_s
+    start = time.perf_counter()
+    tasks = [(q, src) for q in query_variants(query, variants) for src in sources if src in SOURCES]
+    futures = {SEARCH_POOL.submit(_timed, src, q, max_results): i for i, (q, src) in enumerate(tasks)}
+
+    done_items: dict[int, list[dict]] = {}
+    trace = [{"stage": "search", "source": src, "query": q, "status": "pending"} for q, src in tasks]
+    pending = set(futures)
+    timed_out = False
+    while pending:
+        remaining = deadline_s - (time.perf_counter() - start)
+        if remaining <= 0:
+            timed_out = True
+            break
+        finished, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for fut in finished:
+            i = futures[fut]
+            try:
+                items, ms, hit = fut.result()
+                done_items[i] = items
+                trace[i].update(status="cache" if hit else "ok", ms=ms, n=len(items))
+            except Exception as e:
+                trace[i].update(status="error", error=str(e))
+        # ① 原句的第一个来源还没回来就先等着（它通常最相关）；② 其他的够条数就不等了
+        if 0 in done_items or (tasks and trace[0]["status"] == "error"):
+            if len({r["href"] for items in done_items.values() for r in items}) >= max_results:
+                break
+    for fut in pending:
+        fut.cancel()  # 还没开始跑的直接取消；已经在跑的让它跑完，结果不要了
+        trace[futures[fut]]["status"] = "timeout" if timed_out else "skipped"
+
+    merged, seen = [], set()
+    for i in sorted(done_items):
+        for r in done_items[i]:
+            if r["href"] not in seen:
+                seen.add(r["href"])
+                merged.append(r)
+    return merged[:max_results], trace
+
+
+def format_results(
+    query: str,
+    items: list[dict],
+    errors: list[str] | None = None,
+    excerpts: dict[str, list[str]] | None = None,
+) -> str:
+    """拼成喂给大模型的精简文本（和原来 web_search 的格式一样）；excerpts 是深度搜索抓到的 {网址: 正文块}。"""
+    lines = []
+    for i, r in enumerate(items):
+        line = f"{i + 1}. {r['title']}\nURL: {r['href']}"
+        if r["body"]:  # 筛选后摘要可能被去掉，只剩正文节选
+            line += f"\n摘要: {r['body']}"
+        chunks = (excerpts or {}).get(r["href"])
+        if chunks:
+            line += "\n正文节选: " + "\n…\n".join(chunks)
+        lines.append(line)
+    if not lines:
+        lines = [f"（搜索失败：{e}）" for e in errors or []]
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    joined = "\n\n".join(lines) if lines else "（没有搜索结果）"
+    return f"【联网搜索·{ts}】\n查询：{query}\n\n{joined}"
+
+
+def web_search(query: str, max_results: int = 5) -> str:
+    """
+    用 DuckDuckGo 搜索，返回合并后的精简文本，方便喂给大模型。
+    """
+    if not query.strip():
+        return ""
+    try:
+        items, errors = cached_search("text", query, max_results)[0], []
+    except Exception as e:
+        items, errors = [], [str(e)]
+    return format_results(query, items, errors)
@@ -0,0 +1,233 @@
+# =========================================
+# session_store.py
+# 多会话记忆仓库：SQLite（WAL 模式），按 session_id 存每一条消息
+#  - 给 RunnableWithMessageHistory 当 get_history 用：store.history(session_id)
+#  - 给 ProductAgent 当记忆用：store.memory(session_id)
+#  - 取某个会话的最近 N 轮走 (session_id, turn_no) 索引，几千个会话放一个库也不慢
+# =========================================
+
+import datetime
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+try:
+    from langchain_core.chat_history import BaseChatMessageHistory
+except ImportError:  # 只给 ProductAgent 用文本记忆时不需要 LangChain
+    BaseChatMessageHistory = object
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT    NOT NULL,
+    seq        INTEGER NOT NULL,  -- 会话内第几条消息
+    turn_no    INTEGER NOT NULL,  -- 会话内第几轮（用户说一句开始新的一轮）
+    role       TEXT    NOT NULL,  -- human / ai / system
+    content    TEXT    NOT NULL,
+    ts         TEXT    NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_messages_turn ON messages(session_id, turn_no);
+CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages(session_id, ts);
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    summary    TEXT    NOT NULL,
+    covered    INTEGER NOT NULL,  -- 已折叠进摘要的轮数
+    updated    TEXT    NOT NULL
+);
+"""
+
+ROLE_LABELS = {"human": "奶奶", "ai": "助手"}
+
+
+def _now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class SessionStore:
+    def __init__(self, db_path: str = "./memory/sessions.db"):
+        self.path = Path(db_path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()  # sqlite 连接不能跨线程，每个线程各开一个
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")    # 读写互不阻塞
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下足够安全，写入快很多
+            self._local.conn = conn
+        return conn
+
+    # ---------- 写 ----------
+    def add_messages(self, session_id: str, messages: list[tuple[str, str]]):
+        """追加若干条 (role, content)；role 为 human 时开启新的一轮。"""
+        if not messages:
+            return
+        conn = self._conn()
+        ts = _now()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")  # 先拿写锁，多进程同时写也不会撞 seq
+            row = conn.execute(
+                "SELECT seq, turn_no FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+            seq, turn_no = row if row else (0, 0)
+            rows = []
+            for role, content in messages:
+                seq += 1
+                if role == "human" or turn_no == 0:
+                    turn_no += 1
+                rows.append((session_id, seq, turn_no, role, content, ts))
+            conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def clear(self, session_id: str):
+        """删掉这个会话的消息和滚动摘要（同一个事务），清空后从头开始。"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+
+    # ---------- 读 ----------
+    def turn_count(self, session_id: str) -> int:
+        row = self._conn().execute(
+            "SELECT MAX(turn_no) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def last_turns(self, session_id: str, n: int | None = None) -> list[tuple[int, str, str, str]]:
+        """最近 n 轮的 (turn_no, role, content, ts)，按先后顺序；n 为 None 时取全部。"""
+        conn = self._conn()
+        if n is None:
+            return conn.execute(
+                "SELECT turn_no, role, content, ts FROM messages WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+        return conn.execute(
+            "SELECT turn_no, role, content, ts FROM messages "
+            "WHERE session_id = ? AND turn_no > "
+            "(SELECT COALESCE(MAX(turn_no), 0) FROM messages WHERE session_id = ?) - ? "
+            "ORDER BY turn_no, seq",  # 和 idx_messages_turn 同序，只扫最后 n 轮
+            (session_id, session_id, n),
+        ).fetchall()
+
+    def turn(self, session_id: str, turn_no: int) -> list[tuple[int, str, str, str]]:
+        return self._conn().execute(
+            "SELECT turn_no, role, content, ts FROM messages WHERE session_id = ? AND turn_no = ? ORDER BY seq",
+            (session_id, turn_no),
+        ).fetchall()
+
+    def load_summary(self, session_id: str) -> tuple[str, int]:
+        row = self._conn().execute(
+            "SELECT summary, covered FROM summaries WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return tuple(row) if row else ("", -1)
+
+    def save_summary(self, session_id: str, summary: str, covered: int):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                (session_id, summary, covered, _now()),
+            )
+
+    def sessions(self) -> list[str]:
+        return [r[0] for r in self._conn().execute("SELECT DISTINCT session_id FROM messages")]
+
+    # ---------- 两种用法 ----------
+    def history(self, session_id: str, max_turns: int | None = None) -> "SessionChatHistory":
+        return SessionChatHistory(self, session_id, max_turns)
+
+    def memory(self, session_id: str, max_rounds: int = 20) -> "SessionMemory":
+        return SessionMemory(self, session_id, max_rounds)
+
+
+class SessionChatHistory(BaseChatMessageHistory):
+    """RunnableWithMessageHistory 的 get_history 返回它即可（只取最近 max_turns 轮）。"""
+
+    def __init__(self, store: SessionStore, session_id: str, max_turns: int | None = None):
+        self.store = store
+        self.session_id = session_id
+        self.max_turns = max_turns
+
+    @property
+    def messages(self):
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+        kinds = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+        return [
+            kinds.get(role, AIMessage)(content=content)
+            for _, role, content, _ in self.store.last_turns(self.session_id, self.max_turns)
+        ]
+
+    def add_messages(self, messages) -> None:
+        self.store.add_messages(self.session_id, [(m.type, m.content) for m in messages])
+
+    def add_message(self, message) -> None:
+        self.add_messages([message])
+
+    def add_user_message(self, message) -> None:
+        content = getattr(message, "content", message)
+        self.store.add_messages(self.session_id, [("human", content)])
+
+    def add_ai_message(self, message) -> None:
+        content = getattr(message, "content", message)
+        self.store.add_messages(self.session_id, [("ai", content)])
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
+
+
+class SessionMemory:
+    """和 SimpleFileMemory 同样的接口，给 ProductAgent 用；文本格式也一样。"""
+
+    def __init__(self, store: SessionStore, session_id: str, max_rounds: int = 20):
+        self.store = store
+        self.session_id = session_id
+        self.max_rounds = max_rounds
+        self.path = f"{store.path}#{session_id}"
+
+    @staticmethod
+    def _format(rows) -> str:
+        return "".join(f"[{ts}] {ROLE_LABELS.get(role, role)}：{content}\n" for _, role, content, ts in rows)
+
+    def turn_count(self) -> int:
+        return self.store.turn_count(self.session_id)
+
+    def load_turn(self, k: int) -> str:
+        n = self.turn_count()
+        if k < 0:
+            k += n
+        if not 0 <= k < n:
+            raise IndexError(f"第 {k} 轮不存在（共 {n} 轮）")
+        return self._format(self.store.turn(self.session_id, k + 1))
+
+    def load_last(self, n: int) -> str:
+        if n <= 0:
+            return ""
+        return self._format(self.store.last_turns(self.session_id, n))
+
+    def load_turns(self, n: int) -> list[str]:
+        if n <= 0:
+            return []
+        turns: dict[int, list] = {}
+        for row in self.store.last_turns(self.session_id, n):
+            turns.setdefault(row[0], []).append(row)
+        return [self._format(rows) for rows in turns.values()]
+
+    def load_history(self) -> str:
+        return self.load_last(self.max_rounds)
+
+    def sidecar_path(self, suffix: str) -> Path:
+        """按会话分开的派生文件（会话ID可能带任意字符，文件名里用它的哈希）。"""
+        key = hashlib.sha1(self.session_id.encode("utf-8")).hexdigest()[:12]
+        return self.store.path.with_name(f"{self.store.path.stem}.{key}{suffix}")
+
+    def load_summary(self) -> tuple[str, int]:
+        return self.store.load_summary(self.session_id)
+
+    def save_summary(self, summary: str, covered: int):
+        self.store.save_summary(self.session_id, summary, covered)
+
+    def save_turn(self, user: str, assistant: str):
+        self.store.add_messages(self.session_id, [("human", user), ("ai", assistant)])
@@ -41,17 +41,21 @@ import os
 API_KEY = os.getenv("ITEDUS_API_KEY")
 BASE_URL = os.getenv("ITEDUS_BASE_URL", "https://apis.itedus.cn/v1")
 
-# --- 安全检查：如果没有读取到密钥就立即报错 ---
-if not API_KEY:
-    raise RuntimeError("❌ 缺少 ITEDUS_API_KEY，请在 .env 或系统环境变量中设置。")
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from session_store import SessionChatHistory
 
-import requests
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
+
+# --- 安全检查：真正要调接口时才查密钥（只 import 本文件、或者还没配好 .env 时不报错） ---
+def require_api_key() -> str:
+    if not API_KEY:
+        raise RuntimeError("❌ 缺少 ITEDUS_API_KEY，请在 .env 或系统环境变量中设置。")
+    return API_KEY
+
+
+# LangChain 全家桶、requests、SQLite 记忆仓库都在各个方法里用到时才导入：
+# 光 import 它们就要好几秒，跑哪个方法就只付哪个方法的钱
 
 
 # =====================================================
@@ -60,9 +64,11 @@ from langchain_community.chat_message_histories import ChatMessageHistory
 # 请求-等待-回应三步走
 # =====================================================
 def call_by_requests():
+    from http_client import get_session
+
     URL = f"{BASE_URL}/chat/completions"
     headers = {
-        "Authorization": f"Bearer {API_KEY}",
+        "Authorization": f"Bearer {require_api_key()}",
         "Content-Type": "application/json",
     }
 
@@ -75,7 +81,8 @@ def call_by_requests():
 
     print("① 准备发请求（requests版）...")
     try:
-        resp = requests.post(URL, headers=headers, json=data, timeout=20)
+        # 用共享的连接池（http_client.py），多次调用时不用每次重新握手
+        resp = get_session().post(URL, headers=headers, json=data, timeout=20)
         print("② 状态码：", resp.status_code)
         print("③ GPT 回复：")
         print(resp.json()["choices"][0]["message"]["content"])
@@ -90,12 +97,14 @@ def call_by_requests():
 # 底层其实还是调用OpenAI接口，只是帮我们管理请求、记忆和多轮对话
 # =====================================================
 def call_by_langchain():
+    from langchain_openai import ChatOpenAI
+
     URL = f"{BASE_URL}/chat/completions"
 
     # LangChain 内部也会发请求，但它帮我们封装好了
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL  # 用你的代理接口
     )
 
@@ -109,12 +118,15 @@ def call_by_langchain():
 # 🧠 方法三：LangChain 封装 + PromptTemplate 模板化
 # =====================================================
 def call_by_langchain_prompt():
+    from langchain_openai import ChatOpenAI
+    from langchain_core.prompts import PromptTemplate
+
     URL = f"{BASE_URL}/chat/completions"
 
     # 1️⃣ 创建模型对象
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL
     )
 
@@ -142,25 +154,32 @@ def call_by_langchain_prompt():
 # =====================================================
 # 🧠 方法四：LangChain 封装 + PromptTemplate 模板化 + Memory记忆功能
 # =====================================================
-# 用一个简单的“内存仓库”来存每个对话的历史
-# 实际项目里会存到数据库，这里我们先存在内存里就行
-STORE = {}  # {session_id: ChatMessageHistory()}
+# 每个对话的历史存到 SQLite（memory/sessions.db），进程重启后还在
+# 之前是模块里的 STORE = {}，进程一退就没了，而且只增不减
+STORE = None  # 第一次用到时才打开数据库
+
 
+def get_history(session_id: str) -> "SessionChatHistory":
+    """根据会话ID拿到对应的历史（只带最近 20 轮给模型），没有就是空的。"""
+    global STORE
+    if STORE is None:
+        from session_store import SessionStore
 
-def get_history(session_id: str) -> ChatMessageHistory:
-    """根据会话ID拿到对应的历史，没有就新建一个。"""
-    if session_id not in STORE:
-        STORE[session_id] = ChatMessageHistory()
-    return STORE[session_id]
+        STORE = SessionStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory", "sessions.db"))
+    return STORE.history(session_id, max_turns=20)
 
 
 def call_with_memory():
+    from langchain_openai import ChatOpenAI
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import RunnableWithMessageHistory
+
     URL = f"{BASE_URL}/chat/completions"
 
     # 1️⃣ 模型
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL,
     )
 
@@ -223,7 +242,7 @@ def call_by_langchain_chains():
     # 1️⃣ 模型
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL,
     )
 
@@ -270,7 +289,7 @@ def call_by_langchain_chains_with_memory():
     # 1️⃣ 模型
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL,
     )
 
@@ -361,7 +380,6 @@ def call_by_langchain_chains_with_memory():
 #  # 思路：LLM 想 → 说要用哪个工具 → Python 真去调 → 再让 LLM 出最终答案
 # =====================================================
 def call_by_langchain_agent():
-    import datetime
     from langchain_openai import ChatOpenAI
     from langchain_core.prompts import ChatPromptTemplate
 
@@ -370,26 +388,14 @@ def call_by_langchain_agent():
     # 1️⃣ 模型
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL,
         temperature=0,   # 这里设 0 让它更听话
     )
 
-    # 2️⃣ 我们自己定义几个“工具”（其实就是普通的 Python 函数）
-    def tool_multiply(a: float, b: float) -> float:
-        """计算两个数字的乘积"""
-        return a * b
-
-    def tool_today() -> str:
-        """返回今天的日期 YYYY-MM-DD"""
-        return datetime.date.today().strftime("%Y-%m-%d")
-
-    def tool_praise(name: str) -> str:
-        """生成一段夸奶奶的话"""
-        return (
-            f"{name}真了不起，90岁还在学AI，还想做AI产品经理，"
-            "说明她的好奇心和学习力都比很多年轻人还强！"
-        )
+    # 2️⃣ 工具：统一在 tool_registry.py 里注册（其实就是普通的 Python 函数）
+    from tool_registry import REGISTRY
+    tools = REGISTRY.as_dict(["multiply", "today", "praise"])
 
     # 3️⃣ 给大模型一条“Agent 提示词”——告诉它有哪些工具可以用
     planner_prompt = ChatPromptTemplate.from_messages([
@@ -439,12 +445,8 @@ def call_by_langchain_agent():
 
     # 7️⃣ 真正调用工具
     tool_result = None
-    if tool_name == "multiply":
-        tool_result = tool_multiply(**tool_args)
-    elif tool_name == "today":
-        tool_result = tool_today()
-    elif tool_name == "praise":
-        tool_result = tool_praise(**tool_args)
+    if tool_name in tools:
+        tool_result = tools[tool_name].invoke(tool_args)
     else:
         tool_result = "（没有调用工具，可能是模型没按要求输出）"
 
@@ -482,11 +484,10 @@ def call_by_langchain_agent():
     # """
 # =====================================================
 def call_by_langchain_official_agent():
-    import datetime
     import json
     import re
     from langchain_openai import ChatOpenAI
-    from langchain_core.tools import tool
+    from tool_registry import REGISTRY
 
     URL = f"{BASE_URL}/chat/completions"
 
@@ -502,34 +503,13 @@ def call_by_langchain_official_agent():
 
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL,
         temperature=0,
     )
 
-    @tool
-    def multiply(a: float, b: float) -> float:
-        """计算两个数字的乘积"""
-        return a * b
-
-    @tool
-    def today() -> str:
-        """返回今天的日期 YYYY-MM-DD"""
-        return datetime.date.today().strftime("%Y-%m-%d")
-
-    @tool
-    def praise(name: str) -> str:
-        """生成一段夸奶奶的话"""
-        return (
-            f"{name}真了不起，90岁还在学AI，还想做AI产品经理，"
-            "说明她的好奇心和学习力都比很多年轻人还强！"
-        )
-
-    tools = {
-        "multiply": multiply,
-        "today": today,
-        "praise": praise,
-    }
+    # 工具统一在 tool_registry.py 里注册，这里按名字取出来（用法和 langchain 的 @tool 一样：.invoke(args)）
+    tools = REGISTRY.as_dict(["multiply", "today", "praise"])
 
     DECIDE_PROMPT = """你是一个会调用工具的智能体。你可以做多步推理。
 你目前已经知道的内容是：
@@ -642,11 +622,10 @@ def call_by_langchain_official_agent():
 # 在方式八的基础上加入对话记忆（同一个 session 会记上一轮说过的话）
 # =====================================================
 def call_by_langchain_agent_with_memory():
-    import datetime
     import json
     import re
     from langchain_openai import ChatOpenAI
-    from langchain_core.tools import tool
+    from tool_registry import REGISTRY
     from langchain_community.chat_message_histories import ChatMessageHistory
 
     URL = f"{BASE_URL}/chat/completions"
@@ -662,35 +641,13 @@ def call_by_langchain_agent_with_memory():
     # 2️⃣ 模型
     llm = ChatOpenAI(
         model="gpt-4o",
-        api_key=API_KEY,
+        api_key=require_api_key(),
         base_url=BASE_URL,
         temperature=0,
     )
 
-    # 3️⃣ 工具（沿用方式八的三个）
-    @tool
-    def multiply(a: float, b: float) -> float:
-        """计算两个数字的乘积"""
-        return a * b
-
-    @tool
-    def today() -> str:
-        """返回今天的日期 YYYY-MM-DD"""
-        return datetime.date.today().strftime("%Y-%m-%d")
-
-    @tool
-    def praise(name: str) -> str:
-        """生成一段夸奶奶的话"""
-        return (
-            f"{name}真了不起，90岁还在学AI，还想做AI产品经理，"
-            "说明她的好奇心和学习力都比很多年轻人还强！"
-        )
-
-    tools = {
-        "multiply": multiply,
-        "today": today,
-        "praise": praise,
-    }
+    # 3️⃣ 工具（沿用方式八的三个）：统一在 tool_registry.py 里注册，这里按名字取出来（用法和 langchain 的 @tool 一样：.invoke(args)）
+    tools = REGISTRY.as_dict(["multiply", "today", "praise"])
 
     # 4️⃣ 小工具：把 ```json ... ``` 剥成纯 JSON
     def extract_json(text: str) -> str:
@@ -845,6 +802,38 @@ def call_by_langchain_agent_with_memory():
 
 
 
+# =====================================================
+# 🧠 方式十：原生工具调用（function calling）Agent
+# 和方式八同样的三个工具、同样的请求，但走 OpenAI 的 tools / tool_calls 协议：
+# - 模型一次回复里可以同时要好几个工具，不用一步一步来
+# - 不需要工具时当轮直接回答，不用再单独调一次“整理最终回答”
+# - 不用再从自由文本里抠 JSON（extract_json）
+# 方式八这个请求要调 5 次模型，这里 2 次（见 benchmarks/bench_tool_agent.py）
+# =====================================================
+def call_by_tool_calling_agent():
+    from tool_agent import ToolCallingAgent
+    from tool_registry import REGISTRY
+
+    agent = ToolCallingAgent(
+        base_url=BASE_URL,
+        api_key=require_api_key(),
+        model="gpt-4o",
+        tools=REGISTRY.tools(["multiply", "today", "praise"]),
+        system_prompt="你是一个温柔的AI，跟奶奶说话口吻温柔、简短。",
+    )
+
+    user_query = (
+        "帮我查一下今天的日期，再算 12.5 * 8，最后夸夸叫“奶奶”的人，"
+        "她住在北京、在学AI、想去做AI产品经理，把这些都说进去。"
+    )
+    print("用户输入：", user_query)
+    result = agent.run(user_query)
+    for call in result.tool_calls:
+        print(f"[工具执行结果] {call['name']}({call['args']}) → {call['result']}")
+    print(f"\nAgent 最终回答（调用模型 {result.llm_calls} 次，{result.latency_ms} ms）：")
+    print(result.text)
+
+
 # =====================================================
 # 🚀 程序入口
 # =====================================================
@@ -876,4 +865,7 @@ if __name__ == "__main__":
     call_by_langchain_official_agent()
 
     print("\n=== 方式九：有记忆的多步 Agent ===")
-    call_by_langchain_agent_with_memory()
\ No newline at end of file
+    call_by_langchain_agent_with_memory()
+
+    print("\n=== 方式十：原生工具调用 Agent ===")
+    call_by_tool_calling_agent()
@@ -0,0 +1,67 @@
+# =========================================
+# text_utils.py
+# 文本小工具：token 计数 / 按 token 截断 / 切检索用的词项
+#  - 装了 tiktoken 就用本地编码器（只加载一次）；没装就按字符粗估
+#  - 同一段文本只数一次（记忆里的旧轮次每轮都会再算，缓存下来）
+# =========================================
+
+import functools
+import re
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name: str = "o200k_base"):
+    """gpt-4o 用 o200k_base；本地没有 tiktoken 时返回 None。"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def _is_cjk(ch: str) -> bool:
+    return ord(ch) >= 0x2E80
+
+
+@functools.lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    # 粗估：中日韩字符大约 1 个 token，其余大约 4 个字符 1 个 token
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = "…（后面省略）") -> str:
+    """保留开头，截到 max_tokens 以内（含省略标记）。"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(marker))
+    enc = _encoding()
+    if enc is not None:
+        return enc.decode(enc.encode(text, disallowed_special=())[:keep]) + marker
+    used, cut = 0, 0
+    for cut, ch in enumerate(text):
+        used += 4 if _is_cjk(ch) else 1  # 以 1/4 token 为单位累计
+        if used > keep * 4:
+            break
+    return text[:cut] + marker
+
+
+# 中文没有空格，检索时按“单字 + 相邻两字”切；英文/数字按单词切
+_TERM_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[\u2e80-\u9fff\uf900-\ufaff]+")
+
+
+def split_terms(text: str) -> list[str]:
+    terms: list[str] = []
+    for piece in _TERM_RE.findall(text.lower()):
+        if piece[0] < "\u2e80":
+            terms.append(piece)
+            continue
+        terms.extend(piece)
+        terms.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return terms
@@ -0,0 +1,205 @@
+# =========================================
+# tool_agent.py
+# 原生工具调用（function calling）的 Agent 引擎：用 OpenAI 兼容的 tools / tool_calls 协议
+#  - 一次回复里可以要好几个工具：互不依赖，放线程池里并发执行（async 工具各自跑一个事件循环），
+#    每个工具有自己的超时，结果按模型给的顺序交回去
+#  - 不需要工具时模型当轮直接回答，不再单独来一次“整理最终回答”
+#  - 方式八 / 方式九（先让模型吐 JSON 决策、再解析、最后再调一次）一个简单请求要 3~5 次调用，这里通常 1~2 次
+#  - 调模型和网页版一样走限速排队（rate_limiter.py）和容错重试（llm_resilience.py）
+# =========================================
+
+import asyncio
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from http_client import post_json
+from llm_resilience import ResilientCaller, for_endpoint
+from rate_limiter import INTERACTIVE, RateLimiter, estimate_tokens, get_limiter
+
+# 工具大多在等网络（搜索、抓网页），线程池常驻
+TOOL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+_JSON_TYPES = {float: "number", int: "integer", str: "string", bool: "boolean", list: "array", dict: "object"}
+
+
+@dataclass
+class Tool:
+    name: str
+    description: str
+    parameters: dict  # JSON Schema
+    fn: Callable[..., Any]
+    timeout: float | None = None  # 秒；None = 用 Agent 的默认值
+
+    def spec(self) -> dict:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+    def __call__(self, **kwargs):
+        if inspect.iscoroutinefunction(self.fn):
+            return asyncio.run(self.fn(**kwargs))  # 在工具线程里跑，没有正在运行的事件循环
+        return self.fn(**kwargs)
+
+    def invoke(self, args: dict | None = None):
+        """和 langchain 工具一样的调用方式：tool.invoke({"a": 1, "b": 2})。"""
+        return self(**(args or {}))
+
+
+def function_tool(
+    fn: Callable | None = None, *, name: str | None = None, description: str | None = None, timeout: float | None = None
+):
+    """
+    把普通函数变成 Tool：参数表从类型注解推出来，说明取 docstring 第一行。
+    用法和 langchain 的 @tool 差不多：@function_tool 或 @function_tool(name="xxx")。
+    """
+
+    def wrap(f: Callable) -> Tool:
+        properties, required = {}, []
+        for pname, param in inspect.signature(f).parameters.items():
+            properties[pname] = {"type": _JSON_TYPES.get(param.annotation, "string")}
+            if param.default is inspect.Parameter.empty:
+                required.append(pname)
+        doc = (description or inspect.getdoc(f) or f.__name__).strip().splitlines()[0]
+        schema = {"type": "object", "properties": properties, "required": required}
+        return Tool(name or f.__name__, doc, schema, f, timeout)
+
+    return wrap(fn) if fn is not None else wrap
+
+
+@dataclass
+class AgentResult:
+    text: str
+    llm_calls: int
+    tool_calls: list[dict] = field(default_factory=list)  # 每次工具执行：名字、参数、结果、耗时
+    messages: list[dict] = field(default_factory=list)  # 完整的消息记录（含 assistant.tool_calls 和 tool 结果）
+    latency_ms: int = 0
+
+
+class ToolCallingAgent:
+    """
+    agent.run("帮我算 12.5*8，再看看今天几号") -> AgentResult
+    每轮：把 messages + tools 发给模型 → 有 tool_calls 就全执行、结果按 tool_call_id 交回 → 没有就是最终回答。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        tools: list[Tool],
+        system_prompt: str = "",
+        max_rounds: int = 4,
+        temperature: float = 0,
+        post: Callable = post_json,
+        parallel_tools: bool = True,
+        tool_timeout: float = 30,
+        resilience: ResilientCaller | None = None,
+        limiter: RateLimiter | None = None,
+        priority: int = INTERACTIVE,
+    ):
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+        self.model = model
+        self.tools = {t.name: t for t in tools}
+        self.system_prompt = system_prompt
+        self.max_rounds = max_rounds
+        self.temperature = temperature
+        self._post = post
+        self.parallel_tools = parallel_tools
+        self.tool_timeout = tool_timeout
+        # 和 AgentAdapter 一样：每次调模型先过进程共用的限速排队，出错按网关的容错层重试 / 熔断
+        self.resilience = resilience or for_endpoint(base_url)
+        self.limiter = limiter or get_limiter()
+        self.priority = priority
+
+    def _complete(self, messages: list[dict], allow_tools: bool = True) -> dict:
+        payload = {"model": self.model, "messages": messages, "temperature": self.temperature}
+        if self.tools:
+            payload["tools"] = [t.spec() for t in self.tools.values()]
+            payload["tool_choice"] = "auto" if allow_tools else "none"
+        tokens = estimate_tokens(messages)
+        resp = self.resilience.call(
+            lambda: self.limiter.run(lambda: self._post(self.url, payload, headers=self.headers), tokens, self.priority)
+        )
+        result = resp.json() if resp.content else {}
+        if resp.status_code != 200:
+            err_msg = result.get("error", {}).get("message", f"HTTP {resp.status_code}")
+            raise RuntimeError(f"接口返回错误：{err_msg}")
+        return result["choices"][0]["message"]
+
+    def _run_tool(self, call: dict) -> dict:
+        """执行一个 tool_call，返回记录；出错也返回（错误文本交给模型，让它自己决定怎么办）。"""
+        fn = call.get("function", {})
+        name = fn.get("name", "")
+        t0 = time.perf_counter()
+        record = {"id": call.get("id", ""), "name": name, "args": fn.get("arguments", "")}
+        try:
+            args = json.loads(fn.get("arguments") or "{}")
+            record["args"] = args
+            if name not in self.tools:
+                raise KeyError(f"没有这个工具：{name}")
+            result = self.tools[name](**args)
+            record["result"] = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        except json.JSONDecodeError:
+            record["result"] = "[错误] 参数不是合法 JSON"
+        except Exception as e:
+            record["result"] = f"[错误] {e}"
+        record["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return record
+
+    def _timeout_for(self, call: dict) -> float:
+        tool = self.tools.get(call.get("function", {}).get("name", ""))
+        return tool.timeout if tool is not None and tool.timeout is not None else self.tool_timeout
+
+    def run_tool_calls(self, calls: list[dict]) -> list[dict]:
+        """
+        同一轮要的工具互不依赖：一起提交到线程池，按原顺序收结果；超时的那个记成错误，不拖累别的。
+        parallel_tools=False 时在当前线程里挨个执行（不做超时），方便调试。
+        """
+        if not self.parallel_tools:
+            return [self._run_tool(call) for call in calls]
+        started = time.monotonic()
+        futures = [TOOL_POOL.submit(self._run_tool, call) for call in calls]
+        records = []
+        for call, fut in zip(calls, futures):
+            timeout = self._timeout_for(call)
+            try:
+                records.append(fut.result(timeout=max(0.0, started + timeout - time.monotonic())))
+            except FutureTimeout:
+                fut.cancel()  # 已经在跑的停不下来，结果不要了
+                name = call.get("function", {}).get("name", "")
+                records.append({
+                    "id": call.get("id", ""), "name": name, "args": call.get("function", {}).get("arguments", ""),
+                    "result": f"[错误] 工具 {name} 超时（{timeout} 秒）", "ms": round(timeout * 1000, 2), "timeout": True,
+                })
+        return records
+
+    def run(self, user_input: str, history: list[dict] | None = None) -> AgentResult:
+        start = time.time()
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        messages += list(history or []) + [{"role": "user", "content": user_input}]
+        executed: list[dict] = []
+        llm_calls, text = 0, ""
+
+        for round_no in range(self.max_rounds + 1):
+            # 最后一轮不再给工具，逼模型用已有结果作答（防止来回调工具停不下来）
+            message = self._complete(messages, allow_tools=round_no < self.max_rounds)
+            llm_calls += 1
+            calls = message.get("tool_calls") or []
+            if not calls:
+                text = message.get("content") or ""
+                messages.append({"role": "assistant", "content": text})
+                break
+            messages.append({"role": "assistant", "content": message.get("content"), "tool_calls": calls})
+            for record in self.run_tool_calls(calls):
+                executed.append(record)
+                messages.append({"role": "tool", "tool_call_id": record["id"], "content": record["result"]})
+
+        latency = int((time.time() - start) * 1000)
+        return AgentResult(text=text, llm_calls=llm_calls, tool_calls=executed, messages=messages, latency_ms=latency)
@@ -0,0 +1,212 @@
+# =========================================
+# tool_registry.py
+# 全项目共用的工具注册表：工具只注册一次，带上元数据
+#  - pure=True：同样的参数结果永远一样（乘法、夸奖）→ 结果一直缓存
+#  - ttl=秒数：一段时间内结果不变 → 缓存这么久（“今天几号”这种跨过零点就变的不缓存；
+#    搜索结果 search_tools 自己有缓存，这里不再套一层）
+#  - timeout / cost：给 Agent 引擎用（超时）和看账用（每次真正执行算一次成本）
+#  - 每个工具的调用次数、缓存命中、出错次数、耗时都有统计
+# 缓存是进程级的（跨会话共用）；设了 TOOL_CACHE_DB 时同时存到 SQLite，重启后还在
+# =========================================
+
+import asyncio
+import datetime
+import inspect
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from tool_agent import TOOL_POOL, Tool, function_tool
+from ttl_cache import MISSING, TieredCache, canonical_key
+
+PURE_TTL = 30 * 24 * 3600  # 纯函数的结果也不是真的永久保存，磁盘层别无限长
+
+
+@dataclass
+class ToolStats:
+    calls: int = 0
+    hits: int = 0  # 直接用了缓存
+    errors: int = 0
+    total_ms: float = 0.0  # 只算真正执行的耗时
+    max_ms: float = 0.0
+
+    def as_dict(self, cost: float = 0.0) -> dict:
+        executed = self.calls - self.hits
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / executed, 2) if executed else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "cost": round(executed * cost, 4),
+        }
+
+
+@dataclass
+class ToolMeta:
+    pure: bool = False
+    ttl: float | None = None
+    cost: float = 0.0
+    version: str = "1"  # 改了实现就改版本号，磁盘里的旧结果自然作废
+
+    @property
+    def cache_ttl(self) -> float | None:
+        return PURE_TTL if self.pure else self.ttl
+
+
+def _run_coroutine(coro):
+    """同步地跑完一个 async 工具：当前线程没有事件循环就直接 asyncio.run；
+    在事件循环里被调用（比如 AsyncAgentAdapter 那边）时 asyncio.run 会报错，交给工具线程池去跑。"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    return TOOL_POOL.submit(asyncio.run, coro).result()
+
+
+class ToolRegistry:
+    """
+    registry = ToolRegistry()
+    @registry.register(pure=True)
+    def multiply(a: float, b: float) -> float: ...
+    registry.call("multiply", a=2, b=3)；registry.tools(["multiply"]) 交给 ToolCallingAgent
+    """
+
+    def __init__(self, cache: TieredCache | None = None):
+        self.cache = cache
+        self._tools: dict[str, Tool] = {}
+        self._meta: dict[str, ToolMeta] = {}
+        self._stats: dict[str, ToolStats] = {}
+        self._lock = threading.Lock()
+
+    def _get_cache(self) -> TieredCache:
+        with self._lock:
+            if self.cache is None:
+                self.cache = TieredCache(maxsize=1024, ttl=PURE_TTL, db_path=os.getenv("TOOL_CACHE_DB") or None, table="tool_results")
+            return self.cache
+
+    def register(
+        self,
+        fn=None,
+        *,
+        name: str | None = None,
+        description: str | None = None,
+        pure: bool = False,
+        ttl: float | None = None,
+        timeout: float | None = None,
+        cost: float = 0.0,
+        version: str = "1",
+    ):
+        def wrap(f) -> Tool:
+            tool = function_tool(f, name=name, description=description, timeout=timeout)
+            meta = ToolMeta(pure=pure, ttl=ttl, cost=cost, version=version)
+            tool_name = tool.name
+            tool.fn = lambda **kwargs: self._invoke(tool_name, f, kwargs)  # 经过缓存 + 统计
+            with self._lock:
+                self._tools[tool_name] = tool
+                self._meta[tool_name] = meta
+                self._stats[tool_name] = ToolStats()
+            return tool
+
+        return wrap(fn) if fn is not None else wrap
+
+    def _invoke(self, name: str, raw, kwargs: dict):
+        meta, stats = self._meta[name], self._stats[name]
+        key = None
+        if meta.cache_ttl:
+            key = canonical_key(name, meta.version, kwargs)
+            value = self._get_cache().get(key, MISSING)
+            if value is not MISSING:
+                with self._lock:
+                    stats.calls += 1
+                    stats.hits += 1
+                return value
+
+        t0 = time.perf_counter()
+        try:
+            value = raw(**kwargs)
+            if inspect.isawaitable(value):
+                value = _run_coroutine(value)
+        except Exception:
+            with self._lock:
+                stats.calls += 1
+                stats.errors += 1
+            raise
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                stats.total_ms += ms
+                stats.max_ms = max(stats.max_ms, ms)
+        with self._lock:
+            stats.calls += 1
+        if key is not None:
+            try:
+                self._get_cache().set(key, value, ttl=meta.cache_ttl)
+            except TypeError:
+                pass  # 结果不能转成 JSON（磁盘层存不了），这次就不缓存
+        return value
+
+    def call(self, tool_name: str, /, **kwargs):
+        # tool_name 只能按位置传：工具自己的参数也可能叫 name（比如 praise）
+        return self._tools[tool_name](**kwargs)
+
+    def get(self, name: str) -> Tool:
+        return self._tools[name]
+
+    def meta(self, name: str) -> ToolMeta:
+        return self._meta[name]
+
+    def names(self) -> list[str]:
+        return list(self._tools)
+
+    def tools(self, names: list[str] | None = None) -> list[Tool]:
+        return [self._tools[n] for n in (names or self._tools)]
+
+    def as_dict(self, names: list[str] | None = None) -> dict[str, Tool]:
+        """{名字: Tool}：给还按 tools[name].invoke(args) 写的旧代码用。"""
+        return {t.name: t for t in self.tools(names)}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def stats(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: s.as_dict(self._meta[name].cost) for name, s in self._stats.items()}
+
+    def clear_cache(self):
+        if self.cache is not None:
+            self.cache.clear()
+
+
+# ===== 项目里的工具：只在这里定义一次 =====
+REGISTRY = ToolRegistry()
+
+
+@REGISTRY.register(pure=True)
+def multiply(a: float, b: float) -> float:
+    """计算两个数字的乘积"""
+    return a * b
+
+
+@REGISTRY.register
+def today() -> str:
+    """返回今天的日期（YYYY-MM-DD）"""
+    return datetime.date.today().strftime("%Y-%m-%d")
+
+
+@REGISTRY.register(pure=True)
+def praise(name: str) -> str:
+    """生成一段夸奶奶的话"""
+    return (
+        f"{name}真了不起，90岁还在学AI，还想做AI产品经理，"
+        "说明她的好奇心和学习力都比很多年轻人还强！"
+    )
+
+
+@REGISTRY.register(timeout=10, cost=1.0)
+def web_search(query: str, max_results: int = 5) -> str:
+    """联网搜索（DuckDuckGo），返回几条结果的标题、网址和摘要"""
+    from search_tools import web_search as _search  # 用到才导入 duckduckgo_search
+
+    return _search(query, max_results=max_results)
@@ -0,0 +1,167 @@
+# =========================================
+# ttl_cache.py
+# 通用缓存：内存 LRU + 每条过期时间（TTL），可选 SQLite 磁盘层（重启后还在）
+# SingleFlight：同一个键同时只真正算一次，其余调用等着拿同一个结果
+# =========================================
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+MISSING = object()
+
+
+def canonical_key(*parts) -> str:
+    """把任意 JSON 能表示的东西规范化后取 sha256（键顺序、空白都不影响结果）。"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """线程安全；超过 maxsize 条时淘汰最久没用过的，过期的条目读到时顺手删掉。"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (过期时刻, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float | None = None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteCacheTier:
+    """磁盘层：值存成 JSON 文本；每个线程一个连接（和 session_store 一样）。"""
+
+    def __init__(self, db_path: str, table: str = "cache"):
+        self.path = Path(db_path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute(f"DELETE FROM {table} WHERE expires <= ?", (time.time(),))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """返回 (值, 过期时刻)，没有或已过期时返回 (MISSING, 0)。"""
+        row = self._conn().execute(
+            f"SELECT value, expires FROM {self.table} WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (MISSING, 0)
+
+    def set(self, key: str, value, expires: float):
+        with self._conn() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires),
+            )
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+
+class TieredCache:
+    """先查内存，再查磁盘（命中后放回内存）；写入时两层都写。"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 600, db_path: str | None = None, table: str = "cache"):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk = SqliteCacheTier(db_path, table) if db_path else None
+
+    @property
+    def ttl(self) -> float:
+        return self.memory.ttl
+
+    def get(self, key: str, default=None):
+        value = self.memory.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        if self.disk is not None:
+            value, expires = self.disk.get(key)
+            if value is not MISSING:
+                self.memory.set(key, value, ttl=expires - time.time())
+                return value
+        return default
+
+    def set(self, key: str, value, ttl: float | None = None):
+        ttl = self.memory.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, time.time() + ttl)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+
+class SingleFlight:
+    """同一个键的并发调用合并成一次：第一个调用方去算，后来的等它的结果（异常也一起抛）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: dict = {}
+        self.shared = 0  # 被合并掉（没有自己去算）的调用次数
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return fut.result()
+        try:
+            result = fn(*args, **kwargs)
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]